@@ -11,6 +11,7 @@ import datetime
 import random
 import re
 import sys
+import uuid
 from http import HTTPStatus
 from secrets import token_urlsafe
 
@@ -18,11 +19,21 @@ from app.config import Config
 from app.configs import PROJECT_NAME
 from app.managers import auth_ns, role_ns, route_ns, user_ns
 from app.models import Roles, Routes, Users
-from app.utils import api, api_blueprint, cache, db
+from app.utils import (
+    api,
+    api_blueprint,
+    db,
+    password_hasher,
+    permission_cache,
+    query_cache,
+    revocation_filter,
+    touch_buffer,
+)
 from flask import Flask, Response, jsonify
-from flask_jwt_extended import JWTManager
 from sqlalchemy import exc
 
+from flask_restx_marshmallow import IdentityLoader, JWTManager
+
 
 def create_app(config=Config) -> Flask:
     """
@@ -31,17 +42,25 @@ def create_app(config=Config) -> Flask:
     """
     app: Flask = Flask(__name__)
     app.config.from_object(config)
-    jwt: JWTManager = JWTManager(app)
+    jwt: JWTManager = JWTManager(app, decode_cache_size=4096)
+    identity_loader: IdentityLoader = IdentityLoader(db, Users, jwt=jwt)
 
     db.init_app(app)
+    permission_cache.init_app(app)
+    query_cache.init_app(app)
+    revocation_filter.init_app(app)
+    password_hasher.init_app(app)
+    touch_buffer.init_app(app)
     api.add_namespace(auth_ns, path="/auth/user")
     api.add_namespace(role_ns, path="/admin/role")
     api.add_namespace(route_ns, path="/admin/route")
     api.add_namespace(user_ns, path="/admin/user")
     if app.config["DEVELOPING"] is True:
         api.register_doc(app, api_blueprint)
+        api.register_health(app, db, api_blueprint)
     else:
         api.register_doc_production(app, api_blueprint)
+        api.register_health(app, db, api_blueprint, authed_route="/system")
 
     app.register_blueprint(api_blueprint)
 
@@ -54,20 +73,14 @@ def create_app(config=Config) -> Flask:
         user_id: int = jwt_payload["sub"]
         return (
             exp < datetime.datetime.now().timestamp()
-            or cache.get(jti)
-            or not Users.judge_user_valid_by_id(user_id)
+            or revocation_filter.is_revoked(jti)
+            or not identity_loader.is_valid(user_id)
         )
 
     @jwt.user_identity_loader
     def user_identity_lookup(user: Users) -> str:
         return user.id.hex
 
-    @jwt.user_lookup_loader
-    def user_lookup_callback(
-        _jwt_header: dict[str, str], jwt_payload: dict[str, str]
-    ) -> Users:
-        return Users.get_user_by_id(jwt_payload["sub"])
-
     @jwt.unauthorized_loader
     def unauthorized_callback(*_args, **_kwargs) -> Response:
         res: Response = jsonify(
@@ -194,11 +207,27 @@ def create_app(config=Config) -> Flask:
     def init_db() -> None:
         db.drop_all()
         db.create_all()
-        Routes.add("/personal", "personal info")
-        Routes.add("/system", "system manage")
-        Routes.add("/system/role", "system role manage")
-        Routes.add("/system/route", "system route manage")
-        Routes.add("/system/user", "system user manage")
+        now: datetime.datetime = datetime.datetime.now()
+        db.bulk_insert(
+            Routes,
+            (
+                {
+                    "created_on": now,
+                    "description": description,
+                    "id": uuid.uuid4(),
+                    "last_update": now,
+                    "name": name,
+                }
+                for name, description in (
+                    ("/personal", "personal info"),
+                    ("/system", "system manage"),
+                    ("/system/role", "system role manage"),
+                    ("/system/route", "system route manage"),
+                    ("/system/user", "system user manage"),
+                )
+            ),
+        )
+        db.session.commit()
         Roles.add(
             name="admin",
             description="admin user",
@@ -10,11 +10,12 @@ FilePath: /flask_restx_marshmallow/examples/app/managers/auth_manager/parameters
 from datetime import datetime, timedelta
 
 from app.models import Users
-from app.utils import db
+from app.utils import db, password_hasher, touch_buffer
 from flask import current_app
 from flask_jwt_extended import create_access_token
 from marshmallow import post_load, validate
 from marshmallow.fields import String
+from sqlalchemy_utils import Password
 
 from flask_restx_marshmallow import JSONParameters
 
@@ -50,16 +51,25 @@ class LoginParameters(JSONParameters):
     @post_load
     def process_login(self, data: "LoginParameters", **_kwargs) -> dict:
         """process login request"""
-        if (
-            user := Users.get_user_by_username(data.username)
-        ) is None or user.password != data.password:
+        if (user := Users.get_user_by_username(data.username)) is None:
             return {
                 "code": 1,
                 "message": "user name and password not match",
                 "success": False,
             }
-        user.last_login = datetime.now()
-        db.session.commit()
+        valid, new_hash = password_hasher.verify_and_update(
+            data.password, user.password
+        )
+        if not valid:
+            return {
+                "code": 1,
+                "message": "user name and password not match",
+                "success": False,
+            }
+        if new_hash is not None:
+            user.password = Password(new_hash)
+            db.session.commit()
+        touch_buffer.touch(Users.last_login, user.id, datetime.now())
         current_app.logger.info(f"{user.name} login success")
         return {
             "data": {
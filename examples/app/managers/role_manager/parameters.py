@@ -14,7 +14,7 @@ from app.models import Roles, Routes
 from marshmallow import ValidationError, post_load, validate, validates_schema
 from marshmallow.fields import UUID, Boolean, Integer, List, String
 
-from flask_restx_marshmallow import JSONParameters, QueryParameters
+from flask_restx_marshmallow import ExistsIn, JSONParameters, QueryParameters
 
 from .schemas import RolesProfileSchema
 
@@ -102,7 +102,7 @@ class UpdateRoleParameters(JSONParameters):
     )
     routes: list[str] = List(
         String(metadata={"description": "route names"}),
-        validate=validate.Length(min=1),
+        validate=[validate.Length(min=1), ExistsIn(Routes.name)],
     )
     valid: bool = Boolean(metadata={"description": "whether the role is valid"})
 
@@ -115,11 +115,6 @@ class UpdateRoleParameters(JSONParameters):
             value is None for key, value in data.items() if key != "role_id"
         ):
             raise ValidationError("At least one field should be provided")
-        if (
-            data["routes"] is not None
-            and not set(data["routes"]) < Routes.get_all_names()
-        ):
-            raise ValidationError("route names are invalid")
 
     @post_load
     def update_role_info(self, data: dict, **_kwargs) -> dict:
@@ -12,7 +12,13 @@ from http import HTTPStatus
 from app.config import Config
 from flask import Response
 
-from flask_restx_marshmallow import Namespace, Resource, permission_required
+from flask_restx_marshmallow import (
+    Namespace,
+    Resource,
+    deadline,
+    permission_required,
+    read_only,
+)
 
 from .parameters import (
     CreateRoleParameters,
@@ -34,6 +40,8 @@ class RoleInfo(Resource):
     msg: query role info
     """
 
+    @read_only()
+    @deadline(5)
     @permission_required("/system/role")
     @role_ns.parameters(
         params=GetRolesInfoParameters(add_jwt=Config.DEVELOPING),
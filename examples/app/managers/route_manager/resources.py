@@ -12,7 +12,13 @@ from http import HTTPStatus
 from app.config import Config
 from requests import Response
 
-from flask_restx_marshmallow import Namespace, Resource, permission_required
+from flask_restx_marshmallow import (
+    Namespace,
+    Resource,
+    deadline,
+    permission_required,
+    read_only,
+)
 
 from .parameters import GetRoutesInfoParameters
 from .schemas import RoutesInfoSchema
@@ -29,6 +35,8 @@ class RouteInfo(Resource):
     msg: query route info
     """
 
+    @read_only()
+    @deadline(5)
     @permission_required("/system/route")
     @route_ns.parameters(
         GetRoutesInfoParameters(add_jwt=Config.DEVELOPING), location="query"
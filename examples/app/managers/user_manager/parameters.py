@@ -11,10 +11,16 @@ import uuid
 from typing import NoReturn, Optional
 
 from app.models import Roles, Users
-from marshmallow import ValidationError, post_load, validate, validates_schema
+from marshmallow import (
+    ValidationError,
+    post_load,
+    validate,
+    validates,
+    validates_schema,
+)
 from marshmallow.fields import UUID, Boolean, Integer, List, String
 
-from flask_restx_marshmallow import JSONParameters, QueryParameters
+from flask_restx_marshmallow import ExistsIn, JSONParameters, QueryParameters
 
 from .schemas import UsersProfileSchema
 
@@ -61,6 +67,7 @@ class GetUsersInfoParameters(QueryParameters):
                 order_prop=data.order_prop,
                 page=data.page,
                 per_page=data.size,
+                options=UsersProfileSchema.loader_options(),
             ),
         }
 
@@ -77,7 +84,7 @@ class UpdateUserParameters(JSONParameters):
     )
     roles: list[str] = List(
         String(metadata={"description": "role name list"}),
-        validate=validate.Length(min=1),
+        validate=[validate.Length(min=1), ExistsIn(Roles.name)],
     )
     valid: bool = Boolean(metadata={"description": "whether the user is valid"})
 
@@ -90,11 +97,6 @@ class UpdateUserParameters(JSONParameters):
             value is None for key, value in data.items() if key != "user_id"
         ):
             raise ValidationError("At least one field must be provided")
-        if (
-            data.roles is not None
-            and not set(data.roles) < Roles.get_all_names()
-        ):
-            raise ValidationError("role names are not valid")
 
     @post_load
     def update_user_info(self, data: dict, **_kwargs) -> dict:
@@ -108,14 +110,22 @@ class DeleteUserParameters(JSONParameters):
     msg: interface parameters for deleting user
     """
 
-    user_id: dict = List(
-        Integer(
+    user_id: list[uuid.UUID] = List(
+        UUID(
             required=True,
             metadata={"description": "id of the user to be deleted"},
-            validate=validate.Range(min=2),
-        )
+        ),
+        validate=validate.Length(min=1),
     )
 
+    @validates("user_id")
+    def validate_user_id(
+        self, value: list[uuid.UUID], **_kwargs
+    ) -> Optional[NoReturn]:
+        """keep the admin users out of reach"""
+        if Users.any_admin(value):
+            raise ValidationError("admin users can not be deleted")
+
     @post_load
     def delete_user(self, data: "DeleteUserParameters", **_kwargs) -> dict:
         """delete a user"""
@@ -12,7 +12,14 @@ from http import HTTPStatus
 from app.config import Config
 from flask import Response
 
-from flask_restx_marshmallow import Namespace, Resource, permission_required
+from flask_restx_marshmallow import (
+    Namespace,
+    Resource,
+    deadline,
+    permission_required,
+    query_budget,
+    read_only,
+)
 
 from .parameters import (
     DeleteUserParameters,
@@ -33,6 +40,9 @@ class UserInfo(Resource):
     msg: query user info
     """
 
+    @read_only()
+    @deadline(5)
+    @query_budget(max_repeats=2)
     @permission_required("/system/user")
     @user_ns.parameters(
         params=GetUsersInfoParameters(add_jwt=Config.DEVELOPING),
@@ -10,7 +10,7 @@ FilePath: /examples/app/models/__init__.py
 from dataclasses import dataclass
 from uuid import UUID
 
-from sqlalchemy import Column, ForeignKey, Integer
+from sqlalchemy import Column, ForeignKey, Integer, select
 from sqlalchemy.orm import Mapped
 from sqlalchemy_utils import UUIDType, generic_repr
 
@@ -19,6 +19,8 @@ from app.models.routes import Routes
 from app.models.users import Users
 from app.utils import db
 
+from flask_restx_marshmallow import DenormalizedList
+
 
 @generic_repr
 @dataclass
@@ -91,3 +93,13 @@ class Role2Route(db.Model):
         nullable=False,
         comment="foreign key for route table",
     )
+
+
+user_routes: DenormalizedList = DenormalizedList(
+    Users.routes,
+    select(User2Role.user_id, Routes.name)
+    .join(Roles, Roles.id == User2Role.role_id)
+    .join(Role2Route, Role2Route.role_id == Roles.id)
+    .join(Routes, Routes.id == Role2Route.route_id)
+    .where(Roles.valid.is_(True)),
+)
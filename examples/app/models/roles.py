@@ -12,14 +12,27 @@ from typing import Iterable
 from uuid import UUID, uuid4
 
 from app import models
-from app.utils import cache, db
+from app.utils import db, permission_cache
 from flask import current_app
 from flask_jwt_extended import get_current_user
-from sqlalchemy import Boolean, Column, DateTime, Integer, String, exc, func
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    Integer,
+    String,
+    exc,
+    func,
+    select,
+)
 from sqlalchemy.orm import Mapped, relationship
 from sqlalchemy_utils import UUIDType, aggregated, generic_repr
 
-from flask_restx_marshmallow import permission_required
+from flask_restx_marshmallow import (
+    BatchLoader,
+    SearchIndex,
+    permission_required,
+)
 
 
 @generic_repr
@@ -77,7 +90,7 @@ class Roles(db.Model):
         *,
         description: str,
         name: str,
-        routes: Iterable[str] = ("/personal"),
+        routes: Iterable[str] = ("/personal",),
     ) -> dict:
         """create a new role
 
@@ -96,13 +109,11 @@ class Roles(db.Model):
                     last_update=datetime.now(),
                     name=name,
                     routes=[
-                        data
-                        for route_name in routes
-                        if (
-                            data := models.Routes.get_route_by_route_name(
-                                route_name
-                            )
-                        )
+                        route
+                        for route in BatchLoader.of(
+                            models.Routes.name
+                        ).load_many(routes)
+                        if route is not None
                     ],
                     valid=True,
                 )
@@ -123,8 +134,18 @@ class Roles(db.Model):
         """
         query = cls.query.filter_by(id=role_id)
         current_user: models.Users = get_current_user()
-        if query.one_or_none():
+        if query.one_or_none() is not None:
+            user_ids: list[UUID] = db.session.scalars(
+                select(models.User2Role.user_id).filter_by(role_id=role_id)
+            ).all()
             query.delete()
+            permission_cache.bump_on_commit(
+                db.session,
+                *(
+                    user_id.hex
+                    for user_id in models.user_routes.refresh(user_ids)
+                ),
+            )
             db.session.commit()
             return {"success": True, "message": "delete role successfully"}
         current_user.ban()
@@ -148,14 +169,28 @@ class Roles(db.Model):
         if role := query.one_or_none():
             role: Roles
             if routes := [
-                data
-                for route_name in data.pop("routes", [])
-                if "/system" not in route_name
-                and (data := models.Routes.get_route_by_route_name(route_name))
+                route
+                for route in BatchLoader.of(models.Routes.name).load_many(
+                    route_name
+                    for route_name in data.pop("routes", [])
+                    if "/system" not in route_name
+                )
+                if route is not None
             ]:
                 role.routes = routes
             data.update({"last_update": datetime.now()})
             query.update(data)
+            permission_cache.bump_on_commit(
+                db.session,
+                *(
+                    user_id.hex
+                    for user_id in models.user_routes.refresh(
+                        select(models.User2Role.user_id).filter_by(
+                            role_id=role_id
+                        )
+                    )
+                ),
+            )
             db.session.commit()
             return {
                 "success": True,
@@ -180,21 +215,6 @@ class Roles(db.Model):
         """
         return cls.query.filter_by(name=role_name).one_or_none()
 
-    @classmethod
-    @cache.cached(key_prefix="all_role_names")
-    def get_all_names(cls) -> set[str]:
-        """all role names
-
-        Returns:
-            set[str]: set of all role names
-        """
-        return set(
-            map(
-                lambda value: value[0],
-                cls.query.with_entities(cls.name).distinct().all(),
-            )
-        )
-
     @classmethod
     @permission_required("/system/role")
     def get_all_roles(
@@ -216,7 +236,7 @@ class Roles(db.Model):
             per_page (int, optional): page size. Defaults to 10.
         """
         query = cls.query.filter(
-            cls.name != "admin", cls.name.contains(keyword)
+            cls.name != "admin", roles_search.match(keyword)
         )
         return {
             "roles": query.order_by(
@@ -229,3 +249,6 @@ class Roles(db.Model):
             .all(),
             "total": query.count(),
         }
+
+
+roles_search: SearchIndex = SearchIndex(Roles.name)
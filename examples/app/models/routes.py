@@ -11,7 +11,7 @@ from datetime import datetime
 from uuid import UUID, uuid4
 
 from app import models
-from app.utils import cache, db
+from app.utils import db
 from flask import current_app
 from sqlalchemy import Column, DateTime, Integer, String, exc, func
 from sqlalchemy.orm import Mapped, relationship
@@ -101,21 +101,6 @@ class Routes(db.Model):
         """
         return cls.query.filter_by(name=route_name).one_or_none()
 
-    @classmethod
-    @cache.cached(key_prefix="all_route_names")
-    def get_all_names(cls) -> set[str]:
-        """get all route names
-
-        Returns:
-            set[str]: set of route names
-        """
-        set(
-            map(
-                lambda value: value[0],
-                cls.query.with_entities(cls.name).distinct().all(),
-            )
-        )
-
     @classmethod
     @permission_required("/system/route")
     def get_all_routes(
@@ -12,21 +12,25 @@ from typing import Iterable, Optional
 from uuid import UUID, uuid4
 
 from app import models
-from app.utils import db
+from app.utils import db, password_hasher, permission_cache, touch_buffer
 from flask import current_app
 from flask_jwt_extended import get_current_user
 from sqlalchemy import Boolean, Column, DateTime, String, Text, exc
 from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import Mapped, relationship
 from sqlalchemy_utils import (
+    Password,
     PasswordType,
     ScalarListType,
     UUIDType,
     generic_repr,
-    observes,
 )
 
-from flask_restx_marshmallow import permission_required
+from flask_restx_marshmallow import (
+    BatchLoader,
+    SearchIndex,
+    permission_required,
+)
 
 
 @generic_repr
@@ -76,22 +80,6 @@ class Users(db.Model):
         comment="whether the user is valid",
     )
 
-    @observes("roles")
-    def auto_set_routes(self, roles: set[models.Roles]) -> None:
-        """auto set authorized routes
-
-        Args:
-            roles (set[Roles]): set of role objects
-        """
-        self.routes = list(
-            {
-                route.name
-                for role in roles
-                for route in role.routes
-                if role.valid
-            }
-        )
-
     @classmethod
     def add(
         cls,
@@ -110,26 +98,25 @@ class Users(db.Model):
             roles (Iterable[str], optional): roles for the user. Defaults to None.
         """
         try:
-            db.session.add(
-                cls(
-                    created_on=datetime.now(),
-                    description=description,
-                    id=uuid4(),
-                    last_login=datetime.now(),
-                    name=name,
-                    password=password,
-                    roles=[
-                        data
-                        for role_name in roles
-                        if (
-                            data := models.Roles.get_role_by_role_name(
-                                role_name
-                            )
-                        )
-                    ],
-                    valid=True,
-                )
+            user: Users = cls(
+                created_on=datetime.now(),
+                description=description,
+                id=uuid4(),
+                last_login=datetime.now(),
+                name=name,
+                password=Password(password_hasher.hash(password)),
+                roles=[
+                    role
+                    for role in BatchLoader.of(models.Roles.name).load_many(
+                        roles
+                    )
+                    if role is not None
+                ],
+                valid=True,
             )
+            db.session.add(user)
+            db.session.flush()
+            models.user_routes.refresh([user.id])
             db.session.commit()
             return {"success": True, "message": "create user success"}
         except exc.IntegrityError:
@@ -138,22 +125,22 @@ class Users(db.Model):
 
     @classmethod
     @permission_required("/system/user")
-    def delete(cls, user_id: UUID) -> dict:
-        """delete a user
+    def delete(cls, user_ids: Iterable[UUID]) -> dict:
+        """delete users
 
         Args:
-            user_id (UUID): id of the user
+            user_ids (Iterable[UUID]): ids of the users
         """
-        query = cls.query.filter_by(id=user_id)
+        user_ids = set(user_ids)
         current_user: Users = get_current_user()
-        if query.one_or_none():
-            query.delete()
+        if cls.query.filter(cls.id.in_(user_ids)).count() == len(user_ids):
+            db.bulk_delete(cls, user_ids)
             db.session.commit()
             return {"success": True, "message": "delete user success"}
         current_user.ban()
         current_app.logger.error(
-            f"{current_user.name} is trying to delete user (id="
-            f"{user_id}) that does not exist"
+            f"{current_user.name} is trying to delete users (ids="
+            f"{user_ids}) that do not exist"
         )
         return {"success": False, "message": "user does not exist"}
 
@@ -171,14 +158,21 @@ class Users(db.Model):
         if user := query.one_or_none():
             user: Users
             if roles := [
-                data
-                for role_name in data.pop("roles", [])
-                if role_name != "admin"
-                and (data := models.Roles.get_role_by_role_name(role_name))
+                role
+                for role in BatchLoader.of(models.Roles.name).load_many(
+                    role_name
+                    for role_name in data.pop("roles", [])
+                    if role_name != "admin"
+                )
+                if role is not None
             ]:
                 user.roles = roles
-            data.update({"last_login": datetime.now()})
-            query.update(data)
+                db.session.flush()
+                models.user_routes.refresh([user_id])
+                permission_cache.bump_on_commit(db.session, user_id.hex)
+            touch_buffer.touch(cls.last_login, user_id, datetime.now())
+            if data:
+                query.update(data)
             db.session.commit()
             return {
                 "success": True,
@@ -203,6 +197,23 @@ class Users(db.Model):
         """
         return cls.query.filter_by(id=user_id).one_or_none()
 
+    @classmethod
+    def any_admin(cls, user_ids: Iterable[UUID]) -> bool:
+        """whether any of the users has the admin role
+
+        Args:
+            user_ids (Iterable[UUID]): ids of the users
+
+        Returns:
+            bool: whether an admin is among them
+        """
+        return db.session.query(
+            cls.query.filter(
+                cls.id.in_(set(user_ids)),
+                cls.roles.any(models.Roles.name == "admin"),
+            ).exists()
+        ).scalar()
+
     @classmethod
     def get_user_by_username(cls, username: str) -> "Users":
         """get user by username
@@ -225,6 +236,7 @@ class Users(db.Model):
         order_prop: str = "created_on",
         page: int = 1,
         per_page: int = 10,
+        options: Iterable = (),
     ) -> dict:
         """get all users
 
@@ -234,9 +246,10 @@ class Users(db.Model):
             order_prop (str, optional): order property. Defaults to "created_on".
             page (int, optional): current page. Defaults to 1.
             per_page (int, optional): page size. Defaults to 10.
+            options (Iterable, optional): loader options. Defaults to ().
         """
         query = cls.query.filter(
-            cls.name != "administrator", cls.name.contains(keyword)
+            cls.name != "administrator", users_search.match(keyword)
         )
         return {
             "users": query.order_by(
@@ -244,6 +257,7 @@ class Users(db.Model):
                 if order == "desc"
                 else getattr(cls, order_prop, cls.created_on).asc()
             )
+            .options(*options)
             .offset((page - 1) * per_page)
             .limit(per_page)
             .all(),
@@ -269,3 +283,6 @@ class Users(db.Model):
         """ban the user"""
         self.valid = False
         db.session.commit()
+
+
+users_search: SearchIndex = SearchIndex(Users.name)
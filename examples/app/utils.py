@@ -12,9 +12,16 @@ import os
 
 import toml
 from flask import Blueprint
-from flask_caching import Cache
 
-from flask_restx_marshmallow import Api, SQLAlchemy
+from flask_restx_marshmallow import (
+    Api,
+    PasswordHasher,
+    PermissionCache,
+    QueryCache,
+    RevocationFilter,
+    SQLAlchemy,
+    TouchBuffer,
+)
 
 PROJECT_CONFIG: dict = (
     poetry
@@ -49,7 +56,13 @@ LICENSE2URL: dict = {
     "CC-BY-NC-ND-v4.0": "https://creativecommons.org/licenses/by-nc-nd/4.0/",
 }
 db: SQLAlchemy = SQLAlchemy()
-cache: Cache = Cache()
+permission_cache: PermissionCache = PermissionCache(db=db)
+query_cache: QueryCache = QueryCache()
+touch_buffer: TouchBuffer = TouchBuffer()
+revocation_filter: RevocationFilter = RevocationFilter()
+password_hasher: PasswordHasher = PasswordHasher(
+    schemes=["pbkdf2_sha512", "md5_crypt"], deprecated=["md5_crypt"]
+)
 api_blueprint: Blueprint = Blueprint(
     "api",
     __name__,
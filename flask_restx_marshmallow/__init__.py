@@ -10,6 +10,12 @@ FilePath: /flask_restx_marshmallow/flask-restx-marshmallow/__init__.py
 from flask_restx import Resource
 
 from .api import Api
+from .auth import (
+    IdentityLoader,
+    JWTManager,
+    PermissionCache,
+    RevocationFilter,
+)
 from .namespace import Namespace
 from .parameter import (
     CookieParameters,
@@ -18,13 +24,33 @@ from .parameter import (
     PostFormParameters,
     QueryParameters,
 )
+from .password import PasswordHasher, PasswordHasherSaturated
 from .schema import (
     DefaultHTTPErrorSchema,
+    RowLoader,
     Schema,
     SQLAlchemyAutoSchema,
     SQLAlchemySchema,
     StandardSchema,
+    compile_loader_options,
+)
+from .sqlalchemy import (
+    BatchLoader,
+    DeadlineExceeded,
+    DenormalizedList,
+    ExistsIn,
+    QueryBudgetExceeded,
+    QueryCache,
+    ReadOnlySessionError,
+    ReferenceSet,
+    SearchIndex,
+    SQLAlchemy,
+    TouchBuffer,
+    check_deadline,
+    deadline,
+    get_query_statistics,
+    query_budget,
+    read_only,
 )
-from .sqlalchemy import SQLAlchemy
 from .swagger import Swagger
-from .util import File, permission_required
+from .util import File, has_permission, permission_required
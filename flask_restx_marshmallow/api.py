@@ -12,8 +12,9 @@ from dataclasses import dataclass
 from http import HTTPStatus
 from types import ModuleType
 from typing import Optional
+from weakref import WeakKeyDictionary
 
-from flask import Blueprint, Flask, Response, abort, current_app, jsonify
+from flask import Blueprint, Flask, Response, abort, current_app
 from flask_restx import Api as OriginalApi
 from marshmallow.exceptions import ValidationError
 from typing_extensions import override
@@ -23,8 +24,16 @@ from werkzeug.exceptions import (
 from werkzeug.utils import cached_property
 
 from .namespace import Namespace
+from .password import PasswordHasherSaturated
+from .schema import DEFAULT_HTTP_ERROR_ENVELOPES
+from .sqlalchemy import DeadlineExceeded, SQLAlchemy
 from .swagger import Swagger
-from .util import apidoc, permission_required, ui_for
+from .util import (
+    API_DEFAULT_HTTP_CODE_MESSAGES,
+    apidoc,
+    permission_required,
+    ui_for,
+)
 
 try:
     json: ModuleType = importlib.import_module("orjson")
@@ -38,6 +47,12 @@ class Api(OriginalApi):
     msg: Patched API
     """
 
+    def __init__(self, *args, **kwargs) -> None:
+        self._error_handler_cache: WeakKeyDictionary[
+            Flask, tuple[tuple, dict[type, bool]]
+        ] = WeakKeyDictionary()
+        super().__init__(*args, **kwargs)
+
     @cached_property
     def __schema__(self) -> dict:
         """The Swagger specifications/schema for this API"""
@@ -55,6 +70,8 @@ class Api(OriginalApi):
         app.errorhandler(HTTPStatus.UNPROCESSABLE_ENTITY.value)(
             handle_validation_error
         )
+        app.errorhandler(PasswordHasherSaturated)(handle_saturated_error)
+        app.errorhandler(DeadlineExceeded)(handle_deadline_error)
 
     @override
     def _register_apidoc(self, app: Flask) -> None:
@@ -82,15 +99,44 @@ class Api(OriginalApi):
         Returns:
             Response: flask response
         """
-        for val in current_app.error_handler_spec.values():
-            for handler in val.values():
-                registered_error_handlers: list[type[Exception]] = list(
-                    filter(lambda x: isinstance(e, x), handler.keys())
-                )
-                if len(registered_error_handlers) > 0:
-                    raise e
+        if self._has_app_error_handler(type(e)):
+            raise e
         return super().handle_error(e)
 
+    def _has_app_error_handler(self, exc_class: type[Exception]) -> bool:
+        """whether flask has a handler for the exception class, memoized per
+        class by its MRO while the registered handlers stay the same
+
+        Args:
+            exc_class (type[Exception]): exception class
+
+        Returns:
+            bool: whether a handler is registered
+        """
+        # pylint: disable=protected-access
+        app: Flask = current_app._get_current_object()
+        # handlers may be registered, merged from blueprints or written to
+        # `error_handler_spec` directly, so the memo is keyed on its keys
+        snapshot: tuple = tuple(
+            (scope, code, *handlers)
+            for scope, val in app.error_handler_spec.items()
+            for code, handlers in val.items()
+        )
+        cached: Optional[
+            tuple[tuple, dict[type, bool]]
+        ] = self._error_handler_cache.get(app)
+        if cached is None or cached[0] != snapshot:
+            cached = self._error_handler_cache[app] = (snapshot, {})
+        if (handled := cached[1].get(exc_class)) is None:
+            handled = any(
+                cls in handlers
+                for val in app.error_handler_spec.values()
+                for handlers in val.values()
+                for cls in exc_class.__mro__
+            )
+            cached[1][exc_class] = handled
+        return handled
+
     @override
     def namespace(self, *args, **kwargs) -> Namespace:
         """The only purpose of this method is to pass a custom Namespace class
@@ -169,6 +215,63 @@ class Api(OriginalApi):
             lambda: json.dumps(self.__schema__),
         )
 
+    def register_health(
+        self,
+        app: Flask,
+        db: SQLAlchemy,
+        blueprint: Optional[Blueprint] = None,
+        *,
+        path: str = "/health",
+        probe: bool = True,
+        authed_route: Optional[str] = None,
+    ) -> None:
+        """register a health route reporting pool statistics of the engines
+
+        Args:
+            app (Flask): app instance
+            db (SQLAlchemy): sqlalchemy extension
+            blueprint (Blueprint, optional): blueprint instance. Defaults to None.
+            path (str, optional): route path. Defaults to "/health".
+            probe (bool, optional): whether run a connectivity probe.
+            Defaults to True.
+            authed_route (str, optional): authed route, None for public.
+            Defaults to None.
+        """
+
+        def health() -> Response:
+            engines: dict[str, dict] = db.pool_statistics()
+            healthy: bool = True
+            if probe:
+                for name, result in db.probe().items():
+                    engines.setdefault(name, {}).update(result)
+                    healthy = healthy and result["reachable"]
+            status: HTTPStatus = (
+                HTTPStatus.OK if healthy else HTTPStatus.SERVICE_UNAVAILABLE
+            )
+            return Response(
+                json.dumps(
+                    {
+                        "code": 0 if healthy else status.value,
+                        "message": "ok"
+                        if healthy
+                        else API_DEFAULT_HTTP_CODE_MESSAGES[status.value],
+                        "success": healthy,
+                        "data": {"engines": engines},
+                    }
+                ),
+                status=status.value,
+                mimetype="application/json",
+            )
+
+        app_or_blueprint: Blueprint | Flask = blueprint if blueprint else app
+        app_or_blueprint.add_url_rule(
+            path,
+            "health",
+            health
+            if authed_route is None
+            else permission_required(authed_route)(health),
+        )
+
 
 @dataclass
 class UnprocessableEntity(originalUnprocessableEntity):
@@ -189,12 +292,33 @@ def handle_validation_error(err: UnprocessableEntity) -> Response:
     Returns:
         Response: response for unprocessable entity
     """
-    res: Response = jsonify(
-        {
-            "code": HTTPStatus.UNPROCESSABLE_ENTITY.value,
-            "message": err.exc.messages,
-            "success": False,
-        }
-    )
-    res.status_code = HTTPStatus.UNPROCESSABLE_ENTITY.value
+    return DEFAULT_HTTP_ERROR_ENVELOPES[
+        HTTPStatus.UNPROCESSABLE_ENTITY.value
+    ].response(err.exc.messages)
+
+
+def handle_saturated_error(err: PasswordHasherSaturated) -> Response:
+    """Return the default http error envelope for saturated services
+
+    Args:
+        err (PasswordHasherSaturated): exception
+
+    Returns:
+        Response: response for saturated services
+    """
+    res: Response = DEFAULT_HTTP_ERROR_ENVELOPES[err.code].response()
+    if err.retry_after is not None:
+        res.headers["Retry-After"] = str(err.retry_after)
     return res
+
+
+def handle_deadline_error(err: DeadlineExceeded) -> Response:
+    """Return the default http error envelope for expired deadlines
+
+    Args:
+        err (DeadlineExceeded): exception
+
+    Returns:
+        Response: response for expired deadlines
+    """
+    return DEFAULT_HTTP_ERROR_ENVELOPES[err.code].response()
@@ -0,0 +1,613 @@
+"""
+Description: authorization helpers of flask_restx_marshmallow
+version: 0.1.1
+Author: 1746104160
+Date: 2026-10-19 10:12:31
+LastEditors: 1746104160 shaojiahong2001@outlook.com
+LastEditTime: 2026-10-19 10:12:31
+FilePath: /flask_restx_marshmallow/flask_restx_marshmallow/auth.py
+"""
+import hashlib
+import heapq
+import math
+import re
+import time
+from datetime import timedelta
+from threading import Lock
+from typing import Any, Callable, Hashable, Iterable, Optional
+
+import jwt
+import redis
+from flask import Flask, current_app, g
+from flask_jwt_extended import JWTManager as OriginalJWTManager
+from flask_jwt_extended.config import config
+from flask_jwt_extended.default_callbacks import default_decode_key_callback
+from sqlalchemy import event
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.orm.strategy_options import Load
+from typing_extensions import override
+
+from .sqlalchemy import Model, SQLAlchemy, batched
+from .util import BloomFilter, LRUCache
+
+_MISSING: object = object()
+
+
+class JWTManager(OriginalJWTManager):
+    """patched flask_jwt_extended manager with an opt-in cache of verified
+    tokens
+
+    Decoded claims are cached by the sha256 of the raw token and of the
+    decode key, along with the algorithms, audience, issuer and leeway in
+    force, until the `exp` claim. Repeated requests with one token skip
+    signature verification while a rotated key or changed setting takes
+    effect at once. Type, freshness, revocation and custom verification
+    callbacks still run on every request. flask_jwt_extended has no public
+    hook around verification, so the cache wraps its private
+    `_decode_jwt_from_config`, and the dependency is pinned to 4.5.
+
+    Args:
+        app (Flask, optional): app instance. Defaults to None.
+        add_context_processor (bool, optional): whether add `current_user`
+        to the template context. Defaults to False.
+        decode_cache_size (int, optional): count of verified tokens to cache,
+        0 disables the cache. Defaults to 0.
+    """
+
+    def __init__(
+        self,
+        app: Optional[Flask] = None,
+        add_context_processor: bool = False,
+        *,
+        decode_cache_size: int = 0,
+    ) -> None:
+        self.decode_cache: Optional[LRUCache] = (
+            LRUCache(decode_cache_size) if decode_cache_size > 0 else None
+        )
+        super().__init__(app, add_context_processor)
+
+    @override
+    def _decode_jwt_from_config(
+        self,
+        encoded_token: str,
+        csrf_value: Optional[str] = None,
+        allow_expired: bool = False,
+    ) -> dict:
+        if self.decode_cache is None or allow_expired:
+            return super()._decode_jwt_from_config(
+                encoded_token, csrf_value, allow_expired
+            )
+        key: tuple[bytes, bytes, Optional[str], tuple] = (
+            hashlib.sha256(encoded_token.encode()).digest(),
+            self._decode_key_fingerprint(encoded_token),
+            csrf_value,
+            self._decode_settings(),
+        )
+        if (claims := self.decode_cache.get(key)) is None:
+            claims = super()._decode_jwt_from_config(encoded_token, csrf_value)
+            if isinstance(expires_at := claims.get("exp"), (int, float)):
+                self.decode_cache.set(key, claims, expires_at)
+        return dict(claims)
+
+    @staticmethod
+    def _decode_settings() -> tuple:
+        """settings deciding whether a token verifies, besides its key"""
+        audience: Any = config.decode_audience
+        return (
+            tuple(config.decode_algorithms),
+            audience
+            if audience is None or isinstance(audience, str)
+            else frozenset(audience),
+            config.decode_issuer,
+            config.leeway,
+            config.identity_claim_key,
+        )
+
+    def _decode_key_fingerprint(self, encoded_token: str) -> bytes:
+        if self._decode_key_callback is default_decode_key_callback:
+            secret: Any = config.decode_key
+        else:
+            secret = self._decode_key_callback(
+                jwt.get_unverified_header(encoded_token),
+                jwt.decode(
+                    encoded_token,
+                    algorithms=config.decode_algorithms,
+                    options={"verify_signature": False},
+                ),
+            )
+        if isinstance(secret, str):
+            secret = secret.encode()
+        elif not isinstance(secret, bytes):
+            secret = repr(secret).encode()
+        return hashlib.sha256(secret).digest()
+
+
+class IdentityLoader:
+    """request-scoped user loader for flask_jwt_extended
+
+    The user of a JWT identity is fetched once per request and shared by the
+    user lookup loader, the blocklist loader and every nested
+    `permission_required`.
+
+    Args:
+        db (SQLAlchemy): sqlalchemy extension
+        model (type[Model]): user model
+        eager (Iterable[str], optional): relationships to eager load like
+        `roles` or `roles.routes`. Defaults to ().
+        valid_attr_name (str, optional): user model attribute name for
+        validity. Defaults to "valid".
+        jwt (JWTManager, optional): jwt manager. Defaults to None.
+    """
+
+    def __init__(
+        self,
+        db: SQLAlchemy,
+        model: type[Model],
+        *,
+        eager: Iterable[str] = (),
+        valid_attr_name: Optional[str] = "valid",
+        jwt: Optional[OriginalJWTManager] = None,
+    ) -> None:
+        self.db: SQLAlchemy = db
+        self.model: type[Model] = model
+        self.valid_attr_name: Optional[str] = valid_attr_name
+        self.options: list[Load] = [self._make_option(path) for path in eager]
+        if jwt is not None:
+            self.init_jwt(jwt)
+
+    def _make_option(self, path: str) -> Load:
+        """make a chained selectinload option from a dotted path
+
+        Args:
+            path (str): relationship path like `roles.routes`
+
+        Returns:
+            Load: loader option
+        """
+        model: type = self.model
+        option: Optional[Load] = None
+        for name in path.split("."):
+            attr = getattr(model, name)
+            option = (
+                selectinload(attr)
+                if option is None
+                else option.selectinload(attr)
+            )
+            model = attr.property.mapper.class_
+        return option
+
+    def init_jwt(self, jwt: OriginalJWTManager) -> None:
+        """register the user lookup loader
+
+        Args:
+            jwt (JWTManager): jwt manager
+        """
+        jwt.user_lookup_loader(self.user_lookup)
+
+    def load(self, identity: Any) -> Optional[Model]:
+        """load the user of the identity once per request
+
+        Args:
+            identity (Any): jwt identity
+
+        Returns:
+            Model | None: user object
+        """
+        users: dict[Any, Optional[Model]] = g.setdefault("_identity_users", {})
+        if (user := users.get((self.model, identity), _MISSING)) is _MISSING:
+            user = self.db.session.get(
+                self.model, identity, options=self.options
+            )
+            users[(self.model, identity)] = user
+        return user
+
+    def forget(self, identity: Any) -> None:
+        """drop the memoized user of the identity in the current request
+
+        Args:
+            identity (Any): jwt identity
+        """
+        g.get("_identity_users", {}).pop((self.model, identity), None)
+
+    def user_lookup(
+        self, _jwt_header: dict[str, str], jwt_payload: dict
+    ) -> Optional[Model]:
+        """user lookup loader
+
+        Args:
+            _jwt_header (dict[str, str]): jwt header
+            jwt_payload (dict): jwt payload
+
+        Returns:
+            Model | None: user object
+        """
+        return self.load(jwt_payload[config.identity_claim_key])
+
+    def is_valid(self, identity: Any) -> bool:
+        """judge whether the user of the identity exists and is valid
+
+        Args:
+            identity (Any): jwt identity
+
+        Returns:
+            bool: whether the user is valid
+        """
+        if (user := self.load(identity)) is None:
+            return False
+        if self.valid_attr_name is None:
+            return True
+        return bool(getattr(user, self.valid_attr_name))
+
+
+class PermissionCache:
+    """per-worker cache of `(user_id, route) -> allowed` decisions
+
+    Decisions are kept in a local LRU under a per-user authorization epoch.
+    Bumping the epoch of a user whenever the roles or routes of the user
+    change makes every cached decision of the user unreachable at once, so
+    revocation does not wait for expiry. With redis, epochs are shared by
+    every worker and read through a local cache for `epoch_timeout`
+    seconds, so a bump reaches the other workers within that time and
+    requests usually cost no round trip.
+
+    A computed decision is only stored when the epoch it is filed under was
+    read before the request started, thus before the user was loaded.
+    Otherwise a bump landing between loading the user and reading the epoch
+    could file a decision made from the stale user under the new epoch.
+
+    Args:
+        app (Flask, optional): app instance. Defaults to None.
+        db (SQLAlchemy, optional): sqlalchemy extension for bumping epochs
+        after commit. Defaults to None.
+        client (redis.Redis, optional): redis client. Defaults to the one of
+        `CACHE_REDIS_URL` or a process-local store when it is not set.
+        maxsize (int, optional): size of the local LRU. Defaults to 4096.
+        epoch_timeout (float, optional): seconds to keep epochs read from
+        redis. Defaults to 5.0.
+        key_prefix (str, optional): redis key prefix. Defaults to "authz".
+    """
+
+    def __init__(
+        self,
+        app: Optional[Flask] = None,
+        *,
+        db: Optional[SQLAlchemy] = None,
+        client: Optional[redis.Redis] = None,
+        maxsize: int = 4096,
+        epoch_timeout: float = 5.0,
+        key_prefix: str = "authz",
+    ) -> None:
+        self.client: Optional[redis.Redis] = client
+        self.local: LRUCache = LRUCache(maxsize)
+        self.epochs: LRUCache = LRUCache(maxsize)
+        self.epoch_timeout: float = epoch_timeout
+        self.key_prefix: str = key_prefix
+        self._epochs: dict[Hashable, tuple[int, float]] = {}
+        if db is not None:
+            event.listen(db.session, "after_commit", self._after_commit)
+            event.listen(db.session, "after_rollback", self._after_rollback)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        """register the cache on the app
+
+        Args:
+            app (Flask): app instance
+        """
+        if (
+            self.client is None
+            and app.config.get("CACHE_REDIS_URL") is not None
+        ):
+            self.client = redis.StrictRedis.from_url(
+                app.config["CACHE_REDIS_URL"]
+            )
+        app.before_request(self._start_request)
+        app.extensions["permission_cache"] = self
+
+    @staticmethod
+    def _start_request() -> None:
+        g._authz_started = time.time()
+
+    def _epoch_key(self, user_id: Hashable) -> str:
+        return f"{self.key_prefix}:epoch:{user_id}"
+
+    def _epoch(self, user_id: Hashable) -> tuple[int, float]:
+        """authorization epoch of the user and the time it was known since"""
+        if self.client is None:
+            return self._epochs.get(user_id, (0, 0.0))
+        if (known := self.epochs.get(user_id)) is None:
+            epoch: int = int(self.client.get(self._epoch_key(user_id)) or 0)
+            known = (epoch, time.time())
+            self.epochs.set(user_id, known, known[1] + self.epoch_timeout)
+        return known
+
+    def epoch(self, user_id: Hashable) -> int:
+        """current authorization epoch of the user
+
+        Args:
+            user_id (Hashable): id of the user
+
+        Returns:
+            int: authorization epoch
+        """
+        return self._epoch(user_id)[0]
+
+    def bump(self, *user_ids: Hashable) -> None:
+        """bump authorization epochs to invalidate cached decisions
+
+        Args:
+            user_ids (Hashable): ids of the users
+        """
+        if not user_ids:
+            return
+        if self.client is not None:
+            pipeline = self.client.pipeline(transaction=False)
+            for user_id in user_ids:
+                pipeline.incr(self._epoch_key(user_id))
+            pipeline.execute()
+            for user_id in user_ids:
+                self.epochs.pop(user_id)
+        else:
+            now: float = time.time()
+            for user_id in user_ids:
+                self._epochs[user_id] = (self.epoch(user_id) + 1, now)
+
+    def bump_on_commit(self, session: Session, *user_ids: Hashable) -> None:
+        """bump authorization epochs after the session commits
+
+        Args:
+            session (Session): session that changes the users
+            user_ids (Hashable): ids of the users
+        """
+        session.info.setdefault("_authz_pending", set()).update(user_ids)
+
+    def _after_commit(self, session: Session) -> None:
+        if pending := session.info.pop("_authz_pending", None):
+            self.bump(*pending)
+
+    def _after_rollback(self, session: Session) -> None:
+        session.info.pop("_authz_pending", None)
+
+    def judge(
+        self, user_id: Hashable, route: str, compute: Callable[[], bool]
+    ) -> bool:
+        """look up a decision, computing and caching it on a miss
+
+        Args:
+            user_id (Hashable): id of the user
+            route (str): route to access
+            compute (Callable[[], bool]): function to make the decision
+
+        Returns:
+            bool: whether permitted
+        """
+        epoch, since = self._epoch(user_id)
+        if (allowed := self.local.get((user_id, epoch, route))) is not None:
+            return allowed
+        allowed = compute()
+        if (started := g.get("_authz_started")) is not None and since < started:
+            self.local.set((user_id, epoch, route), allowed)
+        return allowed
+
+
+def get_permission_cache() -> Optional[PermissionCache]:
+    """permission cache of the current app
+
+    Returns:
+        PermissionCache | None: permission cache
+    """
+    return current_app.extensions.get("permission_cache")
+
+
+class RevocationFilter:
+    """bloom filter front of the revoked jwt ids kept in redis
+
+    Revoked jwt ids live in a redis sorted set scored by revocation time.
+    Every worker mirrors them into a local bloom filter through periodic
+    delta pulls, so redis is only queried on a probable hit. Without redis,
+    revoked ids are kept by the process until their token expires.
+
+    Args:
+        app (Flask, optional): app instance. Defaults to None.
+        client (redis.Redis, optional): redis client. Defaults to the one of
+        `CACHE_REDIS_URL` or a process-local store when it is not set.
+        capacity (int, optional): expected count of revoked ids.
+        Defaults to 100000.
+        error_rate (float, optional): false positive rate of the bloom
+        filter. Defaults to 0.001.
+        sync_interval (float, optional): seconds between delta pulls.
+        Defaults to 5.0.
+        retention (timedelta, optional): how long revoked ids are kept.
+        Defaults to the longest jwt lifetime of the app.
+        key (str, optional): redis key. Defaults to "revoked_jti".
+        legacy_prefix (str, optional): key prefix of jwt ids revoked through
+        flask-caching before the upgrade, e.g. "flask_cache_". The ids under
+        it are copied into the sorted set once, when the filter is
+        registered, so stop revoking through flask-caching before deploying.
+        Unset it once the longest token lifetime has passed since the
+        upgrade. Defaults to `REVOCATION_LEGACY_PREFIX`.
+    """
+
+    def __init__(
+        self,
+        app: Optional[Flask] = None,
+        *,
+        client: Optional[redis.Redis] = None,
+        capacity: int = 100000,
+        error_rate: float = 0.001,
+        sync_interval: float = 5.0,
+        retention: Optional[timedelta] = None,
+        key: str = "revoked_jti",
+        legacy_prefix: Optional[str] = None,
+    ) -> None:
+        self.client: Optional[redis.Redis] = client
+        self.capacity: int = capacity
+        self.error_rate: float = error_rate
+        self.sync_interval: float = sync_interval
+        self.retention: Optional[timedelta] = retention
+        self.key: str = key
+        self.legacy_prefix: Optional[str] = legacy_prefix
+        self.bloom: BloomFilter = BloomFilter(capacity, error_rate)
+        self._revoked: dict[str, float] = {}
+        self._expiries: list[tuple[float, str]] = []
+        self._pulled_at: Optional[float] = None
+        self._lock: Lock = Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        """register the filter on the app
+
+        Args:
+            app (Flask): app instance
+        """
+        if (
+            self.client is None
+            and app.config.get("CACHE_REDIS_URL") is not None
+        ):
+            self.client = redis.StrictRedis.from_url(
+                app.config["CACHE_REDIS_URL"]
+            )
+        if self.retention is None:
+            lifetimes: list[timedelta] = [
+                lifetime
+                for lifetime in (
+                    app.config.get(
+                        "JWT_ACCESS_TOKEN_EXPIRES", timedelta(minutes=15)
+                    ),
+                    app.config.get(
+                        "JWT_REFRESH_TOKEN_EXPIRES", timedelta(days=30)
+                    ),
+                )
+                if isinstance(lifetime, timedelta)
+            ]
+            self.retention = max(lifetimes) if lifetimes else None
+        if self.legacy_prefix is None:
+            self.legacy_prefix = app.config.get("REVOCATION_LEGACY_PREFIX")
+        if self.legacy_prefix is not None and self.client is not None:
+            self._migrate_legacy()
+        app.extensions["revocation_filter"] = self
+
+    def _migrate_legacy(self) -> None:
+        """copy the ids revoked under the legacy prefix into the sorted set"""
+        prefix: bytes = self.legacy_prefix.encode()
+        pattern: bytes = re.sub(rb"([*?\[\]\\])", rb"\\\1", prefix) + b"*"
+        now: float = time.time()
+        for keys in batched(self.client.scan_iter(match=pattern), 1000):
+            self.client.zadd(
+                self.key, {key[len(prefix) :].decode(): now for key in keys}
+            )
+
+    def revoke(self, jti: str, expires_at: Optional[float] = None) -> None:
+        """revoke a jwt id
+
+        Args:
+            jti (str): jwt id
+            expires_at (float, optional): `exp` claim of the token, when the
+            process-local store forgets the id. Defaults to the retention
+            from now.
+        """
+        now: float = time.time()
+        if self.client is not None:
+            pipeline = self.client.pipeline(transaction=False)
+            pipeline.zadd(self.key, {jti: now})
+            if self.retention is not None:
+                pipeline.zremrangebyscore(
+                    self.key, "-inf", now - self.retention.total_seconds()
+                )
+            pipeline.execute()
+            with self._lock:
+                self.bloom.add(jti)
+            return
+        if expires_at is None:
+            expires_at = (
+                now + self.retention.total_seconds()
+                if self.retention is not None
+                else math.inf
+            )
+        with self._lock:
+            self._expire(now)
+            self._revoked[jti] = max(expires_at, self._revoked.get(jti, 0.0))
+            heapq.heappush(self._expiries, (expires_at, jti))
+            if self.bloom.saturated:
+                self.bloom = BloomFilter(
+                    max(self.capacity, 2 * len(self._revoked)), self.error_rate
+                )
+                for revoked in self._revoked:
+                    self.bloom.add(revoked)
+            else:
+                self.bloom.add(jti)
+
+    def _expire(self, now: float) -> None:
+        """forget the process-local ids whose token has expired"""
+        while self._expiries and self._expiries[0][0] <= now:
+            expires_at, jti = heapq.heappop(self._expiries)
+            if self._revoked.get(jti) == expires_at:
+                del self._revoked[jti]
+
+    def sync(self, force: bool = False) -> None:
+        """pull revoked ids from redis into the bloom filter
+
+        Args:
+            force (bool, optional): ignore the sync interval.
+            Defaults to False.
+        """
+        if self.client is None:
+            return
+        now: float = time.time()
+        pulled_at: Optional[float] = self._pulled_at
+        if (
+            not force
+            and pulled_at is not None
+            and now - pulled_at < self.sync_interval
+        ):
+            return
+        with self._lock:
+            if self._pulled_at != pulled_at:
+                return
+            if pulled_at is None or self.bloom.saturated:
+                jtis: list[bytes] = self.client.zrange(self.key, 0, -1)
+                self.bloom = BloomFilter(
+                    max(self.capacity, 2 * len(jtis)), self.error_rate
+                )
+            else:
+                # overlap one interval to tolerate clock skew among workers
+                jtis = self.client.zrangebyscore(
+                    self.key, pulled_at - self.sync_interval, "+inf"
+                )
+            for jti in jtis:
+                self.bloom.add(jti)
+            self._pulled_at = now
+
+    def is_revoked(self, jti: str) -> bool:
+        """judge whether the jwt id is revoked
+
+        Args:
+            jti (str): jwt id
+
+        Returns:
+            bool: whether revoked
+        """
+        self.sync()
+        if jti not in self.bloom:
+            return False
+        if self.client is not None:
+            return self.client.zscore(self.key, jti) is not None
+        if (expires_at := self._revoked.get(jti)) is None:
+            return False
+        return expires_at > time.time()
+
+    def blocklist_loader(
+        self, _jwt_header: dict[str, str], jwt_payload: dict
+    ) -> bool:
+        """token in blocklist loader
+
+        Args:
+            _jwt_header (dict[str, str]): jwt header
+            jwt_payload (dict): jwt payload
+
+        Returns:
+            bool: whether the token is revoked
+        """
+        return self.is_revoked(jwt_payload["jti"])
@@ -22,7 +22,14 @@ from webargs.multidictproxy import MultiDictProxy
 from werkzeug import exceptions as http_exceptions
 
 from .parameter import Parameters
-from .schema import DefaultHTTPErrorSchema, Model, Schema, StandardSchema
+from .schema import (
+    DefaultHTTPErrorSchema,
+    Model,
+    Schema,
+    StandardSchema,
+    stream_response,
+)
+from .sqlalchemy import check_deadline
 from .util import API_DEFAULT_HTTP_CODE_MESSAGES
 
 
@@ -97,6 +104,12 @@ class Namespace(OriginalNamespace):
                 func (FunctionType): function to decorate
             """
             assert location or locations
+
+            @wraps(func)
+            def checked(*args, **kwargs):
+                check_deadline()
+                return flask.current_app.ensure_sync(func)(*args, **kwargs)
+
             if locations is not None:
                 assert set(locations) <= {
                     "query",
@@ -163,7 +176,7 @@ class Namespace(OriginalNamespace):
                             params,
                             location="_and_".join(locations),
                             as_kwargs=as_kwargs,
-                        )(func)
+                        )(checked)
                     )
                 )
             assert location in {
@@ -186,7 +199,7 @@ class Namespace(OriginalNamespace):
                         params,
                         location=location2webargs_location[location],
                         as_kwargs=as_kwargs,
-                    )(func)
+                    )(checked)
                 )
             )
 
@@ -224,7 +237,7 @@ class Namespace(OriginalNamespace):
             if model
             else StandardSchema(message)
             if code == HTTPStatus.OK
-            else DefaultHTTPErrorSchema(http_code=code)
+            else DefaultHTTPErrorSchema.of(code)
             if code != HTTPStatus.NO_CONTENT
             else None
         )
@@ -238,7 +251,9 @@ class Namespace(OriginalNamespace):
             """
 
             def dump_wrapper(*args, **kwargs):
-                response = func(*args, **kwargs)
+                # async handlers run through `Flask.async_to_sync`
+                response = flask.current_app.ensure_sync(func)(*args, **kwargs)
+                check_deadline()
 
                 extra_headers: None = None
                 if isinstance(response, flask.Response) or model is None:
@@ -249,6 +264,12 @@ class Namespace(OriginalNamespace):
                     _code = code
 
                 if HTTPStatus(_code) is code:
+                    if (
+                        streamed := stream_response(
+                            model, response, _code, extra_headers
+                        )
+                    ) is not None:
+                        return streamed
                     response = model.dump(response)
                 return response, _code, extra_headers
 
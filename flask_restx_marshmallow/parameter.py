@@ -7,22 +7,25 @@ LastEditors: 1746104160 shaojiahong2001@outlook.com
 LastEditTime: 2023-06-16 14:15:27
 FilePath: /flask_restx_marshmallow/flask_restx_marshmallow/parameter.py
 """
-import importlib
+import copy
 from dataclasses import dataclass
-from types import ModuleType
-from typing import Generator
+from typing import Generator, Optional
 
 from marshmallow import EXCLUDE, Schema, fields
 
+from .schema import FieldNamesMixin, SchemaMeta, json
 from .util import ObjectDict
 
 
-class Parameters(Schema):
+class Parameters(FieldNamesMixin, Schema, metaclass=SchemaMeta):
     """
     Author: 1746104160
     msg: Base Parameters
     """
 
+    location: Optional[str] = None
+    _default_location_fields: frozenset[str] = frozenset()
+
     @dataclass
     class Meta:
         """
@@ -32,23 +35,54 @@ class Parameters(Schema):
 
         unknown: str = EXCLUDE
 
+    @classmethod
+    def _prepare_fields(cls) -> None:
+        """mark declared fields load only, set the class location on fields
+        without their own and render with orjson, called by `SchemaMeta`
+        once the class is created"""
+        # fields inherited as they are keep following the class location
+        inherited: dict[str, fields.Field] = {
+            name: base._declared_fields[name]
+            for base in reversed(cls.__mro__[1:])
+            for name in vars(base).get("_default_location_fields", ())
+        }
+        cls._default_location_fields = frozenset(
+            name
+            for name, field in cls._declared_fields.items()
+            if not field.metadata.get("location")
+            or inherited.get(name) is field
+        )
+        for name, field in cls._declared_fields.items():
+            relocate: bool = bool(
+                cls.location and name in cls._default_location_fields
+            )
+            if field.load_only and not relocate:
+                continue
+            # fields are shared with the base classes, flag a copy
+            field = cls._declared_fields[name] = copy.copy(field)
+            field.load_only = True
+            if relocate:
+                field.metadata = {**field.metadata, "location": cls.location}
+        cls.opts.render_module = json
+
     def __init__(
-        self, *, add_jwt: bool = False, location: str, **kwargs
+        self,
+        *,
+        add_jwt: bool = False,
+        location: Optional[str] = None,
+        **kwargs,
     ) -> None:
         super().__init__(**kwargs)
-        for field in self.fields.values():
-            field.load_only = True
-            if not field.metadata.get("location"):
-                field.metadata["location"] = location
+        if location and location != self.location:
+            # the fields of the instance are copies of the class ones, but
+            # still share their metadata with them
+            for name in self._default_location_fields & self.fields.keys():
+                field: fields.Field = self.fields[name]
+                field.metadata = {**field.metadata, "location": location}
         if add_jwt:
             self.fields["jwt"] = fields.String(
                 metadata={"description": "JWT", "location": "query"}
             )
-        try:
-            json: ModuleType = importlib.import_module("orjson")
-        except ModuleNotFoundError:
-            json = importlib.import_module("json")
-        self.opts.render_module = json
 
     @property
     def dict_class(self) -> type:
@@ -76,8 +110,7 @@ class QueryParameters(Parameters):
     msg: query parameters
     """
 
-    def __init__(self, **kwargs) -> None:
-        super().__init__(location="query", **kwargs)
+    location: str = "query"
 
 
 class PostFormParameters(Parameters):
@@ -86,8 +119,7 @@ class PostFormParameters(Parameters):
     msg: form parameters
     """
 
-    def __init__(self, **kwargs) -> None:
-        super().__init__(location="formData", **kwargs)
+    location: str = "formData"
 
 
 class JSONParameters(Parameters):
@@ -96,8 +128,7 @@ class JSONParameters(Parameters):
     msg: json parameters
     """
 
-    def __init__(self, **kwargs) -> None:
-        super().__init__(location="body", **kwargs)
+    location: str = "body"
 
 
 class CookieParameters(Parameters):
@@ -106,8 +137,7 @@ class CookieParameters(Parameters):
     msg: cookie parameters
     """
 
-    def __init__(self, **kwargs) -> None:
-        super().__init__(location="cookie", **kwargs)
+    location: str = "cookie"
 
 
 class HeaderParameters(Parameters):
@@ -116,5 +146,4 @@ class HeaderParameters(Parameters):
     msg: header parameters
     """
 
-    def __init__(self, **kwargs) -> None:
-        super().__init__(location="header", **kwargs)
+    location: str = "header"
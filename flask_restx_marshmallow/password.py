@@ -0,0 +1,209 @@
+"""
+Description: password hashing service of flask_restx_marshmallow
+version: 0.1.1
+Author: 1746104160
+Date: 2026-10-19 14:03:52
+LastEditors: 1746104160 shaojiahong2001@outlook.com
+LastEditTime: 2026-10-19 14:03:52
+FilePath: /flask_restx_marshmallow/flask_restx_marshmallow/password.py
+"""
+import multiprocessing
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from functools import lru_cache
+from http import HTTPStatus
+from threading import BoundedSemaphore, Lock
+from typing import Any, Callable, Iterable, Optional
+
+from flask import Flask
+from passlib.context import CryptContext
+from werkzeug.exceptions import HTTPException
+
+
+class PasswordHasherSaturated(HTTPException):
+    """
+    Author: 1746104160
+    msg: raised when the password hasher can not take more work
+    """
+
+    code: int = HTTPStatus.SERVICE_UNAVAILABLE.value
+    description: str = "password hashing is saturated"
+
+    def __init__(self, code: int, retry_after: Optional[int] = None) -> None:
+        super().__init__()
+        self.code = code
+        self.retry_after: Optional[int] = retry_after
+
+
+@lru_cache(maxsize=8)
+def _context(
+    schemes: tuple[str, ...], deprecated: tuple[str, ...] | str
+) -> CryptContext:
+    """crypt context cached in every worker process"""
+    return CryptContext(schemes=schemes, deprecated=deprecated)
+
+
+def _hash(
+    schemes: tuple[str, ...], deprecated: tuple[str, ...] | str, secret: str
+) -> str:
+    return _context(schemes, deprecated).hash(secret)
+
+
+def _verify_and_update(
+    schemes: tuple[str, ...],
+    deprecated: tuple[str, ...] | str,
+    secret: str,
+    hashed: str | bytes,
+) -> tuple[bool, Optional[str]]:
+    return _context(schemes, deprecated).verify_and_update(secret, hashed)
+
+
+class PasswordHasher:
+    """password hashing and verification on a dedicated process pool
+
+    The key derivation runs outside the request thread, and at most
+    `max_pending` jobs are queued. Further calls raise
+    `PasswordHasherSaturated`, which `Api` renders with the default http
+    error envelope, so credential stuffing can not starve other endpoints.
+
+    Args:
+        app (Flask, optional): app instance. Defaults to None.
+        schemes (Iterable[str], optional): passlib schemes.
+        Defaults to ("pbkdf2_sha512",).
+        deprecated (Iterable[str] | str, optional): deprecated passlib
+        schemes. Defaults to "auto".
+        max_workers (int, optional): size of the process pool of every web
+        worker process, 0 hashes in the calling thread. Keep it small, since
+        each web worker owns its own pool. Defaults to
+        `PASSWORD_HASHER_MAX_WORKERS` or 1.
+        max_pending (int, optional): maximum jobs in flight. Defaults to 32.
+        timeout (float, optional): seconds to wait for a job.
+        Defaults to 5.0.
+        saturated_code (int, optional): http status code when saturated.
+        Defaults to 503.
+    """
+
+    def __init__(
+        self,
+        app: Optional[Flask] = None,
+        *,
+        schemes: Iterable[str] = ("pbkdf2_sha512",),
+        deprecated: Iterable[str] | str = "auto",
+        max_workers: Optional[int] = None,
+        max_pending: int = 32,
+        timeout: float = 5.0,
+        saturated_code: int = HTTPStatus.SERVICE_UNAVAILABLE.value,
+    ) -> None:
+        assert saturated_code in {
+            HTTPStatus.SERVICE_UNAVAILABLE.value,
+            HTTPStatus.TOO_MANY_REQUESTS.value,
+        }
+        self.schemes: tuple[str, ...] = tuple(schemes)
+        self.deprecated: tuple[str, ...] | str = (
+            deprecated if isinstance(deprecated, str) else tuple(deprecated)
+        )
+        self.max_workers: Optional[int] = max_workers
+        self.timeout: float = timeout
+        self.saturated_code: int = saturated_code
+        self._slots: BoundedSemaphore = BoundedSemaphore(max_pending)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pid: Optional[int] = None
+        self._lock: Lock = Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        """register the hasher on the app
+
+        Args:
+            app (Flask): app instance
+        """
+        if self.max_workers is None:
+            self.max_workers = app.config.get("PASSWORD_HASHER_MAX_WORKERS", 1)
+        app.extensions["password_hasher"] = self
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        """process pool of the current process, created after fork"""
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(
+                    self.max_workers or 1,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+                self._pid = os.getpid()
+            return self._executor
+
+    def _run(self, func: Callable, *args) -> Any:
+        """run a job within the bounded queue
+
+        Raises:
+            PasswordHasherSaturated: queue is full or job timed out
+
+        Returns:
+            Any: job result
+        """
+        if self.max_workers == 0:
+            return func(self.schemes, self.deprecated, *args)
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHasherSaturated(
+                self.saturated_code, retry_after=int(self.timeout) or 1
+            )
+        try:
+            future: Future = self.executor.submit(
+                func, self.schemes, self.deprecated, *args
+            )
+        except BaseException:
+            self._slots.release()
+            raise
+        # keep the slot until the job leaves the pool, even after a timeout
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError as err:
+            future.cancel()
+            raise PasswordHasherSaturated(
+                self.saturated_code, retry_after=int(self.timeout) or 1
+            ) from err
+
+    def hash(self, secret: str) -> str:
+        """hash a password
+
+        Args:
+            secret (str): plain password
+
+        Returns:
+            str: password hash
+        """
+        return self._run(_hash, secret)
+
+    def verify_and_update(
+        self, secret: str, hashed: Any
+    ) -> tuple[bool, Optional[str]]:
+        """verify a password and rehash it when its scheme is deprecated
+
+        Args:
+            secret (str): plain password
+            hashed (Any): password hash, or an object with a `hash` attribute
+            like `sqlalchemy_utils.Password`
+
+        Returns:
+            tuple[bool, str | None]: whether matched and the new hash
+        """
+        if (hashed := getattr(hashed, "hash", hashed)) is None:
+            return False, None
+        return self._run(_verify_and_update, secret, hashed)
+
+    def verify(self, secret: str, hashed: Any) -> bool:
+        """verify a password
+
+        Args:
+            secret (str): plain password
+            hashed (Any): password hash, or an object with a `hash` attribute
+            like `sqlalchemy_utils.Password`
+
+        Returns:
+            bool: whether matched
+        """
+        return self.verify_and_update(secret, hashed)[0]
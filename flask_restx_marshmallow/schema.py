@@ -7,13 +7,19 @@ LastEditors: 1746104160 shaojiahong2001@outlook.com
 LastEditTime: 2023-06-16 14:16:11
 FilePath: /flask_restx_marshmallow/flask_restx_marshmallow/schema.py
 """
+import copy
 import importlib
+from collections import defaultdict
+from functools import lru_cache
+from itertools import chain
 from types import ModuleType
-from typing import Optional
+from typing import Any, Iterator, Optional
 
+from flask import Response, current_app, stream_with_context
 from flask_restx.model import Model as OriginalModel
 from marshmallow import Schema as OriginalSchema
 from marshmallow import fields
+from marshmallow.schema import SchemaMeta as OriginalSchemaMeta
 from marshmallow_sqlalchemy import (
     SQLAlchemyAutoSchema as OriginalSQLAlchemyAutoSchema,
 )
@@ -26,11 +32,28 @@ from marshmallow_sqlalchemy.convert import (
     _has_default,
     _set_meta_kwarg,
 )
-from sqlalchemy import Column, Table
+from marshmallow_sqlalchemy.schema import (
+    SQLAlchemyAutoSchemaMeta as OriginalSQLAlchemyAutoSchemaMeta,
+)
+from marshmallow_sqlalchemy.schema import (
+    SQLAlchemySchemaMeta as OriginalSQLAlchemySchemaMeta,
+)
+from sqlalchemy import Column, Table, inspect, select
+from sqlalchemy.engine import MappingResult, Result, ScalarResult
+from sqlalchemy.orm import (
+    RelationshipProperty,
+    Session,
+    joinedload,
+    load_only,
+    selectinload,
+)
+from sqlalchemy.orm.interfaces import LoaderOption
 from sqlalchemy_utils.types import ScalarListType
 from typing_extensions import Self
+from werkzeug.exceptions import HTTPException
 from werkzeug.utils import cached_property
 
+from .sqlalchemy import batched
 from .util import (
     API_DEFAULT_HTTP_CODE_MESSAGES,
     ObjectDict,
@@ -38,35 +61,113 @@ from .util import (
     get_default,
 )
 
+try:
+    json: ModuleType = importlib.import_module("orjson")
+except ModuleNotFoundError:
+    json = importlib.import_module("json")
+
+
+class SchemaMeta(OriginalSchemaMeta):
+    """
+    Author: 1746104160
+    msg: Prepare declared fields and options once per schema class
+    """
+
+    def __new__(mcs, name: str, bases: tuple, attrs: dict) -> type:
+        klass: type = super().__new__(mcs, name, bases, attrs)
+        klass._prepare_fields()
+        klass._field_names = {}
+        return klass
+
+
+class SQLAlchemySchemaMeta(SchemaMeta, OriginalSQLAlchemySchemaMeta):
+    """
+    Author: 1746104160
+    msg: SchemaMeta for SQLAlchemySchema
+    """
+
+
+class SQLAlchemyAutoSchemaMeta(SchemaMeta, OriginalSQLAlchemyAutoSchemaMeta):
+    """
+    Author: 1746104160
+    msg: SchemaMeta for SQLAlchemyAutoSchema
+    """
+
 
-class SchemaMixin:
+class FieldNamesMixin:
+    """
+    Author: 1746104160
+    msg: Reuse the field names resolved for the same schema options
+    """
+
+    _field_names: dict[tuple, tuple[tuple[str, ...], ...]] = {}
+
+    def _init_fields(self) -> None:
+        """bind fields by the names resolved and checked by the first
+        instance with the same `only`, `exclude`, `load_only` and `dump_only`
+        """
+        key: tuple = (
+            None if self.only is None else frozenset(self.only),
+            frozenset(self.exclude),
+            frozenset(self.load_only),
+            frozenset(self.dump_only),
+        )
+        if (names := self._field_names.get(key)) is None:
+            super()._init_fields()
+            if len(self._field_names) < 128:
+                self._field_names[key] = (
+                    tuple(self.fields),
+                    tuple(self.load_fields),
+                    tuple(self.dump_fields),
+                )
+            return
+        field_names, load_names, dump_names = names
+        bound_fields: dict[str, fields.Field] = {}
+        for field_name in field_names:
+            field_obj: fields.Field = (
+                self.declared_fields[field_name]
+                if field_name in self.declared_fields
+                else fields.Inferred()
+            )
+            self._bind_field(field_name, field_obj)
+            bound_fields[field_name] = field_obj
+        self.fields = self.dict_class(bound_fields)
+        self.load_fields = self.dict_class(
+            (field_name, bound_fields[field_name]) for field_name in load_names
+        )
+        self.dump_fields = self.dict_class(
+            (field_name, bound_fields[field_name]) for field_name in dump_names
+        )
+
+
+class SchemaMixin(FieldNamesMixin):
     """
     Author: 1746104160
-    msg: Support deepcopy
+    msg: Support deepcopy and mark fields dump only
     """
 
+    @classmethod
+    def _prepare_fields(cls) -> None:
+        """mark declared fields dump only and render with orjson, called
+        by `SchemaMeta` once the class is created"""
+        for name, field in cls._declared_fields.items():
+            if not field.dump_only:
+                # fields are shared with the base classes, flag a copy
+                field = cls._declared_fields[name] = copy.copy(field)
+                field.dump_only = True
+        cls.opts.render_module = json
+
     def __deepcopy__(self, _) -> Self:
         """support deepcopy"""
         return self
 
 
-class Schema(SchemaMixin, OriginalSchema):
+class Schema(SchemaMixin, OriginalSchema, metaclass=SchemaMeta):
     """
     Author: 1746104160
     msg: Support deepcopy and change default dict class
     """
 
-    def __init__(self, **kwargs) -> None:
-        super().__init__(**kwargs)
-        for field in self.fields.values():
-            field.dump_only = True
-        try:
-            json: ModuleType = importlib.import_module("orjson")
-        except ModuleNotFoundError:
-            json = importlib.import_module("json")
-
-        self.opts.render_module = json
-
     @property
     def dict_class(self) -> type:
         return ObjectDict
@@ -163,50 +264,254 @@ class ModelConverter(OriginalModelConverter):
         return kwargs
 
 
-class SQLAlchemySchema(SchemaMixin, OriginalSQLAlchemySchema):
+class SQLAlchemySchemaMixin(SchemaMixin):
     """
     Author: 1746104160
-    msg: Support deepcopy and change default dict class
+    msg: Convert models with the patched converter and plan their loading
     """
 
-    def __init__(self, **kwargs) -> None:
-        super().__init__(**kwargs)
-        for field in self.fields.values():
-            field.dump_only = True
-        try:
-            json: ModuleType = importlib.import_module("orjson")
-        except ModuleNotFoundError:
-            json = importlib.import_module("json")
-
-        self.opts.render_module = json
-        self.opts.model_converter: type[ModelConverter] = ModelConverter
+    @classmethod
+    def _prepare_fields(cls) -> None:
+        super()._prepare_fields()
+        cls.opts.model_converter: type[ModelConverter] = ModelConverter
 
     @property
     def dict_class(self) -> type:
         return ObjectDict
 
+    @classmethod
+    @lru_cache(maxsize=None)
+    def loader_options(cls) -> tuple[LoaderOption, ...]:
+        """eager loading plan of the schema, see `compile_loader_options`
+
+        Returns:
+            tuple[LoaderOption, ...]: loader options of `Meta.model`
+        """
+        return compile_loader_options(cls())
+
+    @classmethod
+    @lru_cache(maxsize=None)
+    def row_loader(cls) -> "RowLoader":
+        """row mode loader of the schema, see `RowLoader`
+
+        Returns:
+            RowLoader: row loader of `Meta.model`
+        """
+        return RowLoader(cls())
 
-class SQLAlchemyAutoSchema(SchemaMixin, OriginalSQLAlchemyAutoSchema):
+
+class SQLAlchemySchema(
+    SQLAlchemySchemaMixin,
+    OriginalSQLAlchemySchema,
+    metaclass=SQLAlchemySchemaMeta,
+):
     """
     Author: 1746104160
     msg: Support deepcopy and change default dict class
     """
 
-    def __init__(self, **kwargs) -> None:
-        super().__init__(**kwargs)
-        for field in self.fields.values():
-            field.dump_only = True
-        try:
-            json: ModuleType = importlib.import_module("orjson")
-        except ModuleNotFoundError:
-            json = importlib.import_module("json")
 
-        self.opts.render_module = json
-        self.opts.model_converter: type[ModelConverter] = ModelConverter
+class SQLAlchemyAutoSchema(
+    SQLAlchemySchemaMixin,
+    OriginalSQLAlchemyAutoSchema,
+    metaclass=SQLAlchemyAutoSchemaMeta,
+):
+    """
+    Author: 1746104160
+    msg: Support deepcopy and change default dict class
+    """
 
-    @property
-    def dict_class(self) -> type:
-        return ObjectDict
+
+def _nested_schema(field: fields.Field) -> Optional[OriginalSchema]:
+    """schema nested in a `Nested`, `Pluck` or `List` of them"""
+    while isinstance(field, fields.List):
+        field = field.inner
+    return field.schema if isinstance(field, fields.Nested) else None
+
+
+def compile_loader_options(
+    schema: OriginalSchema,
+    model: Optional[type] = None,
+    *,
+    _path: tuple[tuple[type, type], ...] = (),
+) -> tuple[LoaderOption, ...]:
+    """compile the dump fields of a schema into loader options
+
+    Nested relationships are loaded with `selectinload` for collections and
+    `joinedload` for scalars, recursively with the options of their nested
+    schemas, and scalar columns are restricted with `load_only`. Applied to a
+    query, dumping its results never triggers lazy loads.
+
+    Args:
+        schema (Schema): schema instance, `only` and `exclude` are honored
+        model (type, optional): mapped class. Defaults to `Meta.model` of the
+        schema.
+
+    Returns:
+        tuple[LoaderOption, ...]: loader options
+    """
+    model = model or schema.opts.model
+    mapper = inspect(model)
+    columns: list = []
+    options: list[LoaderOption] = []
+    restrictable: bool = True
+    for name, field in schema.dump_fields.items():
+        attr_name, _, rest = (field.attribute or name).partition(".")
+        if (relationship := mapper.relationships.get(attr_name)) is not None:
+            option: LoaderOption = (
+                selectinload if relationship.uselist else joinedload
+            )(relationship.class_attribute)
+            nested: Optional[OriginalSchema] = (
+                None if rest else _nested_schema(field)
+            )
+            key: tuple[type, type] = (relationship.mapper.class_, type(nested))
+            if nested is not None and key not in _path:
+                option = option.options(
+                    *compile_loader_options(
+                        nested,
+                        relationship.mapper.class_,
+                        _path=(*_path, key),
+                    )
+                )
+            options.append(option)
+        elif (column := mapper.column_attrs.get(attr_name)) is not None:
+            columns.append(column.class_attribute)
+        else:
+            # properties may read any column
+            restrictable = False
+    if columns and restrictable:
+        options.append(load_only(*columns))
+    return tuple(options)
+
+
+class RowLoader:
+    """load exactly the columns a schema dumps as plain rows
+
+    The select holds a labelled column for every scalar field, and nested
+    relationships are fetched with one `IN` query per level, grouped by their
+    foreign keys, so no ORM instance is constructed. The rows are mappings
+    the schema dumps with the same field semantics as the model, as long as
+    its fields read plain columns and simple foreign key relationships.
+
+    Args:
+        schema (Schema): schema instance, `only` and `exclude` are honored
+        model (type, optional): mapped class. Defaults to `Meta.model` of the
+        schema.
+        batch_size (int, optional): keys per `IN` query. Defaults to 1000.
+
+    Raises:
+        ValueError: field not backed by a column or a nested relationship
+    """
+
+    def __init__(
+        self,
+        schema: OriginalSchema,
+        model: Optional[type] = None,
+        *,
+        batch_size: int = 1000,
+        _path: tuple[tuple[type, type], ...] = (),
+    ) -> None:
+        self.model: type = model or schema.opts.model
+        self.batch_size: int = batch_size
+        mapper = inspect(self.model)
+        self.columns: dict[str, Any] = {}
+        self.children: list[tuple[str, RelationshipProperty, RowLoader]] = []
+        for name, field in schema.dump_fields.items():
+            attr_name: str = field.attribute or name
+            if (column := mapper.column_attrs.get(attr_name)) is not None:
+                self.columns[attr_name] = column.class_attribute
+                continue
+            relationship: Optional[
+                RelationshipProperty
+            ] = mapper.relationships.get(attr_name)
+            nested: Optional[OriginalSchema] = _nested_schema(field)
+            if relationship is None or nested is None:
+                raise ValueError(
+                    f"{attr_name} of {type(schema).__name__} is neither a "
+                    "column nor a nested relationship"
+                )
+            key: tuple[type, type] = (relationship.mapper.class_, type(nested))
+            if key in _path or len(relationship.local_remote_pairs) != (
+                1 if relationship.secondary is None else 2
+            ):
+                raise ValueError(f"{attr_name} can not be loaded as rows")
+            local: Column = relationship.local_remote_pairs[0][0]
+            self.columns.setdefault(f"_key_{attr_name}", local)
+            self.children.append(
+                (
+                    attr_name,
+                    relationship,
+                    RowLoader(
+                        nested,
+                        relationship.mapper.class_,
+                        batch_size=batch_size,
+                        _path=(*_path, key),
+                    ),
+                )
+            )
+
+    def select(self) -> Any:
+        """select of the labelled columns, to be filtered and ordered
+
+        Returns:
+            Select: select statement
+        """
+        return select(
+            *(column.label(label) for label, column in self.columns.items())
+        )
+
+    def load(self, session: Session, statement: Any = None) -> list[dict]:
+        """execute a select built from `select` and attach nested rows
+
+        Args:
+            session (Session): session
+            statement (Select, optional): statement. Defaults to `select()`.
+
+        Returns:
+            list[dict]: rows to dump
+        """
+        rows: list[dict] = [
+            dict(row)
+            for row in session.execute(
+                self.select() if statement is None else statement
+            ).mappings()
+        ]
+        self._attach(session, rows)
+        return rows
+
+    def _attach(self, session: Session, rows: list[dict]) -> None:
+        """fetch the nested rows of every relationship with `IN` queries"""
+        for attr_name, relationship, child in self.children:
+            label: str = f"_key_{attr_name}"
+            keys: set = {row[label] for row in rows if row[label] is not None}
+            grouped: defaultdict[Any, list[dict]] = defaultdict(list)
+            if relationship.secondary is None:
+                ((_, remote),) = relationship.local_remote_pairs
+                join = None
+            else:
+                (_, remote), (
+                    target,
+                    secondary,
+                ) = relationship.local_remote_pairs
+                join = target == secondary
+            for batch in batched(keys, self.batch_size):
+                statement = child.select().add_columns(remote.label("_parent"))
+                if join is not None:
+                    statement = statement.join(relationship.secondary, join)
+                statement = statement.where(remote.in_(batch))
+                if relationship.order_by:
+                    statement = statement.order_by(*relationship.order_by)
+                child_rows: list[dict] = [
+                    dict(row) for row in session.execute(statement).mappings()
+                ]
+                child._attach(session, child_rows)
+                for row in child_rows:
+                    grouped[row.pop("_parent")].append(row)
+            for row in rows:
+                items: list[dict] = grouped.get(row[label], [])
+                row[attr_name] = (
+                    items if relationship.uselist else next(iter(items), None)
+                )
 
 
 class DefaultHTTPErrorSchema(Schema):
@@ -236,6 +541,228 @@ class DefaultHTTPErrorSchema(Schema):
             "message"
         ].dump_default = API_DEFAULT_HTTP_CODE_MESSAGES[http_code]
 
+    @classmethod
+    @lru_cache(maxsize=64)
+    def of(cls, http_code: int) -> Self:
+        """shared schema of the http code
+
+        Args:
+            http_code (int): http status code
+
+        Returns:
+            DefaultHTTPErrorSchema: schema instance
+        """
+        return cls(http_code=http_code)
+
+
+def encode_json(value: Any) -> bytes:
+    """encode a value to json bytes with orjson if available
+
+    Args:
+        value (Any): value to encode
+
+    Returns:
+        bytes: json bytes
+    """
+    if json.__name__ == "orjson":
+        return json.dumps(value, option=json.OPT_NON_STR_KEYS)
+    return json.dumps(value, separators=(",", ":")).encode()
+
+
+class ErrorEnvelope:
+    """
+    Author: 1746104160
+    msg: pre-encoded `DefaultHTTPErrorSchema` envelope of a http code
+    """
+
+    _placeholder: str = "\x00message\x00"
+
+    def __init__(self, http_code: int) -> None:
+        schema: DefaultHTTPErrorSchema = DefaultHTTPErrorSchema.of(http_code)
+        self.code: int = http_code
+        self.body: bytes = encode_json(schema.dump({}))
+        self.prefix, self.suffix = encode_json(
+            schema.dump({"message": self._placeholder})
+        ).split(encode_json(self._placeholder))
+
+    def response(self, message: Any = None) -> Response:
+        """build a response, splicing in the message if given
+
+        Args:
+            message (Any, optional): message. Defaults to the default message
+            of the http code.
+
+        Returns:
+            Response: flask response
+        """
+        return Response(
+            self.body
+            if message is None
+            else self.prefix + encode_json(message) + self.suffix,
+            status=self.code,
+            mimetype="application/json",
+        )
+
+
+_STREAM_PLACEHOLDER: str = "\x00stream\x00"
+
+
+def _find_result(
+    value: Any, path: tuple[str, ...] = ()
+) -> Optional[tuple[tuple[str, ...], Result | ScalarResult | MappingResult]]:
+    """path of the first sqlalchemy result in nested dicts"""
+    if isinstance(value, (Result, ScalarResult, MappingResult)):
+        return path, value
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if (found := _find_result(item, (*path, key))) is not None:
+                return found
+    return None
+
+
+def _field_of(schema: OriginalSchema, key: str) -> tuple[str, fields.Field]:
+    """dump key and field of an attribute of the schema"""
+    for name, field in schema.dump_fields.items():
+        if (field.attribute or name) == key:
+            return field.data_key or name, field
+    raise KeyError(f"{key} is not a field of {type(schema).__name__}")
+
+
+def _lead(value: dict, path: tuple[str, ...]) -> dict:
+    """copy of nested dicts with the keys along the path first"""
+    key, *rest = path
+    item: Any = _lead(value[key], tuple(rest)) if rest else value[key]
+    return {key: item, **{k: v for k, v in value.items() if k != key}}
+
+
+def stream_response(
+    schema: OriginalSchema,
+    value: Any,
+    status: int = 200,
+    headers: Any = None,
+) -> Optional[Response]:
+    """stream a value holding a sqlalchemy result as json
+
+    The result, returned in nested dicts, is dumped with its field of the
+    schema one partition at a time while its cursor is open, so run it with
+    `yield_per` or `stream_results` to keep the memory flat. A result
+    returned as is goes to the `data` field of the envelope, or makes up the
+    whole body of a schema with `many`. The surrounding envelope is encoded
+    once around it, with the streamed field first. The app context, and the
+    session with it, lives until the stream is closed.
+
+    As the status is sent before the rows, an error while streaming closes
+    the rows and ends the body with the error envelope in place of the rest
+    of the envelope, so that it still parses, with `success` false. A body
+    of rows alone is aborted instead.
+
+    Args:
+        schema (Schema): response schema
+        value (Any): value returned by the handler
+        status (int, optional): http status code. Defaults to 200.
+        headers (Any, optional): extra headers. Defaults to None.
+
+    Raises:
+        TypeError: the schema has no field for the result
+
+    Returns:
+        Response | None: streamed response, None without a result
+    """
+    if (found := _find_result(value)) is None:
+        return None
+    path, result = found
+    if not path and schema.many:
+        prefix, suffix, closing = b"", b"", None
+
+        def serialize(row: Any) -> Any:
+            return schema.dump(row, many=False)
+
+    else:
+        if not path:
+            if "data" not in schema.dump_fields:
+                raise TypeError(
+                    f"{type(schema).__name__} has no data field to stream into"
+                )
+            value, path = {"data": result}, ("data",)
+        stripped: dict = dict(value)
+        parent: dict = stripped
+        current: OriginalSchema = schema
+        out_path: list[str] = []
+        for key in path[:-1]:
+            out_key, field = _field_of(current, key)
+            out_path.append(out_key)
+            parent[key] = dict(parent[key])
+            parent = parent[key]
+            current = field.schema
+        # an empty list keeps the position of the key in the envelope
+        parent[path[-1]] = []
+        out_key, field = _field_of(current, path[-1])
+        if isinstance(field, fields.List):
+            field = field.inner
+        elif not isinstance(field, fields.Nested):
+            raise TypeError(f"{path[-1]} can not hold many values")
+        if isinstance(field, fields.Nested):
+            serialize = field.schema.dump
+        else:
+            # pylint: disable=protected-access
+            def serialize(row: Any) -> Any:
+                return field._serialize(row, None, None)
+
+        dumped: dict = schema.dump(stripped)
+        placeholder: dict = dumped
+        for key in out_path:
+            placeholder = placeholder[key]
+        placeholder[out_key] = _STREAM_PLACEHOLDER
+        prefix, suffix = encode_json(_lead(dumped, (*out_path, out_key))).split(
+            encode_json(_STREAM_PLACEHOLDER)
+        )
+        closing = b"]" + b"}" * len(out_path) + b","
+
+    partitions: Iterator = iter(result.partitions())
+    try:
+        # fail before the status is sent if the rows can not be fetched
+        first: list = next(partitions, [])
+    except BaseException:
+        result.close()
+        raise
+
+    def generate():
+        try:
+            yield prefix + b"["
+            separator: bytes = b""
+            for partition in chain((first,), partitions):
+                if partition:
+                    yield separator + encode_json(
+                        [serialize(row) for row in partition]
+                    )[1:-1]
+                    separator = b","
+        except Exception as error:  # pylint: disable=broad-except
+            if closing is None:
+                raise
+            current_app.logger.exception("streaming the response failed")
+            envelope: ErrorEnvelope = DEFAULT_HTTP_ERROR_ENVELOPES.get(
+                error.code if isinstance(error, HTTPException) else 500,
+                DEFAULT_HTTP_ERROR_ENVELOPES[500],
+            )
+            yield closing + envelope.body[1:]
+        else:
+            yield b"]" + suffix
+        finally:
+            result.close()
+
+    return Response(
+        stream_with_context(generate()),
+        status=status,
+        headers=headers,
+        mimetype="application/json",
+    )
+
+
+DEFAULT_HTTP_ERROR_ENVELOPES: dict[int, ErrorEnvelope] = {
+    http_code: ErrorEnvelope(http_code)
+    for http_code in API_DEFAULT_HTTP_CODE_MESSAGES
+}
+
 
 class Model(OriginalModel):
     """
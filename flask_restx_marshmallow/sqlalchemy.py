@@ -7,23 +7,2358 @@ LastEditors: 1746104160 shaojiahong2001@outlook.com
 LastEditTime: 2023-06-16 14:16:40
 FilePath: /flask_restx_marshmallow/flask_restx_marshmallow/sqlalchemy.py
 """
-from typing import Optional
-from weakref import WeakKeyDictionary
+import asyncio
+import atexit
+import hashlib
+import hmac
+import importlib
+import math
+import os
+import pickle
+import re
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from functools import lru_cache, wraps
+from itertools import count, islice
+from threading import Lock, Thread, local
+from typing import (
+    Any,
+    Callable,
+    Hashable,
+    Iterable,
+    Iterator,
+    Literal,
+    Optional,
+)
+from weakref import WeakKeyDictionary, WeakSet, ref
 
+import redis
 import sqlalchemy as sa
-from flask import Flask
+from flask import (
+    Flask,
+    Response,
+    current_app,
+    g,
+    has_app_context,
+    has_request_context,
+    request,
+    stream_with_context,
+)
 from flask_sqlalchemy import SQLAlchemy as original
 from flask_sqlalchemy.model import Model as originModel
-from flask_sqlalchemy.session import Session
+from flask_sqlalchemy.session import Session as originSession
+from flask_sqlalchemy.session import _app_ctx_id
 from flask_sqlalchemy.table import _Table as Table
-from sqlalchemy.orm import DeclarativeMeta, Query, scoped_session
+from marshmallow import ValidationError
+from marshmallow.validate import Validator
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_scoped_session,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import (
+    DeclarativeMeta,
+    InstrumentedAttribute,
+    Query,
+    scoped_session,
+)
+from sqlalchemy.orm.loading import merge_frozen_result
+from sqlalchemy.sql.util import find_tables
+from sqlalchemy.sql.visitors import InternalTraversal
 from typing_extensions import override
+from werkzeug.exceptions import ServiceUnavailable
+
+from .util import LRUCache
+
+READ_METHODS: frozenset[str] = frozenset({"GET", "HEAD", "OPTIONS"})
+WAIT_BUCKETS: tuple[float, ...] = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+PLACEHOLDER_LIST: re.Pattern = re.compile(
+    r"\(\s*(?:\?|%s|%\(\w+\)s|:\w+|\$\d+)"
+    r"(?:\s*,\s*(?:\?|%s|%\(\w+\)s|:\w+|\$\d+))+\s*\)"
+)
+
+
+def batched(iterable: Iterable, size: int) -> Iterator[list]:
+    """split an iterable into lists of at most `size` items
+
+    Args:
+        iterable (Iterable): items
+        size (int): batch size
+
+    Yields:
+        Iterator[list]: batches
+    """
+    iterator: Iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class QueryBudgetExceeded(AssertionError):
+    """
+    Author: 1746104160
+    msg: raised in strict mode when a request exceeds its query budget
+    """
+
+
+class DeadlineExceeded(ServiceUnavailable):
+    """
+    Author: 1746104160
+    msg: raised when a request runs past its deadline
+    """
+
+    description: str = "request deadline exceeded"
+
+
+class ReadOnlySessionError(sa.exc.InvalidRequestError):
+    """
+    Author: 1746104160
+    msg: raised when a read-only session is about to write
+    """
+
+
+class QueryStatistics:
+    """
+    Author: 1746104160
+    msg: statements executed within an app context, grouped by shape
+    """
+
+    def __init__(self) -> None:
+        self.count: int = 0
+        self.duration: float = 0.0
+        self.shapes: dict[str, list] = {}
+
+    @staticmethod
+    def shape(statement: str) -> str:
+        """statement with expanded `IN` parameter lists collapsed
+
+        Args:
+            statement (str): compiled statement
+
+        Returns:
+            str: shape shared by statements differing only in parameters
+        """
+        return PLACEHOLDER_LIST.sub("(?)", statement)
+
+    def record(self, statement: str, seconds: float) -> None:
+        """record an executed statement
+
+        Args:
+            statement (str): compiled statement
+            seconds (float): execution time
+        """
+        self.count += 1
+        self.duration += seconds
+        counter: list = self.shapes.setdefault(self.shape(statement), [0, 0.0])
+        counter[0] += 1
+        counter[1] += seconds
+
+    def repeated(self, threshold: int) -> dict[str, int]:
+        """shapes executed at least `threshold` times, likely N+1 queries
+
+        Args:
+            threshold (int): minimum executions of a shape
+
+        Returns:
+            dict[str, int]: executions by shape
+        """
+        return {
+            shape: executions
+            for shape, (executions, _) in self.shapes.items()
+            if threshold and executions >= threshold
+        }
+
+    def as_dict(self) -> dict[str, Any]:
+        """snapshot of the statistics
+
+        Returns:
+            dict[str, Any]: statistics
+        """
+        return {
+            "count": self.count,
+            "duration": self.duration,
+            "statements": [
+                {"statement": shape, "count": executions, "duration": seconds}
+                for shape, (executions, seconds) in sorted(
+                    self.shapes.items(), key=lambda item: -item[1][1]
+                )
+            ],
+        }
+
+
+def get_query_statistics() -> QueryStatistics:
+    """statement statistics of the current request
+
+    Returns:
+        QueryStatistics: statistics, empty outside an app context
+    """
+    if not has_app_context():
+        return QueryStatistics()
+    if (statistics := g.get("_query_statistics")) is None:
+        statistics = g._query_statistics = QueryStatistics()
+    return statistics
+
+
+_query_tags: ContextVar[Optional[dict[str, int]]] = ContextVar(
+    "query_tags", default=None
+)
+
+
+@lru_cache(maxsize=None)
+def _affected_tables(table: sa.Table) -> frozenset[str]:
+    """the table and the tables its deletes and updates cascade to"""
+    return frozenset(
+        {table.fullname}
+        | {
+            referring.fullname
+            for referring in table.metadata.tables.values()
+            for foreign_key in referring.foreign_keys
+            if (foreign_key.ondelete or foreign_key.onupdate)
+            and foreign_key.references(table)
+        }
+    )
+
+
+def _statement_tables(
+    context: Optional[sa.engine.ExecutionContext],
+) -> Iterator[sa.Table]:
+    """tables of a compiled statement, empty for textual sql"""
+    if context is None or (compiled := context.compiled) is None:
+        return iter(())
+    state = getattr(compiled, "compile_state", None)
+    return (
+        table
+        for table in find_tables(
+            compiled.statement if state is None else state.statement,
+            include_aliases=True,
+            include_joins=True,
+            include_crud=True,
+        )
+        if isinstance(table, sa.Table)
+    )
+
+
+def _before_cursor_execute(
+    conn: sa.engine.Connection,
+    _cursor,
+    _statement: str,
+    _parameters,
+    context: Optional[sa.engine.ExecutionContext],
+    _executemany: bool,
+) -> None:
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+    if context is not None and (
+        context.isinsert or context.isupdate or context.isdelete
+    ):
+        writes: set[str] = conn.info.setdefault("query_cache_writes", set())
+        for table in _statement_tables(context):
+            writes.update(_affected_tables(table))
+    elif (tags := _query_tags.get()) is not None and (
+        new := sorted(
+            {table.fullname for table in _statement_tables(context)}.difference(
+                tags
+            )
+        )
+    ):
+        # versions are read before the statement, so a write committed while
+        # it runs leaves the entry stale instead of filed under the new version
+        tags.update(
+            zip(new, current_app.extensions["query_cache"].versions(new))
+        )
+
+
+def _on_commit(conn: sa.engine.Connection) -> None:
+    # the commit event fires before the DBAPI commit, bumping the versions
+    # now would let a concurrent read file the replaced rows under the new
+    # versions, so they are bumped once the connection begins again or is
+    # checked in
+    if (
+        (writes := conn.info.pop("query_cache_writes", None))
+        and has_app_context()
+        and (cache := current_app.extensions.get("query_cache")) is not None
+    ):
+        committed: set[str] = conn.info.setdefault(
+            "query_cache_committed", (cache, set())
+        )[1]
+        committed.update(writes)
+
+
+def _invalidate_committed(info: dict) -> None:
+    if (committed := info.pop("query_cache_committed", None)) is not None:
+        cache, writes = committed
+        cache.invalidate(*writes)
+
+
+def _on_begin(conn: sa.engine.Connection) -> None:
+    _invalidate_committed(conn.info)
+
+
+def _on_checkin(_dbapi_connection, connection_record) -> None:
+    _invalidate_committed(connection_record.info)
+
+
+def _on_rollback(conn: sa.engine.Connection) -> None:
+    conn.info.pop("query_cache_writes", None)
+    if conn.dialect.name == "postgresql":
+        # a statement timeout set in the transaction is rolled back too
+        conn.info.pop("statement_timeout", None)
+
+
+def _apply_deadline(
+    conn: sa.engine.Connection,
+    cursor,
+    statement: str,
+    parameters,
+    _context: Optional[sa.engine.ExecutionContext],
+    _executemany: bool,
+) -> tuple:
+    if not has_app_context() or (expires := g.get("_deadline")) is None:
+        return statement, parameters
+    if (remaining := expires - time.monotonic()) <= 0:
+        raise DeadlineExceeded()
+    milliseconds: int = math.ceil(remaining * 1000)
+    if conn.dialect.name == "postgresql":
+        # set again once the timeout in force overshoots the remaining time
+        # by over a tenth, saving a round trip per statement until then, so
+        # a statement may outlive the deadline by up to a tenth of the time
+        # that was left when it started
+        if (applied := conn.info.get("statement_timeout")) is None or (
+            applied[0] != expires or applied[1] > milliseconds * 1.1
+        ):
+            cursor.execute(f"SET statement_timeout = {milliseconds}")
+            conn.info["statement_timeout"] = (expires, milliseconds)
+            conn.info["deadline_reset"] = True
+    elif conn.dialect.name in {"mysql", "mariadb"}:
+        if statement.lstrip()[:6].upper() == "SELECT":
+            statement = (
+                f"SET STATEMENT max_statement_time = {remaining:.3f} FOR "
+                f"{statement}"
+                if getattr(conn.dialect, "is_mariadb", False)
+                else f"SELECT /*+ MAX_EXECUTION_TIME({milliseconds}) */"
+                f"{statement.lstrip()[6:]}"
+            )
+    elif conn.dialect.name == "sqlite" and conn.info.get("deadline") != expires:
+        dbapi_connection = conn.connection.dbapi_connection
+        if hasattr(dbapi_connection, "set_progress_handler"):
+            dbapi_connection.set_progress_handler(
+                lambda: time.monotonic() >= expires, 1000
+            )
+            conn.info["deadline"] = expires
+            conn.info["deadline_reset"] = True
+    return statement, parameters
+
+
+def _handle_error(context: sa.engine.ExceptionContext) -> None:
+    """raise statements cancelled by the deadline as `DeadlineExceeded`"""
+    if not has_app_context() or g.get("_deadline") is None:
+        return
+    error: Optional[BaseException] = context.original_exception
+    if (
+        getattr(error, "pgcode", None) == "57014"
+        or getattr(error, "sqlstate", None) == "57014"
+        or (
+            context.dialect is not None
+            and context.dialect.name in {"mysql", "mariadb"}
+            and getattr(error, "args", (None,))[:1] in {(3024,), (1969,)}
+        )
+        or (
+            context.dialect is not None
+            and context.dialect.name == "sqlite"
+            and str(error) == "interrupted"
+        )
+    ):
+        raise DeadlineExceeded() from context.sqlalchemy_exception
+
+
+def _reset_deadline(dbapi_connection, connection_record) -> None:
+    connection_record.info.pop("deadline", None)
+    connection_record.info.pop("statement_timeout", None)
+    if not connection_record.info.pop("deadline_reset", False):
+        return
+    if hasattr(dbapi_connection, "set_progress_handler"):
+        dbapi_connection.set_progress_handler(None, 0)
+    elif dbapi_connection is not None:
+        cursor = dbapi_connection.cursor()
+        cursor.execute("RESET statement_timeout")
+        cursor.close()
+        dbapi_connection.commit()
+
+
+def _signature(secret_key: str | bytes, payload: bytes) -> bytes:
+    """HMAC-SHA256 of a payload shared through redis"""
+    if isinstance(secret_key, str):
+        secret_key = secret_key.encode()
+    return hmac.new(secret_key, payload, hashlib.sha256).digest()
+
+
+class QueryCache:
+    """result cache of ORM selects, invalidated by the tables they read
+
+    Opt in per statement with the `query_cache` execution option, `True` for
+    the default timeout or a number of seconds, like
+    `Roles.query.with_entities(Roles.name).execution_options(query_cache=True)`.
+    Results are keyed on the statement and its parameters, kept in a local
+    LRU and in redis, and tagged with every table read while loading them,
+    eager loads included. Committed writes to a table, including cascades of
+    its foreign keys, bump the version of its tag once the commit has landed,
+    so only the entries reading it miss afterwards. Writes with textual sql are not tracked.
+
+    Entries shared in redis are pickled and signed with HMAC-SHA256 under
+    the app `SECRET_KEY`, and entries with a bad signature are ignored, so a
+    writer to redis can not make workers unpickle arbitrary payloads.
+
+    Args:
+        app (Flask, optional): app instance. Defaults to None.
+        client (redis.Redis, optional): redis client. Defaults to the one of
+        `CACHE_REDIS_URL` or a process-local store when it is not set.
+        maxsize (int, optional): size of the local LRU. Defaults to 1024.
+        timeout (int, optional): default seconds to keep results.
+        Defaults to 300.
+        key_prefix (str, optional): redis key prefix. Defaults to "query".
+        secret_key (str | bytes, optional): key signing the entries in redis.
+        Defaults to the `SECRET_KEY` of the app.
+    """
+
+    def __init__(
+        self,
+        app: Optional[Flask] = None,
+        *,
+        client: Optional[redis.Redis] = None,
+        maxsize: int = 1024,
+        timeout: int = 300,
+        key_prefix: str = "query",
+        secret_key: Optional[str | bytes] = None,
+    ) -> None:
+        self.client: Optional[redis.Redis] = client
+        self.secret_key: Optional[str | bytes] = secret_key
+        self.local: LRUCache = LRUCache(maxsize)
+        self.timeout: int = timeout
+        self.key_prefix: str = key_prefix
+        self._versions: dict[str, int] = {}
+        self._statements: dict[Hashable, str] = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        """register the cache on the app
+
+        Args:
+            app (Flask): app instance
+        """
+        if (
+            self.client is None
+            and app.config.get("CACHE_REDIS_URL") is not None
+        ):
+            self.client = redis.StrictRedis.from_url(
+                app.config["CACHE_REDIS_URL"]
+            )
+        if self.secret_key is None:
+            self.secret_key = app.config.get("SECRET_KEY")
+        if self.client is not None and not self.secret_key:
+            raise RuntimeError(
+                "QueryCache needs a SECRET_KEY to sign the entries in redis"
+            )
+        app.extensions["query_cache"] = self
+
+    def _tag_key(self, tag: str) -> str:
+        return f"{self.key_prefix}:tag:{tag}"
+
+    def versions(self, tags: Iterable[str]) -> tuple[int, ...]:
+        """current versions of tags, read once per request
+
+        Args:
+            tags (Iterable[str]): table names
+
+        Returns:
+            tuple[int, ...]: versions in the order of the tags
+        """
+        tags = tuple(tags)
+        known: dict[str, int] = g.setdefault("_query_cache_versions", {})
+        if missing := [tag for tag in tags if tag not in known]:
+            if self.client is not None:
+                values: list = self.client.mget(map(self._tag_key, missing))
+                known.update(
+                    zip(missing, (int(value or 0) for value in values))
+                )
+            else:
+                known.update(
+                    (tag, self._versions.get(tag, 0)) for tag in missing
+                )
+        return tuple(known[tag] for tag in tags)
+
+    def invalidate(self, *tags: str) -> None:
+        """bump the versions of tags, missing every entry reading them
+
+        Args:
+            tags (str): table names
+        """
+        if not tags:
+            return
+        if self.client is not None:
+            pipeline = self.client.pipeline(transaction=False)
+            for tag in tags:
+                pipeline.incr(self._tag_key(tag))
+            pipeline.execute()
+        else:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+        if (
+            has_app_context()
+            and (known := g.get("_query_cache_versions")) is not None
+        ):
+            for tag in tags:
+                known.pop(tag, None)
+
+    def key(
+        self, statement: sa.sql.Executable, parameters: Optional[dict]
+    ) -> Optional[str]:
+        """cache key of a statement and its parameters
+
+        Args:
+            statement (sa.sql.Executable): statement
+            parameters (dict, optional): execution parameters
+
+        Returns:
+            str | None: cache key, None for uncacheable statements
+        """
+        # pylint: disable=protected-access
+        if (cache_key := statement._generate_cache_key()) is None:
+            return None
+        offline: str = cache_key.to_offline_string(
+            self._statements, statement, parameters or {}
+        )
+        return (
+            f"{self.key_prefix}:"
+            f"{hashlib.sha256(offline.encode()).hexdigest()}"
+        )
+
+    def get(self, key: str) -> Optional[sa.engine.FrozenResult]:
+        """cached result whose tags are still current
+
+        Args:
+            key (str): cache key
+
+        Returns:
+            FrozenResult | None: frozen result
+        """
+        if (entry := self.local.get(key)) is None and self.client is not None:
+            if (signed := self.client.get(key)) is not None:
+                signature, payload = signed[:32], signed[32:]
+                if not hmac.compare_digest(
+                    signature, _signature(self.secret_key, payload)
+                ):
+                    return None
+                entry = pickle.loads(payload)
+                self.local.set(key, entry, time.time() + entry[3])
+        if entry is None:
+            return None
+        tags, versions, data, _ = entry
+        if self.versions(tags) != versions:
+            self.local.pop(key)
+            return None
+        return pickle.loads(data)
+
+    def set(
+        self,
+        key: str,
+        result: sa.engine.FrozenResult,
+        tags: dict[str, int],
+        timeout: Optional[int] = None,
+    ) -> None:
+        """cache a result under the versions its tags had before it was loaded
+
+        Args:
+            key (str): cache key
+            result (FrozenResult): frozen result
+            tags (dict[str, int]): table names read by the result and their
+            versions read before the reads
+            timeout (int, optional): seconds to keep the result. Defaults to
+            the timeout of the cache.
+        """
+        names: tuple[str, ...] = tuple(sorted(tags))
+        timeout = self.timeout if timeout is None else timeout
+        entry: tuple = (
+            names,
+            tuple(tags[name] for name in names),
+            pickle.dumps(result),
+            timeout,
+        )
+        self.local.set(key, entry, time.time() + timeout)
+        if self.client is not None:
+            payload: bytes = pickle.dumps(entry)
+            self.client.set(
+                key, _signature(self.secret_key, payload) + payload, ex=timeout
+            )
+
+
+def _after_cursor_execute(
+    conn: sa.engine.Connection, _cursor, statement: str, *_args
+) -> None:
+    start: float = conn.info["query_start"].pop()
+    if has_app_context():
+        get_query_statistics().record(statement, time.perf_counter() - start)
+
+
+def query_budget(
+    max_queries: Optional[int] = None,
+    *,
+    max_duration: Optional[float] = None,
+    max_repeats: Optional[int] = None,
+) -> Callable:
+    """declare the query budget of an endpoint
+
+    The budget covers every statement of the request, including lazy loads
+    while dumping or streaming the response. It is checked after the request,
+    or once a streamed response is consumed, logged as a warning, and raised
+    as `QueryBudgetExceeded` when `SQLALCHEMY_QUERY_BUDGET_STRICT` is set,
+    which defaults to `app.testing`.
+
+    Args:
+        max_queries (int, optional): maximum statements. Defaults to None.
+        max_duration (float, optional): maximum seconds spent in statements.
+        Defaults to None.
+        max_repeats (int, optional): maximum executions of a statement shape,
+        overrides `SQLALCHEMY_N_PLUS_ONE_THRESHOLD`. Defaults to None.
+    """
+
+    def wrapper(func):
+        @wraps(func)
+        def decorator(*args, **kwargs) -> Any:
+            g._query_budget = (
+                request.endpoint,
+                max_queries,
+                max_duration,
+                max_repeats,
+            )
+            return func(*args, **kwargs)
+
+        return decorator
+
+    return wrapper
+
+
+def _enforce_query_budget() -> None:
+    """log N+1 queries and requests over their query budget
+
+    Raises:
+        QueryBudgetExceeded: budget exceeded in strict mode
+    """
+    if (statistics := g.get("_query_statistics")) is None:
+        return
+    endpoint, max_queries, max_duration, max_repeats = g.get(
+        "_query_budget", (request.endpoint, None, None, None)
+    )
+    repeated: dict[str, int] = statistics.repeated(
+        current_app.config["SQLALCHEMY_N_PLUS_ONE_THRESHOLD"]
+        if max_repeats is None
+        else max_repeats + 1
+    )
+    for shape, executions in repeated.items():
+        current_app.logger.warning(
+            "possible N+1 query in %s, executed %d times: %s",
+            endpoint,
+            executions,
+            shape,
+        )
+    violations: list[str] = []
+    if max_queries is not None and statistics.count > max_queries:
+        violations.append(f"{statistics.count} queries > {max_queries}")
+    if max_duration is not None and statistics.duration > max_duration:
+        violations.append(
+            f"{statistics.duration:.3f}s in queries > {max_duration}s"
+        )
+    if max_repeats is not None and repeated:
+        violations.append(
+            f"{len(repeated)} statements repeated > {max_repeats} times"
+        )
+    if not violations:
+        return
+    message: str = f"query budget of {endpoint} exceeded: " + ", ".join(
+        violations
+    )
+    strict: Optional[bool] = current_app.config[
+        "SQLALCHEMY_QUERY_BUDGET_STRICT"
+    ]
+    if current_app.testing if strict is None else strict:
+        raise QueryBudgetExceeded(message)
+    current_app.logger.warning(message)
+
+
+def deadline(seconds: float) -> Callable:
+    """declare the deadline of an endpoint
+
+    Put it above `Namespace.parameters` to cover parsing too. The time left
+    bounds every statement of the request, as postgresql's
+    `statement_timeout`, a mysql `MAX_EXECUTION_TIME` hint, mariadb's
+    `max_statement_time` or a sqlite progress handler, and is checked
+    between parsing, the handler and dumping. The postgresql timeout is only
+    set again once it exceeds the time left by over a tenth, so a statement
+    there may run past the deadline by up to a tenth of the time it had. Once it has passed,
+    `DeadlineExceeded` is raised, which `Api` renders with the 503 envelope.
+
+    Args:
+        seconds (float): seconds the request may take
+    """
+
+    def wrapper(func):
+        @wraps(func)
+        def decorator(*args, **kwargs) -> Any:
+            expires: float = time.monotonic() + seconds
+            if (current := g.get("_deadline")) is None or expires < current:
+                g._deadline = expires
+            return func(*args, **kwargs)
+
+        return decorator
+
+    return wrapper
+
+
+def check_deadline() -> None:
+    """raise `DeadlineExceeded` if the deadline of the request has passed
+
+    Raises:
+        DeadlineExceeded: deadline exceeded
+    """
+    if (
+        has_app_context()
+        and (expires := g.get("_deadline")) is not None
+        and time.monotonic() >= expires
+    ):
+        raise DeadlineExceeded()
+
+
+def _finish_stream(
+    response: Response,
+    finish: Callable[[], None],
+    abort: Optional[Callable[[], None]] = None,
+) -> Response:
+    """defer work until a streamed response has been consumed
+
+    The callbacks run within the request, after the last chunk or once the
+    stream fails or is closed early.
+
+    Args:
+        response (Response): streamed response
+        finish (Callable[[], None]): called once the stream is consumed
+        abort (Callable[[], None], optional): called when the stream fails or
+        is closed early. Defaults to None.
+
+    Returns:
+        Response: response streaming through the callbacks
+    """
+    body: Iterable = response.response
+
+    def generate():
+        try:
+            yield from body
+        except BaseException:
+            if abort is not None:
+                abort()
+            raise
+        finish()
+
+    response.response = stream_with_context(generate())
+    return response
+
+
+def read_only() -> Callable:
+    """declare an endpoint read-only
+
+    Put it above `Namespace.parameters` and `Namespace.response` to cover
+    parsing and dumping too. Within the endpoint, the session does not
+    autoflush or expire on commit, reads from replicas when configured, and
+    runs read-only transactions where the database supports them, with
+    `SET TRANSACTION READ ONLY` or sqlite's `query_only`. Flushing changes
+    or executing DML raises `ReadOnlySessionError`, as does entering the
+    endpoint with writes pending in the session. A streamed response keeps
+    the transaction read-only until it is consumed.
+    """
+
+    def wrapper(func):
+        @wraps(func)
+        def decorator(*args, **kwargs) -> Any:
+            session: Session = current_app.extensions["sqlalchemy"].session()
+            if session.info.get("read_only") is True:
+                return func(*args, **kwargs)
+            if (
+                session.info.get("uncommitted_writes")
+                or session.new
+                or session.dirty
+                or session.deleted
+            ):
+                # the closing commit would write them
+                raise ReadOnlySessionError(
+                    "read-only endpoint entered with pending writes"
+                )
+            previous: tuple = (
+                session.info.get("read_only"),
+                session.autoflush,
+                session.expire_on_commit,
+            )
+            session.expire_on_commit = False
+            if session.in_transaction():
+                # begin a read-only transaction
+                session.commit()
+            session.autoflush = False
+            session.info["read_only"] = True
+
+            def restore() -> None:
+                (
+                    session.info["read_only"],
+                    session.autoflush,
+                    session.expire_on_commit,
+                ) = previous
+                if previous[0] is None:
+                    session.info.pop("read_only")
+
+            def commit() -> None:
+                try:
+                    session.commit()
+                except BaseException:
+                    session.rollback()
+                    raise
+                finally:
+                    restore()
+
+            def rollback() -> None:
+                try:
+                    session.rollback()
+                finally:
+                    restore()
+
+            try:
+                response: Any = func(*args, **kwargs)
+            except BaseException:
+                rollback()
+                raise
+            if isinstance(response, Response) and response.is_streamed:
+                # statements run while streaming are read-only too
+                return _finish_stream(response, commit, rollback)
+            commit()
+            return response
+
+        return decorator
+
+    return wrapper
+
+
+_checkout_start: local = local()
+
+
+@lru_cache(maxsize=None)
+def _timed_pool_class(pool_class: type[sa.pool.Pool]) -> type[sa.pool.Pool]:
+    """subclass of a pool class marking when checkouts start
+
+    The `checkout` event times the wait from the mark. `dispose` recreates
+    the pool from its class, so the new pool is timed too.
+
+    Args:
+        pool_class (type[sa.pool.Pool]): pool class
+
+    Returns:
+        type[sa.pool.Pool]: timed pool class of the same name
+    """
+
+    class TimedPool(pool_class):
+        """pool marking when checkouts start"""
+
+        @override
+        def connect(self) -> sa.pool.PoolProxiedConnection:
+            _checkout_start.time = time.perf_counter()
+            return super().connect()
+
+    TimedPool.__name__ = TimedPool.__qualname__ = pool_class.__name__
+    return TimedPool
+
+
+def _timed_pool_options(options: dict) -> dict:
+    """engine options with the pool class, explicit or of the dialect, timed
+
+    Args:
+        options (dict): engine options
+
+    Returns:
+        dict: engine options
+    """
+    if "pool" in options:
+        return options
+    url: sa.engine.URL = sa.engine.make_url(options["url"])
+    pool_class: type[sa.pool.Pool] = options.get(
+        "poolclass"
+    ) or url.get_dialect().get_pool_class(url)
+    return {**options, "poolclass": _timed_pool_class(pool_class)}
+
+
+class PoolStatistics:
+    """
+    Author: 1746104160
+    msg: connection pool statistics of an engine collected from pool events
+    """
+
+    def __init__(self, engine: sa.engine.Engine) -> None:
+        self._engine: ref[sa.engine.Engine] = ref(engine)
+        self.checkouts: int = 0
+        self.connects: int = 0
+        self.invalidations: int = 0
+        self.soft_invalidations: int = 0
+        self.wait_buckets: list[int] = [0] * (len(WAIT_BUCKETS) + 1)
+        self.wait_total: float = 0.0
+        self._connected_at: dict[int, float] = {}
+        self._lock: Lock = Lock()
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "close", self._on_close)
+        event.listen(engine, "detach", self._on_close)
+        event.listen(engine, "invalidate", self._on_invalidate)
+        event.listen(engine, "soft_invalidate", self._on_soft_invalidate)
+
+    def observe_wait(self, seconds: float) -> None:
+        """record the time spent waiting for a connection
+
+        Args:
+            seconds (float): waiting time
+        """
+        with self._lock:
+            self.wait_buckets[bisect_left(WAIT_BUCKETS, seconds)] += 1
+            self.wait_total += seconds
+
+    def _on_connect(self, _dbapi_connection, connection_record) -> None:
+        with self._lock:
+            self.connects += 1
+            self._connected_at[id(connection_record)] = time.time()
+
+    def _on_checkout(self, *_args) -> None:
+        start: Optional[float] = getattr(_checkout_start, "time", None)
+        _checkout_start.time = None
+        with self._lock:
+            self.checkouts += 1
+        if start is not None:
+            self.observe_wait(time.perf_counter() - start)
+
+    def _on_close(self, _dbapi_connection, connection_record) -> None:
+        with self._lock:
+            self._connected_at.pop(id(connection_record), None)
+
+    def _on_invalidate(self, _dbapi_connection, connection_record, _exc):
+        with self._lock:
+            self.invalidations += 1
+            self._connected_at.pop(id(connection_record), None)
+
+    def _on_soft_invalidate(self, *_args) -> None:
+        with self._lock:
+            self.soft_invalidations += 1
+
+    def as_dict(self) -> dict[str, Any]:
+        """snapshot of the statistics
+
+        Returns:
+            dict[str, Any]: statistics
+        """
+        pool: sa.pool.Pool = self._engine().pool
+        now: float = time.time()
+        with self._lock:
+            ages: list[float] = [
+                now - connected_at
+                for connected_at in self._connected_at.values()
+            ]
+            observed: int = sum(self.wait_buckets)
+            return {
+                "pool": type(pool).__name__,
+                "size": getattr(pool, "size", lambda: None)(),
+                "checked_out": getattr(pool, "checkedout", lambda: None)(),
+                "overflow": getattr(pool, "overflow", lambda: None)(),
+                "checkouts": self.checkouts,
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+                "soft_invalidations": self.soft_invalidations,
+                "connections": len(ages),
+                "max_connection_age": max(ages, default=0.0),
+                "mean_connection_age": sum(ages) / len(ages) if ages else 0.0,
+                "checkout_wait": {
+                    "count": observed,
+                    "mean": self.wait_total / observed if observed else 0.0,
+                    "buckets": {
+                        **{
+                            f"le_{bound}": sum(self.wait_buckets[: i + 1])
+                            for i, bound in enumerate(WAIT_BUCKETS)
+                        },
+                        "le_inf": observed,
+                    },
+                },
+            }
 
 
 class Model(originModel):
     """help type hint for query"""
 
-    query: Query
+    query: Query
+
+
+ASYNC_DRIVERS: dict[str, str] = {
+    "mariadb": "mariadb+aiomysql",
+    "mariadb+pymysql": "mariadb+aiomysql",
+    "mysql": "mysql+aiomysql",
+    "mysql+mysqldb": "mysql+aiomysql",
+    "mysql+pymysql": "mysql+aiomysql",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg": "postgresql+psycopg_async",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+SYNC_DRIVERS: dict[str, str] = {
+    "mariadb+aiomysql": "mariadb+pymysql",
+    "mariadb+asyncmy": "mariadb+pymysql",
+    "mysql+aiomysql": "mysql+pymysql",
+    "mysql+asyncmy": "mysql+pymysql",
+    "postgresql+asyncpg": "postgresql",
+    "postgresql+psycopg_async": "postgresql+psycopg",
+    "sqlite+aiosqlite": "sqlite",
+}
+
+
+def _driver_urls(
+    url: str | sa.engine.URL,
+) -> tuple[sa.engine.URL, sa.engine.URL]:
+    """sync and async urls of one database
+
+    Args:
+        url (str | sa.engine.URL): configured url with a sync or async driver
+
+    Raises:
+        sa.exc.ArgumentError: driver without a known counterpart
+
+    Returns:
+        tuple[sa.engine.URL, sa.engine.URL]: sync and async urls
+    """
+    url = sa.engine.make_url(url)
+    drivers: dict[str, str] = (
+        SYNC_DRIVERS if url.get_dialect().is_async else ASYNC_DRIVERS
+    )
+    if (counterpart := drivers.get(url.drivername)) is None:
+        raise sa.exc.ArgumentError(
+            f"driver '{url.drivername}' has no known "
+            f"{'sync' if drivers is SYNC_DRIVERS else 'async'} counterpart, "
+            "configure a url with one of "
+            + ", ".join(sorted({*ASYNC_DRIVERS, *SYNC_DRIVERS}))
+        )
+    other: sa.engine.URL = url.set(drivername=counterpart)
+    return (other, url) if drivers is SYNC_DRIVERS else (url, other)
+
+
+def _driver_installed(url: sa.engine.URL) -> bool:
+    """whether the dbapi of the url driver can be imported
+
+    Args:
+        url (sa.engine.URL): url
+
+    Returns:
+        bool: whether the driver is installed
+    """
+    try:
+        url.get_dialect().import_dbapi()
+    except ImportError:
+        return False
+    return True
+
+
+class Session(originSession):
+    """patched session routing reads to replicas
+
+    Statements go to a replica of their bind when the session is marked
+    read-only with `info["read_only"]`, or it serves a GET/HEAD/OPTIONS
+    request. The replica is chosen once per transaction, so its reads see
+    one consistent state. Once the session writes, it sticks to the primary
+    until it is removed, so a request always reads its own writes.
+    """
+
+    @override
+    def get_bind(
+        self,
+        mapper: Any | None = None,
+        clause: Any | None = None,
+        bind: sa.engine.Engine | sa.engine.Connection | None = None,
+        **kwargs: Any,
+    ) -> sa.engine.Engine | sa.engine.Connection:
+        engine = super().get_bind(
+            mapper=mapper, clause=clause, bind=bind, **kwargs
+        )
+        if bind is not None or self.info.get("primary_pinned"):
+            return engine
+        if self._flushing or (
+            clause is not None and not getattr(clause, "is_select", False)
+        ):
+            # writes and statements of unknown kind pin the session
+            if clause is None or getattr(clause, "is_dml", True):
+                self.info["primary_pinned"] = True
+            return engine
+        if not self._wants_replica():
+            return engine
+        # one replica per transaction, replicas may lag differently
+        chosen: dict = self.info.setdefault("replicas", {})
+        if (replica := chosen.get(engine)) is None:
+            replica = chosen[engine] = self._db.get_replica(engine)
+        return replica
+
+    def _wants_replica(self) -> bool:
+        """whether reads of the session should go to replicas"""
+        if (read_only := self.info.get("read_only")) is not None:
+            return read_only
+        return has_request_context() and request.method in READ_METHODS
+
+
+class AsyncBoundSession(Session):
+    """sync session of `AsyncSession` in async mode
+
+    Binds are chosen like `Session` does, replicas included, then swapped for
+    the async engine of the same database.
+    """
+
+    @override
+    def get_bind(
+        self,
+        mapper: Any | None = None,
+        clause: Any | None = None,
+        bind: sa.engine.Engine | sa.engine.Connection | None = None,
+        **kwargs: Any,
+    ) -> sa.engine.Engine | sa.engine.Connection:
+        engine = super().get_bind(
+            mapper=mapper, clause=clause, bind=bind, **kwargs
+        )
+        if (async_engine := self._db.async_engine_of(engine)) is None:
+            raise sa.exc.UnboundExecutionError(
+                f"engine {engine.url!r} has no async twin, "
+                "install the async driver of its database"
+            )
+        return async_engine.sync_engine
+
+
+def _do_orm_execute(state: sa.orm.ORMExecuteState) -> Any:
+    """serve selects with the `query_cache` option from the query cache"""
+    if not state.is_select:
+        if state.is_insert or state.is_update or state.is_delete:
+            if state.session.info.get("read_only") is True:
+                raise ReadOnlySessionError(
+                    "DML statement executed in a read-only session"
+                )
+            state.session.info["uncommitted_writes"] = True
+            # statements may change referenced keys the ORM does not see
+            state.session.info.setdefault("reference_reloads", set()).update(
+                name
+                for table in find_tables(state.statement, include_crud=True)
+                if isinstance(table, sa.Table)
+                for name in _affected_tables(table)
+            )
+        return None
+    if (
+        state.is_relationship_load
+        or state.is_column_load
+        or not (timeout := state.execution_options.get("query_cache"))
+        or not has_app_context()
+        or (cache := current_app.extensions.get("query_cache")) is None
+    ):
+        return None
+    session: Session = state.session
+    if (
+        session.info.get("uncommitted_writes")
+        or session.new
+        or session.dirty
+        or session.deleted
+    ):
+        # the session may read its own uncommitted writes
+        return None
+    if (key := cache.key(state.statement, state.parameters)) is None:
+        return None
+    if (frozen := cache.get(key)) is not None:
+        return merge_frozen_result(
+            session, state.statement, frozen, load=False
+        )()
+    token = _query_tags.set({})
+    try:
+        frozen = state.invoke_statement().freeze()
+        tags: dict[str, int] = _query_tags.get()
+    finally:
+        _query_tags.reset(token)
+    cache.set(key, frozen, tags, None if timeout is True else timeout)
+    return frozen()
+
+
+def _before_flush(session: Session, _flush_context, _instances) -> None:
+    if session.info.get("read_only") is True and (
+        session.new
+        or session.deleted
+        or any(session.is_modified(obj) for obj in session.dirty)
+    ):
+        raise ReadOnlySessionError("flush of changes in a read-only session")
+
+
+def _after_begin(
+    session: Session,
+    _transaction: sa.orm.SessionTransaction,
+    connection: sa.engine.Connection,
+) -> None:
+    if session.info.get("read_only") is not True:
+        return
+    match connection.dialect.name:
+        case "postgresql" | "mysql" | "mariadb":
+            connection.exec_driver_sql("SET TRANSACTION READ ONLY")
+        case "sqlite":
+            connection.exec_driver_sql("PRAGMA query_only = ON")
+            connection.info["query_only"] = True
+
+
+def _reset_query_only(dbapi_connection, connection_record) -> None:
+    if connection_record.info.pop("query_only", False) and dbapi_connection:
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA query_only = OFF")
+        cursor.close()
+
+
+def _after_flush(session: Session, _flush_context) -> None:
+    session.info["uncommitted_writes"] = True
+    # pylint: disable=protected-access
+    if not has_app_context() or not (references := session._db.reference_sets):
+        return
+    removals: dict[ReferenceSet, set] = session.info.setdefault(
+        "reference_removals", {}
+    )
+    reloads: set[str] = session.info.setdefault("reference_reloads", set())
+    for obj in session.deleted:
+        for table in sa.inspect(obj).mapper.tables:
+            reloads.update(_affected_tables(table) - {table.fullname})
+    for reference in references.values():
+        for obj in session.deleted | session.dirty:
+            if not isinstance(obj, reference.model):
+                continue
+            attribute = sa.inspect(obj).attrs[reference.column.key]
+            if obj in session.deleted:
+                if attribute.loaded_value is sa.orm.base.NO_VALUE:
+                    reloads.add(reference.table.fullname)
+                else:
+                    removals.setdefault(reference, set()).add(
+                        attribute.loaded_value
+                    )
+            elif (history := attribute.history).added:
+                if not history.deleted:
+                    # the previous key was never loaded
+                    reloads.add(reference.table.fullname)
+                removals.setdefault(reference, set()).update(history.deleted)
+
+
+def _after_commit(session: Session) -> None:
+    removals: dict[ReferenceSet, set] = session.info.pop(
+        "reference_removals", {}
+    )
+    reloads: set[str] = session.info.pop("reference_reloads", set())
+    if not (removals or reloads) or not has_app_context():
+        return
+    # pylint: disable=protected-access
+    for reference in session._db.reference_sets.values():
+        if reference.table.fullname in reloads:
+            reference.reset()
+        elif keys := removals.get(reference):
+            reference.discard(keys)
+
+
+def _after_transaction_end(
+    session: Session, transaction: sa.orm.SessionTransaction
+) -> None:
+    if transaction.parent is None:
+        session.info.pop("replicas", None)
+        session.info.pop("uncommitted_writes", None)
+        session.info.pop("reference_removals", None)
+        session.info.pop("reference_reloads", None)
+
+
+event.listen(Session, "do_orm_execute", _do_orm_execute)
+event.listen(Session, "before_flush", _before_flush)
+event.listen(Session, "after_begin", _after_begin)
+event.listen(Session, "after_flush", _after_flush)
+event.listen(Session, "after_commit", _after_commit)
+event.listen(Session, "after_transaction_end", _after_transaction_end)
+
+
+class Deferred:
+    """
+    Author: 1746104160
+    msg: value of a key queued on a batch loader, loaded on first access
+    """
+
+    __slots__ = ("loader", "key")
+
+    def __init__(self, loader: "BatchLoader", key: Hashable) -> None:
+        self.loader: BatchLoader = loader
+        self.key: Hashable = key
+
+    @property
+    def value(self) -> Any:
+        """loaded value, loading every queued key at once"""
+        return self.loader.load(self.key)
+
+
+def _option_key(option: Any) -> Hashable:
+    """hashable key of a loader option, equal for equivalent options"""
+    # pylint: disable=protected-access
+    if (cache_key := option._generate_cache_key()) is None:
+        return option
+    return cache_key.key
+
+
+class BatchLoader:
+    """request-scoped loader of rows by a column, one `IN` query per batch
+
+    Keys queued with `defer`, for example while deserializing the fields of
+    `Parameters`, are fetched together with the first key actually loaded,
+    and every loaded key is memoized until the end of the request. Get the
+    loader of the current request with `BatchLoader.of(Roles.name)`.
+
+    Args:
+        column (InstrumentedAttribute): column to look up, like `Roles.name`
+        many (bool, optional): load every row of a key instead of one.
+        Defaults to False.
+        options (Iterable, optional): loader options of the query.
+        Defaults to ().
+        session (Session, optional): session. Defaults to the session of
+        `Model.query`.
+        batch_size (int, optional): keys per query. Defaults to 1000.
+    """
+
+    def __init__(
+        self,
+        column: InstrumentedAttribute,
+        *,
+        many: bool = False,
+        options: Iterable = (),
+        session: Optional[sa.orm.Session] = None,
+        batch_size: int = 1000,
+    ) -> None:
+        self.column: InstrumentedAttribute = column
+        self.model: type = column.class_
+        self.many: bool = many
+        self.options: tuple = tuple(options)
+        self.batch_size: int = batch_size
+        self._session: Optional[sa.orm.Session] = session
+        self._values: dict[Hashable, Any] = {}
+        self._pending: set[Hashable] = set()
+
+    @classmethod
+    def of(cls, column: InstrumentedAttribute, **kwargs) -> "BatchLoader":
+        """loader of the column in the current request
+
+        Calls with the same `many`, `options` and `session` share a loader,
+        the options being compared by their cache keys. `batch_size` is
+        taken from the first call.
+
+        Args:
+            column (InstrumentedAttribute): column to look up
+
+        Returns:
+            BatchLoader: loader
+        """
+        loaders: dict[tuple, BatchLoader] = g.setdefault("_batch_loaders", {})
+        key: tuple = (
+            column.class_,
+            column.key,
+            kwargs.get("many", False),
+            tuple(map(_option_key, kwargs.get("options", ()))),
+            kwargs.get("session"),
+        )
+        if (loader := loaders.get(key)) is None:
+            loader = loaders[key] = cls(column, **kwargs)
+        return loader
+
+    @property
+    def session(self) -> sa.orm.Session:
+        """session to query with"""
+        return self._session or self.model.query.session
+
+    def defer(self, key: Hashable) -> Deferred:
+        """queue a key to be loaded with the next batch
+
+        Args:
+            key (Hashable): key
+
+        Returns:
+            Deferred: deferred value
+        """
+        if key not in self._values:
+            self._pending.add(key)
+        return Deferred(self, key)
+
+    def load(self, key: Hashable) -> Any:
+        """load the value of a key
+
+        Args:
+            key (Hashable): key
+
+        Returns:
+            Any: row, list of rows with `many`, None or [] if missing
+        """
+        return self.load_many((key,))[0]
+
+    def load_many(self, keys: Iterable[Hashable]) -> list[Any]:
+        """load the values of keys, together with every queued key
+
+        Args:
+            keys (Iterable[Hashable]): keys
+
+        Returns:
+            list[Any]: values in the order of the keys
+        """
+        keys = list(keys)
+        missing: set[Hashable] = self._pending | {
+            key for key in keys if key not in self._values
+        }
+        self._pending.clear()
+        for batch in batched(missing, self.batch_size):
+            for key in batch:
+                self._values[key] = [] if self.many else None
+            for row in self.session.scalars(
+                sa.select(self.model)
+                .where(self.column.in_(batch))
+                .options(*self.options)
+            ):
+                key = getattr(row, self.column.key)
+                if self.many:
+                    self._values[key].append(row)
+                else:
+                    self._values[key] = row
+        return [self._values[key] for key in keys]
+
+    def prime(self, key: Hashable, value: Any) -> None:
+        """memoize a value loaded elsewhere
+
+        Args:
+            key (Hashable): key
+            value (Any): value
+        """
+        self._values[key] = value
+        self._pending.discard(key)
+
+    def clear(self, *keys: Hashable) -> None:
+        """forget memoized keys, or every key without arguments
+
+        Args:
+            keys (Hashable): keys
+        """
+        if not keys:
+            self._values.clear()
+        for key in keys:
+            self._values.pop(key, None)
+
+
+class ReferenceSet:
+    """committed keys of a column, kept in memory by every process
+
+    Misses are looked up with one `IN` query per batch and remembered, so
+    inserted keys are learned on first use. Keys deleted or renamed through
+    the ORM are discarded after commit, and statements writing the table,
+    like `bulk_delete`, reset the set. Writes of other processes are seen
+    through the table versions of `QueryCache` when it is registered, and
+    after `timeout` seconds otherwise.
+
+    Args:
+        column (InstrumentedAttribute): column of the keys, like `Roles.name`
+        preload (bool, optional): load every key at once instead of learning
+        them from misses. Defaults to True.
+        timeout (int, optional): seconds before the keys are reloaded.
+        Defaults to 3600.
+        batch_size (int, optional): keys per query. Defaults to 1000.
+    """
+
+    def __init__(
+        self,
+        column: InstrumentedAttribute,
+        *,
+        preload: bool = True,
+        timeout: int = 3600,
+        batch_size: int = 1000,
+    ) -> None:
+        self.column: InstrumentedAttribute = column
+        self.model: type = column.class_
+        self.table: sa.Table = column.property.columns[0].table
+        self.preload: bool = preload
+        self.timeout: int = timeout
+        self.batch_size: int = batch_size
+        self.keys: set[Hashable] = set()
+        self._loaded_at: Optional[float] = None
+        self._version: Optional[int] = None
+        self._lock: Lock = Lock()
+
+    def _current_version(self) -> Optional[int]:
+        if (cache := current_app.extensions.get("query_cache")) is None:
+            return None
+        return cache.versions((self.table.fullname,))[0]
+
+    def _refresh(self, session: sa.orm.Session) -> None:
+        """reload the keys when expired or written by other processes"""
+        if (
+            self._loaded_at is not None
+            and time.time() - self._loaded_at < self.timeout
+            and self._current_version() == self._version
+        ):
+            return
+        with self._lock:
+            version: Optional[int] = self._current_version()
+            self.keys = (
+                set(session.scalars(sa.select(self.column)))
+                if self.preload
+                else set()
+            )
+            self._loaded_at = time.time()
+            self._version = version
+
+    def missing(
+        self, keys: Iterable[Hashable], session: sa.orm.Session
+    ) -> list[Hashable]:
+        """keys that do not exist in the column
+
+        Args:
+            keys (Iterable[Hashable]): keys
+            session (Session): session for the misses
+
+        Returns:
+            list[Hashable]: missing keys in the order of the keys
+        """
+        keys = list(keys)
+        self._refresh(session)
+        if not (misses := {key for key in keys if key not in self.keys}):
+            return []
+        found: set[Hashable] = set()
+        for batch in batched(misses, self.batch_size):
+            found.update(
+                session.scalars(
+                    sa.select(self.column).where(self.column.in_(batch))
+                )
+            )
+        if not session.info.get("uncommitted_writes"):
+            with self._lock:
+                self.keys |= found
+        return [key for key in keys if key in misses and key not in found]
+
+    def discard(self, keys: Iterable[Hashable]) -> None:
+        """forget keys deleted by the current process
+
+        Args:
+            keys (Iterable[Hashable]): keys
+        """
+        with self._lock:
+            self.keys = self.keys.difference(keys)
+            if self._loaded_at is not None:
+                self._version = self._current_version()
+
+    def reset(self) -> None:
+        """reload every key on next use"""
+        with self._lock:
+            self._loaded_at = None
+
+
+class ExistsIn(Validator):
+    """validator of keys referencing a column, like
+    `String(validate=ExistsIn(Roles.name))`, or of every item of a list with
+    `List(String(), validate=ExistsIn(Roles.name))`
+
+    Keys are checked against the `ReferenceSet` of the column, so valid keys
+    usually cost no query. The reference is documented in swagger as
+    `x-exists-in`.
+
+    Args:
+        column (InstrumentedAttribute): referenced column
+        error (str, optional): error message, formatted with `{input}`,
+        `{missing}` and `{reference}`. Defaults to None.
+        preload (bool, optional): load every key of the column at once.
+        Defaults to True.
+        timeout (int, optional): seconds before the keys are reloaded.
+        Defaults to 3600.
+    """
+
+    default_message: str = "{missing} not found in {reference}."
+
+    def __init__(
+        self,
+        column: InstrumentedAttribute,
+        *,
+        error: Optional[str] = None,
+        preload: bool = True,
+        timeout: int = 3600,
+    ) -> None:
+        self.column: InstrumentedAttribute = column
+        self.reference: str = (
+            f"{column.property.columns[0].table.fullname}."
+            f"{column.property.columns[0].name}"
+        )
+        self.error: str = error or self.default_message
+        self.preload: bool = preload
+        self.timeout: int = timeout
+
+    def _repr_args(self) -> str:
+        return f"reference={self.reference!r}"
+
+    def __call__(self, value: Any) -> Any:
+        keys: list = (
+            list(value)
+            if isinstance(value, (list, tuple, set, frozenset))
+            else [value]
+        )
+        if not keys:
+            return value
+        db: SQLAlchemy = current_app.extensions["sqlalchemy"]
+        if missing := db.reference_set(
+            self.column, preload=self.preload, timeout=self.timeout
+        ).missing(keys, self.column.class_.query.session):
+            raise ValidationError(
+                self.error.format(
+                    input=value,
+                    missing=", ".join(map(str, missing)),
+                    reference=self.reference,
+                )
+            )
+        return value
+
+
+class TouchBuffer:
+    """write-behind buffer of frequent column updates, like `last_login`
+
+    Touches are coalesced per row and column, keeping the latest value, and
+    written every `interval` seconds by a daemon thread of each process with
+    one bulk `UPDATE` per batch, and once more at exit. Buffered values are
+    invisible to reads until then, so only buffer columns that tolerate
+    that staleness and are not written elsewhere. Values of a column whose
+    write fails are buffered again, unless touched since.
+
+    With redis, the buffered columns are listed in the `<key_prefix>:columns`
+    set, so any worker also writes the touches left by workers that died
+    before writing them. Keys and values in redis are pickled and signed
+    like the entries of `QueryCache`, and touches with a bad signature are
+    dropped.
+
+    Writes run in a session of their own, so flushing within a request
+    neither commits nor discards the work of the request.
+
+    Args:
+        app (Flask, optional): app instance. Defaults to None.
+        client (redis.Redis, optional): redis client, coalescing touches of
+        every worker. Defaults to the one of `CACHE_REDIS_URL` or a
+        process-local buffer when it is not set.
+        interval (float, optional): seconds between writes. Defaults to 5.0.
+        batch_size (int, optional): rows per statement. Defaults to 1000.
+        key_prefix (str, optional): redis key prefix. Defaults to "touch".
+        secret_key (str | bytes, optional): key signing the touches in redis.
+        Defaults to the `SECRET_KEY` of the app.
+    """
+
+    def __init__(
+        self,
+        app: Optional[Flask] = None,
+        *,
+        client: Optional[redis.Redis] = None,
+        interval: float = 5.0,
+        batch_size: int = 1000,
+        key_prefix: str = "touch",
+        secret_key: Optional[str | bytes] = None,
+    ) -> None:
+        self.client: Optional[redis.Redis] = client
+        self.secret_key: Optional[str | bytes] = secret_key
+        self.interval: float = interval
+        self.batch_size: int = batch_size
+        self.key_prefix: str = key_prefix
+        self._apps: WeakSet[Flask] = WeakSet()
+        self._pending: WeakKeyDictionary[
+            Flask, dict[tuple[type, str], dict[Hashable, Any]]
+        ] = WeakKeyDictionary()
+        self._columns: dict[str, tuple[type, str]] = {}
+        self._thread: Optional[Thread] = None
+        self._pid: Optional[int] = None
+        self._lock: Lock = Lock()
+        atexit.register(self._flush_at_exit)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        """register the buffer on the app
+
+        Args:
+            app (Flask): app instance
+        """
+        if (
+            self.client is None
+            and app.config.get("CACHE_REDIS_URL") is not None
+        ):
+            self.client = redis.StrictRedis.from_url(
+                app.config["CACHE_REDIS_URL"]
+            )
+        if self.secret_key is None:
+            self.secret_key = app.config.get("SECRET_KEY")
+        if self.client is not None and not self.secret_key:
+            raise RuntimeError(
+                "TouchBuffer needs a SECRET_KEY to sign the touches in redis"
+            )
+        self._apps.add(app)
+        app.extensions["touch_buffer"] = self
+
+    def _key(self, model: type, name: str) -> str:
+        return (
+            f"{self.key_prefix}:{sa.inspect(model).local_table.fullname}:{name}"
+        )
+
+    def _registry_key(self) -> str:
+        return f"{self.key_prefix}:columns"
+
+    def _dump(self, key: Hashable, value: Any) -> tuple[bytes, bytes]:
+        """signed hash field and value of a touch, the value signature
+        covering the key too"""
+        key_payload: bytes = pickle.dumps(key)
+        value_payload: bytes = pickle.dumps(value)
+        return (
+            _signature(self.secret_key, key_payload) + key_payload,
+            _signature(self.secret_key, key_payload + value_payload)
+            + value_payload,
+        )
+
+    def _load(self, field: bytes, signed: bytes) -> Optional[tuple]:
+        """key and value of a touch, None when a signature is bad"""
+        key_payload, value_payload = field[32:], signed[32:]
+        if not hmac.compare_digest(
+            field[:32], _signature(self.secret_key, key_payload)
+        ) or not hmac.compare_digest(
+            signed[:32],
+            _signature(self.secret_key, key_payload + value_payload),
+        ):
+            return None
+        return pickle.loads(key_payload), pickle.loads(value_payload)
+
+    def _column(self, name: str) -> Optional[tuple[type, str]]:
+        """model and attribute of a redis key, among the models of the app"""
+        if (column := self._columns.get(name)) is not None:
+            return column
+        db: SQLAlchemy = current_app.extensions["sqlalchemy"]
+        for mapper in db.Model.registry.mappers:
+            for prop in mapper.column_attrs:
+                if self._key(mapper.class_, prop.key) == name:
+                    self._columns[name] = (mapper.class_, prop.key)
+                    return self._columns[name]
+        return None
+
+    def _start(self) -> None:
+        """start the writer thread of the current process"""
+        with self._lock:
+            if (
+                self._thread is None
+                or self._pid != os.getpid()
+                or not self._thread.is_alive()
+            ):
+                self._thread = Thread(
+                    target=self._run, name="touch-buffer", daemon=True
+                )
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def _flush_at_exit(self) -> None:
+        """write the last touches of a process running the writer thread"""
+        if self._pid == os.getpid():
+            self.flush_all()
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush_all()
+            except Exception:  # pylint: disable=broad-exception-caught
+                # keep writing, flush_all already logs through the apps
+                continue
+
+    def touch(
+        self, column: InstrumentedAttribute, key: Hashable, value: Any
+    ) -> None:
+        """buffer the new value of a column
+
+        Args:
+            column (InstrumentedAttribute): column, like `Users.last_login`
+            key (Hashable): primary key of the row
+            value (Any): new value
+        """
+        model: type = column.class_
+        if self.client is not None:
+            name: str = self._key(model, column.key)
+            self._columns[name] = (model, column.key)
+            pipeline = self.client.pipeline(transaction=False)
+            pipeline.sadd(self._registry_key(), name)
+            pipeline.hset(name, *self._dump(key, value))
+            pipeline.execute()
+        else:
+            # pylint: disable=protected-access
+            app: Flask = current_app._get_current_object()
+            with self._lock:
+                self._pending.setdefault(app, {}).setdefault(
+                    (model, column.key), {}
+                )[key] = value
+        self._start()
+
+    def _take(self) -> dict[tuple[type, str], dict[Hashable, Any]]:
+        """remove the buffered values of the current app"""
+        if self.client is None:
+            # pylint: disable=protected-access
+            with self._lock:
+                return self._pending.pop(current_app._get_current_object(), {})
+        taken: dict[tuple[type, str], dict[Hashable, Any]] = {}
+        for name in sorted(
+            member.decode() if isinstance(member, bytes) else member
+            for member in self.client.smembers(self._registry_key())
+        ):
+            if (column := self._column(name)) is None:
+                # a column of another app sharing the redis
+                continue
+            pipeline = self.client.pipeline(transaction=True)
+            pipeline.hgetall(name)
+            pipeline.delete(name)
+            if touches := [
+                touch
+                for field, signed in pipeline.execute()[0].items()
+                if (touch := self._load(field, signed)) is not None
+            ]:
+                taken[column] = dict(touches)
+        return taken
+
+    def _restore(
+        self, model: type, name: str, values: dict[Hashable, Any]
+    ) -> None:
+        """buffer values again after a failed write, unless touched since"""
+        if self.client is not None:
+            pipeline = self.client.pipeline(transaction=False)
+            pipeline.sadd(self._registry_key(), self._key(model, name))
+            for key, value in values.items():
+                pipeline.hsetnx(self._key(model, name), *self._dump(key, value))
+            pipeline.execute()
+            return
+        # pylint: disable=protected-access
+        app: Flask = current_app._get_current_object()
+        with self._lock:
+            pending: dict[Hashable, Any] = self._pending.setdefault(
+                app, {}
+            ).setdefault((model, name), {})
+            for key, value in values.items():
+                pending.setdefault(key, value)
+
+    def flush(self) -> int:
+        """write the buffered values of the current app, one transaction per
+        column in a session of its own
+
+        Raises:
+            Exception: first failed write, raised once the other columns are
+            written and the values of the failed ones buffered again
+
+        Returns:
+            int: number of rows written
+        """
+        db: SQLAlchemy = current_app.extensions["sqlalchemy"]
+        total: int = 0
+        error: Optional[Exception] = None
+        for (model, name), values in self._take().items():
+            try:
+                primary_key: str = (
+                    sa.inspect(model)
+                    .get_property_by_column(sa.inspect(model).primary_key[0])
+                    .key
+                )
+                with db.session.session_factory.begin() as session:
+                    for batch in batched(
+                        (
+                            {primary_key: key, name: value}
+                            for key, value in values.items()
+                        ),
+                        self.batch_size,
+                    ):
+                        session.execute(sa.update(model), batch)
+                total += len(values)
+            except Exception as err:  # pylint: disable=broad-exception-caught
+                self._restore(model, name, values)
+                error = error or err
+        if error is not None:
+            raise error
+        return total
+
+    def flush_all(self) -> None:
+        """write the buffered values of every app, logging failures"""
+        for app in list(self._apps):
+            try:
+                with app.app_context():
+                    self.flush()
+            except Exception:  # pylint: disable=broad-exception-caught
+                app.logger.exception("failed to write buffered touches")
+
+
+class DenormalizedList:
+    """list column kept equal to the distinct values of a source query, like
+    the routes of a user through `user2role` and `role2route`
+
+    `refresh` recomputes the column of many rows with one `UPDATE` of a
+    correlated aggregate, `array_agg` for ARRAY columns and `group_concat`
+    or `string_agg` for text columns like `ScalarListType`, instead of
+    loading every row and its relationships.
+
+    Args:
+        column (InstrumentedAttribute): list column, like `Users.routes`
+        source (sa.Select): select of `(key, value)` pairs, the key matching
+        the primary key of the column's table
+    """
+
+    def __init__(
+        self, column: InstrumentedAttribute, source: sa.Select
+    ) -> None:
+        self.column: InstrumentedAttribute = column
+        self.model: type = column.class_
+        self.table: sa.Table = column.property.columns[0].table
+        self.primary_key: sa.Column = sa.inspect(self.model).primary_key[0]
+        self.source: sa.Select = source
+
+    def statement(self) -> sa.Update:
+        """`UPDATE` of the column for every row, to filter by key"""
+        key, value = self.source.selected_columns[:2]
+        return sa.update(self.table).values(
+            {
+                self.column.property.columns[0]
+                .name: self.source.with_only_columns(
+                    _ListAggregate(value, self.column.type),
+                    maintain_column_froms=True,
+                )
+                .where(key == self.primary_key)
+                .scalar_subquery()
+            }
+        )
+
+    def refresh(
+        self,
+        keys: Optional[Iterable[Hashable] | sa.Select] = None,
+        *,
+        session: Optional[sa.orm.Session] = None,
+        batch_size: int = 1000,
+    ) -> list[Hashable]:
+        """recompute the column of rows in the current transaction
+
+        Args:
+            keys (Iterable[Hashable] | sa.Select, optional): primary keys, or a
+            select of them like the users of a role. Defaults to every row.
+            session (Session, optional): session. Defaults to the session of
+            `Model.query`.
+            batch_size (int, optional): keys per statement for a list of keys.
+            Defaults to 1000.
+
+        Returns:
+            list[Hashable]: primary keys of the recomputed rows
+        """
+        session = session or self.model.query.session
+        options: dict = {"synchronize_session": False}
+        if keys is None:
+            affected: list = session.scalars(sa.select(self.primary_key)).all()
+            session.execute(self.statement(), execution_options=options)
+        elif isinstance(keys, sa.Select):
+            affected = session.scalars(keys).all()
+            session.execute(
+                self.statement().where(
+                    self.primary_key.in_(keys.scalar_subquery())
+                ),
+                execution_options=options,
+            )
+        else:
+            affected = list(dict.fromkeys(keys))
+            for batch in batched(affected, batch_size):
+                session.execute(
+                    self.statement().where(self.primary_key.in_(batch)),
+                    execution_options=options,
+                )
+        if affected:
+            refreshed: set[Hashable] = set(affected)
+            for obj in list(session.identity_map.values()):
+                if (
+                    isinstance(obj, self.model)
+                    and sa.inspect(obj).identity[0] in refreshed
+                ):
+                    session.expire(obj, [self.column.key])
+        return affected
+
+
+class _ListAggregate(sa.ColumnElement):
+    """distinct values of a column aggregated into the storage of a list"""
+
+    inherit_cache: bool = True
+    _traverse_internals = [
+        ("value", InternalTraversal.dp_clauseelement),
+        ("type", InternalTraversal.dp_type),
+    ]
+
+    def __init__(
+        self, value: sa.ColumnElement, type_: sa.types.TypeEngine
+    ) -> None:
+        self.value: sa.ColumnElement = value
+        self.type: sa.types.TypeEngine = type_
+
+
+def _list_storage(
+    element: _ListAggregate, dialect: sa.engine.Dialect
+) -> sa.types.TypeEngine:
+    """type storing the list on the dialect, resolving variants"""
+    # pylint: disable=protected-access
+    return element.type._variant_mapping.get(dialect.name, element.type)
+
+
+@compiles(_ListAggregate)
+def _compile_list_aggregate(element: _ListAggregate, compiler, **kwargs):
+    separator: str = getattr(
+        _list_storage(element, compiler.dialect), "separator", ","
+    )
+    assert separator == ",", "group_concat of distinct values joins with ','"
+    return (
+        "coalesce(group_concat(DISTINCT "
+        f"{compiler.process(element.value, **kwargs)}), '')"
+    )
+
+
+@compiles(_ListAggregate, "postgresql")
+def _compile_list_aggregate_postgresql(
+    element: _ListAggregate, compiler, **kwargs
+) -> str:
+    value: str = compiler.process(element.value, **kwargs)
+    storage: sa.types.TypeEngine = _list_storage(element, compiler.dialect)
+    if isinstance(storage, sa.ARRAY):
+        return f"coalesce(array_agg(DISTINCT {value}), '{{}}')"
+    separator: str = getattr(storage, "separator", ",").replace("'", "''")
+    return f"coalesce(string_agg(DISTINCT {value}, '{separator}'), '')"
+
+
+@compiles(_ListAggregate, "mysql")
+@compiles(_ListAggregate, "mariadb")
+def _compile_list_aggregate_mysql(
+    element: _ListAggregate, compiler, **kwargs
+) -> str:
+    separator: str = (
+        getattr(_list_storage(element, compiler.dialect), "separator", ",")
+        .replace("\\", "\\\\")
+        .replace("'", "''")
+    )
+    return (
+        "coalesce(GROUP_CONCAT(DISTINCT "
+        f"{compiler.process(element.value, **kwargs)} "
+        f"SEPARATOR '{separator}'), '')"
+    )
+
+
+class SearchIndex:
+    """full-text index over string columns, matching keywords like `contains`
+
+    The index follows `create_all` and `drop_all` of its table:
+
+    - SQLite: an FTS5 table with the trigram tokenizer, kept in sync by
+      triggers
+    - PostgreSQL: a GIN index of `pg_trgm` serving `ILIKE`
+    - MySQL: a FULLTEXT index with the ngram parser, created with
+      `innodb_ft_enable_stopword` off for the session, as the parser drops
+      n-grams holding a stopword, like `in` of `admin`. An index created
+      with stopwords enabled must be created again for `contains` results.
+
+    Other databases fall back to `LIKE`, as do keywords shorter than a
+    trigram on SQLite and a bigram on MySQL. Call `create` to add the index
+    to an existing table. Until then, SQLite searches fall back to `LIKE`,
+    which statements compiled before keep doing until the engine is
+    disposed.
+
+    On PostgreSQL, `pg_trgm` must be installed in the database beforehand,
+    usually by a migration running `CREATE EXTENSION IF NOT EXISTS pg_trgm`
+    with a role allowed to, since the role of the app seldom is.
+
+    Args:
+        columns (InstrumentedAttribute): string columns of one table
+        name (str, optional): index name. Defaults to `ix_<table>_search`.
+        create_extension (bool, optional): create `pg_trgm` along with the
+        index on PostgreSQL. Defaults to False.
+    """
+
+    def __init__(
+        self,
+        *columns: InstrumentedAttribute,
+        name: Optional[str] = None,
+        create_extension: bool = False,
+    ) -> None:
+        assert columns
+        self.columns: list[sa.Column] = [
+            column.property.columns[0] for column in columns
+        ]
+        self.table: sa.Table = self.columns[0].table
+        assert all(column.table is self.table for column in self.columns)
+        self.name: str = name or f"ix_{self.table.name}_search"
+        self.create_extension: bool = create_extension
+        self._exists: WeakKeyDictionary[
+            sa.engine.Dialect, bool
+        ] = WeakKeyDictionary()
+        event.listen(self.table, "after_create", self._after_create)
+        event.listen(self.table, "before_drop", self._before_drop)
+        event.listen(sa.engine.Engine, "engine_connect", self._engine_connect)
+
+    def qualified_name(
+        self, preparer: sa.sql.compiler.IdentifierPreparer
+    ) -> str:
+        """quoted name of the index, qualified with the schema of its table
+
+        Args:
+            preparer (IdentifierPreparer): identifier preparer of the dialect
+
+        Returns:
+            str: quoted name
+        """
+        if self.table.schema is None:
+            return preparer.quote(self.name)
+        return (
+            f"{preparer.quote_schema(self.table.schema)}."
+            f"{preparer.quote(self.name)}"
+        )
+
+    def _ddl(self, dialect: sa.engine.Dialect) -> list[str]:
+        preparer: sa.sql.compiler.IdentifierPreparer = (
+            dialect.identifier_preparer
+        )
+        quote: Callable[[str], str] = preparer.quote
+        table: str = preparer.format_table(self.table)
+        name: str = quote(self.name)
+        columns: str = ", ".join(quote(column.name) for column in self.columns)
+        match dialect.name:
+            case "sqlite":
+                # triggers live in the schema of their table and must name it
+                # and the fts table unqualified
+                schema: str = (
+                    ""
+                    if self.table.schema is None
+                    else f"{preparer.quote_schema(self.table.schema)}."
+                )
+                # fts5 dequotes the option once and quotes the name itself
+                content: str = preparer.quote_identifier(self.table.name)
+                local_table: str = quote(self.table.name)
+
+                def values(prefix: str) -> str:
+                    return ", ".join(
+                        f"{prefix}.{quote(column.name)}"
+                        for column in self.columns
+                    )
+
+                delete: str = (
+                    f"INSERT INTO {name}({name}, rowid, {columns}) "
+                    f"VALUES ('delete', old.rowid, {values('old')});"
+                )
+                insert: str = (
+                    f"INSERT INTO {name}(rowid, {columns}) "
+                    f"VALUES (new.rowid, {values('new')});"
+                )
+                return [
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {schema}{name} USING "
+                    f"fts5({columns}, content={content}, "
+                    "content_rowid='rowid', tokenize='trigram')",
+                    "CREATE TRIGGER IF NOT EXISTS "
+                    f"{schema}{quote(self.name + '_ai')} "
+                    f"AFTER INSERT ON {local_table} BEGIN {insert} END",
+                    "CREATE TRIGGER IF NOT EXISTS "
+                    f"{schema}{quote(self.name + '_ad')} "
+                    f"AFTER DELETE ON {local_table} BEGIN {delete} END",
+                    "CREATE TRIGGER IF NOT EXISTS "
+                    f"{schema}{quote(self.name + '_au')} "
+                    f"AFTER UPDATE ON {local_table} BEGIN {delete} {insert} END",
+                    f"INSERT INTO {schema}{name}({name}) VALUES ('rebuild')",
+                ]
+            case "postgresql":
+                return [
+                    *(
+                        ["CREATE EXTENSION IF NOT EXISTS pg_trgm"]
+                        if self.create_extension
+                        else []
+                    ),
+                    f"CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin ("
+                    + ", ".join(
+                        f"{quote(column.name)} gin_trgm_ops"
+                        for column in self.columns
+                    )
+                    + ")",
+                ]
+            case "mysql" | "mariadb":
+                # the stopwords of an index are fixed when it is created
+                return [
+                    "SET @search_stopword = @@SESSION.innodb_ft_enable_stopword",
+                    "SET SESSION innodb_ft_enable_stopword = OFF",
+                    f"CREATE FULLTEXT INDEX {name} ON {table} ({columns}) "
+                    "WITH PARSER ngram",
+                    "SET SESSION innodb_ft_enable_stopword = @search_stopword",
+                ]
+        return []
+
+    def exists(self, dialect: sa.engine.Dialect) -> bool:
+        """whether the fts table was found by the engine of the dialect
+
+        Args:
+            dialect (sa.engine.Dialect): dialect of an engine
+
+        Returns:
+            bool: whether the fts table exists, true before connecting
+        """
+        return self._exists.get(dialect, True)
+
+    def _engine_connect(self, connection: sa.engine.Connection) -> None:
+        """look the fts table up once per sqlite engine"""
+        if (
+            connection.dialect.name != "sqlite"
+            or connection.dialect in self._exists
+        ):
+            return
+        preparer: sa.sql.compiler.IdentifierPreparer = (
+            connection.dialect.identifier_preparer
+        )
+        schema: str = (
+            ""
+            if self.table.schema is None
+            else f"{preparer.quote_schema(self.table.schema)}."
+        )
+        # the dbapi cursor leaves the transaction of the connection alone
+        cursor = connection.connection.cursor()
+        try:
+            cursor.execute(
+                f"SELECT 1 FROM {schema}sqlite_master "
+                "WHERE type = 'table' AND name = ?",
+                (self.name,),
+            )
+            self._exists[connection.dialect] = cursor.fetchone() is not None
+        except connection.dialect.loaded_dbapi.Error:
+            # the schema of the table is not attached
+            self._exists[connection.dialect] = False
+        finally:
+            cursor.close()
+
+    def _after_create(
+        self, _table: sa.Table, connection: sa.engine.Connection, **_kwargs
+    ) -> None:
+        for statement in self._ddl(connection.dialect):
+            connection.exec_driver_sql(statement)
+        self._exists[connection.dialect] = True
+
+    def _before_drop(
+        self, _table: sa.Table, connection: sa.engine.Connection, **_kwargs
+    ) -> None:
+        if connection.dialect.name == "sqlite":
+            connection.exec_driver_sql(
+                "DROP TABLE IF EXISTS "
+                + self.qualified_name(connection.dialect.identifier_preparer)
+            )
+            self._exists[connection.dialect] = False
+
+    def create(self, bind: sa.engine.Engine | sa.engine.Connection) -> None:
+        """create the index on an existing table and fill it
+
+        Args:
+            bind (Engine | Connection): engine or connection of the table
+        """
+        if isinstance(bind, sa.engine.Engine):
+            with bind.begin() as connection:
+                self._after_create(self.table, connection)
+        else:
+            self._after_create(self.table, bind)
+
+    def match(self, keyword: str) -> sa.ColumnElement[bool]:
+        """predicate of rows containing the keyword in any column
+
+        Args:
+            keyword (str): keyword, matched case-insensitively
+
+        Returns:
+            ColumnElement[bool]: predicate, true for an empty keyword
+        """
+        if not keyword:
+            return sa.true()
+        return SearchMatch(self, keyword)
+
+
+class SearchMatch(sa.ColumnElement[bool]):
+    """
+    Author: 1746104160
+    msg: keyword predicate of a search index, compiled per dialect
+    """
+
+    inherit_cache: bool = True
+    type = sa.Boolean()
+    _is_implicitly_boolean: bool = True
+    _traverse_internals = [
+        ("index", InternalTraversal.dp_plain_obj),
+        ("size", InternalTraversal.dp_plain_obj),
+        ("phrase", InternalTraversal.dp_clauseelement),
+        ("pattern", InternalTraversal.dp_clauseelement),
+    ]
+
+    def __init__(self, index: SearchIndex, keyword: str) -> None:
+        self.index: SearchIndex = index
+        # statements only differ in whether the keyword fills an n-gram
+        self.size: int = min(len(keyword), 3)
+        self.phrase: sa.BindParameter = sa.bindparam(
+            "search_phrase", keyword, type_=sa.String, unique=True
+        )
+        escaped: str = (
+            keyword.replace("/", "//").replace("%", "/%").replace("_", "/_")
+        )
+        self.pattern: sa.BindParameter = sa.bindparam(
+            "search_pattern", f"%{escaped}%", type_=sa.String, unique=True
+        )
+
+    def like(self) -> sa.ColumnElement[bool]:
+        """fallback predicate with `LIKE`"""
+        return sa.or_(
+            *(
+                column.like(self.pattern, escape="/")
+                for column in self.index.columns
+            )
+        ).self_group()
+
+
+@compiles(SearchMatch)
+def _compile_search(element: SearchMatch, compiler, **kwargs) -> str:
+    return compiler.process(element.like(), **kwargs)
+
+
+@compiles(SearchMatch, "sqlite")
+def _compile_search_sqlite(element: SearchMatch, compiler, **kwargs) -> str:
+    if element.size < 3 or not element.index.exists(compiler.dialect):
+        return compiler.process(element.like(), **kwargs)
+    name: str = compiler.preparer.quote(element.index.name)
+    phrase: str = compiler.process(element.phrase, **kwargs)
+    return (
+        f"{compiler.preparer.format_table(element.index.table)}.rowid IN "
+        f"(SELECT rowid FROM {element.index.qualified_name(compiler.preparer)} "
+        f"WHERE {name} MATCH "
+        f"'\"' || replace({phrase}, '\"', '\"\"') || '\"')"
+    )
+
+
+@compiles(SearchMatch, "postgresql")
+def _compile_search_postgresql(element: SearchMatch, compiler, **kwargs) -> str:
+    return compiler.process(
+        sa.or_(
+            *(
+                column.ilike(element.pattern, escape="/")
+                for column in element.index.columns
+            )
+        ).self_group(),
+        **kwargs,
+    )
+
+
+@compiles(SearchMatch, "mysql")
+@compiles(SearchMatch, "mariadb")
+def _compile_search_mysql(element: SearchMatch, compiler, **kwargs) -> str:
+    if element.size < 2:
+        return compiler.process(element.like(), **kwargs)
+    columns: str = ", ".join(
+        compiler.process(column, **kwargs) for column in element.index.columns
+    )
+    phrase: str = compiler.process(element.phrase, **kwargs)
+    return (
+        f"MATCH ({columns}) AGAINST "
+        f"(CONCAT('\"', REPLACE({phrase}, '\"', ''), '\"') IN BOOLEAN MODE)"
+    )
 
 
 class SQLAlchemy(original):
@@ -40,7 +2375,11 @@ class SQLAlchemy(original):
         query_class: type[Query] = Query,
         model_class: type[Model] | type[DeclarativeMeta] = Model,
         engine_options: Optional[dict] = None,
-        add_models_to_shell: bool = True
+        add_models_to_shell: bool = True,
+        replica_selection: Literal[
+            "round_robin", "least_connections"
+        ] = "round_robin",
+        async_mode: bool = False,
     ) -> None:
         if session_options is None:
             session_options = {}
@@ -55,6 +2394,18 @@ class SQLAlchemy(original):
         Customize this by passing the ``query_class`` parameter to the extension.
         """
 
+        self.async_mode: bool = async_mode
+        self._loops: local = local()
+        self.async_session: Optional[async_scoped_session[AsyncSession]] = (
+            self._make_async_scoped_session(session_options.copy())
+            if async_mode
+            else None
+        )
+        """An `async_scoped_session` of `AsyncSession` scoped to the current
+        Flask application context, available in async mode. Its sync session
+        is an `AsyncBoundSession`, so bind keys and replicas work as usual on
+        the async twins of the engines."""
+
         self.session: scoped_session[Session] = self._make_scoped_session(
             session_options
         )
@@ -128,12 +2479,612 @@ class SQLAlchemy(original):
             Flask, dict[str | None, sa.engine.Engine]
         ] = WeakKeyDictionary()
         self._add_models_to_shell: bool = add_models_to_shell
+        assert replica_selection in {"round_robin", "least_connections"}
+        self.replica_selection: str = replica_selection
+        self._pool_statistics: WeakKeyDictionary[
+            sa.engine.Engine, PoolStatistics
+        ] = WeakKeyDictionary()
+        self._app_replicas: WeakKeyDictionary[
+            Flask,
+            dict[sa.engine.Engine, tuple[list[sa.engine.Engine], Iterator]],
+        ] = WeakKeyDictionary()
+        self._async_engines: WeakKeyDictionary[
+            sa.engine.Engine, AsyncEngine
+        ] = WeakKeyDictionary()
+        self._async_options: WeakKeyDictionary[
+            sa.engine.Engine, dict
+        ] = WeakKeyDictionary()
+        self._async_lock: Lock = Lock()
+        self._app_reference_sets: WeakKeyDictionary[
+            Flask, dict[tuple[type, str], ReferenceSet]
+        ] = WeakKeyDictionary()
 
         if app is not None:
             self.init_app(app)
 
+    @override
+    def init_app(self, app: Flask) -> None:
+        """Initialize the app, then create replica engines from
+        `SQLALCHEMY_REPLICAS`, a map of bind keys to lists of urls or engine
+        options like `SQLALCHEMY_BINDS`.
+
+        In async mode, every engine whose async driver is installed gets an
+        async twin for the same database, created with `create_async_engine`
+        the first time the async session uses it, the url driver being
+        swapped for its sync or async counterpart, like `sqlite` and
+        `sqlite+aiosqlite`. Drivers come with the `async`, `async-mysql` and
+        `async-pgsql` extras. `session`, `Model.query` and the helpers keep
+        using the sync engines, while `async_session` uses the async ones.
+        Async views of the app run on the event loop of their worker thread,
+        where the async session is removed on teardown. Async connections are
+        bound to that loop, so async engines default to `NullPool` unless
+        `pool_size` is given. The twins do not share connections, so an
+        in-memory sqlite database is not visible to both.
+
+        Args:
+            app (Flask): app instance
+        """
+        super().init_app(app)
+        if self.async_mode:
+            app.async_to_sync = self._async_to_sync
+        app.config.setdefault("SQLALCHEMY_N_PLUS_ONE_THRESHOLD", 10)
+        app.config.setdefault("SQLALCHEMY_QUERY_BUDGET_STRICT", None)
+        app.after_request(self._check_query_budget)
+        replicas: dict[
+            sa.engine.Engine, tuple[list[sa.engine.Engine], Iterator]
+        ] = self._app_replicas.setdefault(app, {})
+        for engine_replicas, _ in replicas.values():
+            for engine in engine_replicas:
+                engine.dispose()
+        replicas.clear()
+        engines: dict[str | None, sa.engine.Engine] = self._app_engines[app]
+        for key, values in app.config.setdefault(
+            "SQLALCHEMY_REPLICAS", {}
+        ).items():
+            if key not in engines:
+                raise sa.exc.UnboundExecutionError(
+                    f"Bind key '{key}' of 'SQLALCHEMY_REPLICAS' is not bound."
+                )
+            engine_replicas: list[sa.engine.Engine] = []
+            for value in values:
+                options: dict = self._engine_options.copy()
+                if isinstance(value, (str, sa.engine.URL)):
+                    options["url"] = value
+                else:
+                    options.update(value)
+                options.setdefault("echo", app.config["SQLALCHEMY_ECHO"])
+                options.setdefault("echo_pool", app.config["SQLALCHEMY_ECHO"])
+                self._apply_driver_defaults(options, app)
+                engine_replicas.append(self._make_engine(key, options, app))
+            if engine_replicas:
+                replicas[engines[key]] = (engine_replicas, count())
+
+    def get_replica(self, engine: sa.engine.Engine) -> sa.engine.Engine:
+        """select a replica of the primary engine
+
+        Args:
+            engine (sa.engine.Engine): primary engine
+
+        Returns:
+            sa.engine.Engine: replica engine, or the primary without replicas
+        """
+        # pylint: disable=protected-access
+        app: Flask = current_app._get_current_object()
+        if (replicas := self._app_replicas.get(app, {}).get(engine)) is None:
+            return engine
+        engine_replicas, counter = replicas
+        if self.replica_selection == "least_connections":
+            return min(
+                engine_replicas,
+                key=lambda replica: getattr(
+                    replica.pool, "checkedout", lambda: 0
+                )(),
+            )
+        return engine_replicas[next(counter) % len(engine_replicas)]
+
+    @property
+    def replicas(self) -> dict[sa.engine.Engine, list[sa.engine.Engine]]:
+        """map of primary engines to their replica engines"""
+        # pylint: disable=protected-access
+        app: Flask = current_app._get_current_object()
+        return {
+            engine: engine_replicas
+            for engine, (engine_replicas, _) in self._app_replicas.get(
+                app, {}
+            ).items()
+        }
+
+    @property
+    def reference_sets(self) -> dict[tuple[type, str], ReferenceSet]:
+        """reference sets of the current app by model and column key"""
+        # pylint: disable=protected-access
+        app: Flask = current_app._get_current_object()
+        return self._app_reference_sets.setdefault(app, {})
+
+    def reference_set(
+        self, column: InstrumentedAttribute, **kwargs
+    ) -> ReferenceSet:
+        """reference set of a column in the current app, created on first use
+
+        Args:
+            column (InstrumentedAttribute): column of the keys
+
+        Returns:
+            ReferenceSet: reference set
+        """
+        key: tuple[type, str] = (column.class_, column.key)
+        if (reference := self.reference_sets.get(key)) is None:
+            reference = self.reference_sets[key] = ReferenceSet(
+                column, **kwargs
+            )
+        return reference
+
+    @property
+    def async_engines(self) -> dict[str | None, AsyncEngine]:
+        """map of bind keys to async engines of the current app"""
+        return {
+            key: async_engine
+            for key, engine in self.engines.items()
+            if (async_engine := self.async_engine_of(engine)) is not None
+        }
+
+    def async_engine_of(
+        self, engine: sa.engine.Engine
+    ) -> Optional[AsyncEngine]:
+        """async twin of an engine in async mode, created on first use
+
+        Args:
+            engine (sa.engine.Engine): sync engine, primary or replica
+
+        Returns:
+            AsyncEngine | None: async engine of the same database, None
+            without async mode or its driver
+        """
+        if (async_engine := self._async_engines.get(engine)) is not None:
+            return async_engine
+        if engine not in self._async_options:
+            return None
+        with self._async_lock:
+            if (async_engine := self._async_engines.get(engine)) is None:
+                async_engine = create_async_engine(
+                    **self._async_options[engine]
+                )
+                self._instrument(async_engine.sync_engine)
+                self._async_engines[engine] = async_engine
+        return async_engine
+
+    @property
+    def async_engine(self) -> AsyncEngine:
+        """default async engine of the current app"""
+        return self.async_engines[None]
+
+    def run(self, awaitable: Any) -> Any:
+        """run an awaitable on the event loop of the current thread
+
+        Args:
+            awaitable (Any): coroutine or future
+
+        Returns:
+            Any: result
+        """
+        loop: Optional[asyncio.AbstractEventLoop] = getattr(
+            self._loops, "loop", None
+        )
+        if loop is None or loop.is_closed():
+            loop = self._loops.loop = asyncio.new_event_loop()
+        return loop.run_until_complete(awaitable)
+
+    def _async_to_sync(self, func: Callable) -> Callable:
+        """`Flask.async_to_sync` running on the loop of the current thread"""
+
+        @wraps(func)
+        def wrapper(*args, **kwargs) -> Any:
+            return self.run(func(*args, **kwargs))
+
+        return wrapper
+
+    def _make_async_scoped_session(
+        self, options: dict
+    ) -> async_scoped_session[AsyncSession]:
+        """create the async session scoped to the app context
+
+        Args:
+            options (dict): session options
+
+        Returns:
+            async_scoped_session[AsyncSession]: scoped async session
+        """
+        scope: Callable = options.pop("scopefunc", _app_ctx_id)
+        options.setdefault("query_cls", self.Query)
+        factory: async_sessionmaker[AsyncSession] = async_sessionmaker(
+            class_=AsyncSession,
+            sync_session_class=options.pop("class_", AsyncBoundSession),
+            db=self,
+            **options,
+        )
+        return async_scoped_session(factory, scope)
+
+    @override
+    def _teardown_session(self, exc: BaseException | None) -> None:
+        super()._teardown_session(exc)
+        if self.async_session is not None and self.async_session.registry.has():
+            self.run(self.async_session.remove())
+
+    @override
+    def _apply_driver_defaults(self, options: dict, app: Flask) -> None:
+        url: sa.engine.URL = sa.engine.make_url(options["url"])
+        if url.drivername != "sqlite+aiosqlite":
+            return super()._apply_driver_defaults(options, app)
+        # share the defaults of pysqlite, like the instance folder
+        options["url"] = url.set(drivername="sqlite")
+        super()._apply_driver_defaults(options, app)
+        options["url"] = options["url"].set(drivername=url.drivername)
+        return None
+
+    @override
+    def _make_engine(
+        self, bind_key: str | None, options: dict, app: Flask
+    ) -> sa.engine.Engine:
+        if not self.async_mode:
+            engine: sa.engine.Engine = super()._make_engine(
+                bind_key, _timed_pool_options(options), app
+            )
+        else:
+            sync_url, async_url = _driver_urls(options["url"])
+            engine = super()._make_engine(
+                bind_key, _timed_pool_options({**options, "url": sync_url}), app
+            )
+            if _driver_installed(async_url):
+                async_options: dict = {**options, "url": async_url}
+                if "pool_size" not in async_options:
+                    async_options.setdefault("poolclass", sa.pool.NullPool)
+                self._async_options[engine] = async_options
+        self._pool_statistics[engine] = PoolStatistics(engine)
+        self._instrument(engine)
+        return engine
+
+    @staticmethod
+    def _instrument(engine: sa.engine.Engine) -> None:
+        """listen to engine events for deadlines, query budgets and
+        read-only transactions
+
+        Args:
+            engine (sa.engine.Engine): engine
+        """
+        event.listen(
+            engine, "before_cursor_execute", _apply_deadline, retval=True
+        )
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "commit", _on_commit)
+        event.listen(engine, "begin", _on_begin)
+        event.listen(engine, "checkin", _on_checkin)
+        event.listen(engine, "rollback", _on_rollback)
+        event.listen(engine, "handle_error", _handle_error)
+        event.listen(engine, "checkin", _reset_deadline)
+        if engine.dialect.name == "sqlite":
+            event.listen(engine, "checkin", _reset_query_only)
+
+    @staticmethod
+    def _check_query_budget(response: Response) -> Response:
+        """log N+1 queries and requests over their query budget
+
+        Streamed responses are checked once consumed, counting the statements
+        run while streaming.
+
+        Raises:
+            QueryBudgetExceeded: budget exceeded in strict mode
+
+        Returns:
+            Response: response
+        """
+        if response.is_streamed:
+            return _finish_stream(response, _enforce_query_budget)
+        _enforce_query_budget()
+        return response
+
+    def _named_engines(self) -> dict[str, sa.engine.Engine]:
+        """engines of the current app named by bind key and replica index"""
+        replicas: dict[sa.engine.Engine, list[sa.engine.Engine]] = self.replicas
+        named: dict[str, sa.engine.Engine] = {}
+        for key, engine in self.engines.items():
+            name: str = "default" if key is None else key
+            named[name] = engine
+            for index, replica in enumerate(replicas.get(engine, ())):
+                named[f"{name}.replica{index}"] = replica
+        return named
+
+    def pool_statistics(self) -> dict[str, dict[str, Any]]:
+        """connection pool statistics of every engine of the current app
+
+        Returns:
+            dict[str, dict[str, Any]]: statistics by engine name
+        """
+        return {
+            name: self._pool_statistics[engine].as_dict()
+            for name, engine in self._named_engines().items()
+            if engine in self._pool_statistics
+        }
+
+    def _finish_batch(self, commit: bool) -> None:
+        """commit a batch, or leave it in the current transaction"""
+        if commit:
+            self.session.commit()
+
+    def bulk_insert(
+        self,
+        model: type[Model],
+        rows: Iterable[dict],
+        *,
+        returning: Iterable[str] = (),
+        batch_size: int = 1000,
+        commit: bool = False,
+    ) -> list[sa.engine.Row]:
+        """insert rows with executemany, one statement per batch
+
+        Column defaults apply, but `__init__` and ORM events of the model do
+        not run, so rows must carry every required value.
+
+        Args:
+            model (type[Model]): mapped class
+            rows (Iterable[dict]): column values of each row
+            returning (Iterable[str], optional): columns to return, ignored
+            where the dialect can not return from executemany. Defaults to ().
+            batch_size (int, optional): rows per batch. Defaults to 1000.
+            commit (bool, optional): commit after every batch, which bounds
+            the transaction but keeps earlier batches when a later one fails.
+            Defaults to False, leaving the rows in the current transaction.
+
+        Returns:
+            list[sa.engine.Row]: returned rows
+        """
+        statement = sa.insert(model)
+        if returning := tuple(returning):
+            dialect: sa.engine.Dialect = self.session.get_bind(
+                sa.inspect(model)
+            ).dialect
+            if dialect.insert_executemany_returning:
+                statement = statement.returning(
+                    *(getattr(model, name) for name in returning)
+                )
+            else:
+                returning = ()
+        result: list[sa.engine.Row] = []
+        for batch in batched(rows, batch_size):
+            rows_returned = self.session.execute(statement, batch)
+            if returning:
+                result.extend(rows_returned.all())
+            self._finish_batch(commit)
+        return result
+
+    def bulk_update(
+        self,
+        model: type[Model],
+        rows: Iterable[dict],
+        *,
+        batch_size: int = 1000,
+        commit: bool = False,
+    ) -> int:
+        """update rows by primary key with executemany
+
+        Args:
+            model (type[Model]): mapped class
+            rows (Iterable[dict]): primary key and new values of each row
+            batch_size (int, optional): rows per batch. Defaults to 1000.
+            commit (bool, optional): commit after every batch, which bounds
+            the transaction but keeps earlier batches when a later one fails.
+            Defaults to False, leaving the rows in the current transaction.
+
+        Returns:
+            int: number of rows sent
+        """
+        total: int = 0
+        for batch in batched(rows, batch_size):
+            self.session.execute(sa.update(model), batch)
+            total += len(batch)
+            self._finish_batch(commit)
+        return total
+
+    def bulk_upsert(
+        self,
+        model: type[Model],
+        rows: Iterable[dict],
+        *,
+        index_elements: Optional[Iterable[str]] = None,
+        update_columns: Optional[Iterable[str]] = None,
+        batch_size: int = 1000,
+        commit: bool = False,
+    ) -> int:
+        """insert rows, updating those conflicting on a unique key
+
+        Supported on PostgreSQL and SQLite with `ON CONFLICT`, and on MySQL
+        with `ON DUPLICATE KEY UPDATE`.
+
+        Args:
+            model (type[Model]): mapped class
+            rows (Iterable[dict]): column values of each row
+            index_elements (Iterable[str], optional): columns of the unique
+            key. Defaults to the primary key.
+            update_columns (Iterable[str], optional): columns to update on
+            conflict. Defaults to every other column of the first row.
+            batch_size (int, optional): rows per batch. Defaults to 1000.
+            commit (bool, optional): commit after every batch, which bounds
+            the transaction but keeps earlier batches when a later one fails.
+            Defaults to False, leaving the rows in the current transaction.
+
+        Raises:
+            NotImplementedError: dialect without upsert
+
+        Returns:
+            int: number of rows sent
+        """
+        mapper = sa.inspect(model)
+        table: sa.Table = mapper.local_table
+        dialect: sa.engine.Dialect = self.session.get_bind(mapper).dialect
+        index_elements = (
+            [column.key for column in mapper.primary_key]
+            if index_elements is None
+            else list(index_elements)
+        )
+        total: int = 0
+        for batch in batched(rows, batch_size):
+            columns: list[str] = (
+                [key for key in batch[0] if key not in index_elements]
+                if update_columns is None
+                else list(update_columns)
+            )
+            match dialect.name:
+                case "postgresql" | "sqlite":
+                    insert = importlib.import_module(
+                        f"sqlalchemy.dialects.{dialect.name}"
+                    ).insert(table)
+                    statement = (
+                        insert.on_conflict_do_update(
+                            index_elements=index_elements,
+                            set_={
+                                name: insert.excluded[name] for name in columns
+                            },
+                        )
+                        if columns
+                        else insert.on_conflict_do_nothing(
+                            index_elements=index_elements
+                        )
+                    )
+                case "mysql" | "mariadb":
+                    insert = importlib.import_module(
+                        "sqlalchemy.dialects.mysql"
+                    ).insert(table)
+                    statement = insert.on_duplicate_key_update(
+                        {
+                            name: insert.inserted[name]
+                            for name in columns or index_elements[:1]
+                        }
+                    )
+                case _:
+                    raise NotImplementedError(
+                        f"upsert is not supported by {dialect.name}"
+                    )
+            self.session.execute(statement, batch)
+            total += len(batch)
+            self._finish_batch(commit)
+        return total
+
+    def bulk_delete(
+        self,
+        model: type[Model],
+        ids: Iterable[Any],
+        *,
+        batch_size: int = 1000,
+        commit: bool = False,
+    ) -> int:
+        """delete rows by primary key with one `IN` statement per batch
+
+        Args:
+            model (type[Model]): mapped class with a single column primary key
+            ids (Iterable[Any]): primary keys
+            batch_size (int, optional): keys per batch. Defaults to 1000.
+            commit (bool, optional): commit after every batch, which bounds
+            the transaction but keeps earlier batches when a later one fails.
+            Defaults to False, leaving the rows in the current transaction.
+
+        Raises:
+            ValueError: composite primary key
+
+        Returns:
+            int: number of deleted rows
+        """
+        primary_key: tuple[sa.Column, ...] = sa.inspect(model).primary_key
+        if len(primary_key) != 1:
+            raise ValueError(f"{model.__name__} has a composite primary key")
+        total: int = 0
+        for batch in batched(ids, batch_size):
+            total += self.session.execute(
+                sa.delete(model)
+                .where(primary_key[0].in_(batch))
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            self._finish_batch(commit)
+        return total
+
+    def bulk_associate(
+        self,
+        relationship: InstrumentedAttribute,
+        pairs: Iterable[tuple[Any, Any]],
+        *,
+        batch_size: int = 1000,
+        commit: bool = False,
+    ) -> int:
+        """insert rows of the association table of a many-to-many relationship
+
+        Args:
+            relationship (InstrumentedAttribute): relationship with a
+            secondary table, like `Users.roles`
+            pairs (Iterable[tuple[Any, Any]]): parent and child primary keys
+            batch_size (int, optional): rows per batch. Defaults to 1000.
+            commit (bool, optional): commit after every batch, which bounds
+            the transaction but keeps earlier batches when a later one fails.
+            Defaults to False, leaving the rows in the current transaction.
+
+        Raises:
+            ValueError: relationship without a secondary table, or with
+            composite keys
+
+        Returns:
+            int: number of rows sent
+        """
+        prop = relationship.property
+        if (
+            prop.secondary is None
+            or len(prop.synchronize_pairs) != 1
+            or len(prop.secondary_synchronize_pairs) != 1
+        ):
+            raise ValueError(f"{relationship} is not a simple many-to-many")
+        ((_, parent_column),) = prop.synchronize_pairs
+        ((_, child_column),) = prop.secondary_synchronize_pairs
+        total: int = 0
+        for batch in batched(pairs, batch_size):
+            self.session.execute(
+                sa.insert(prop.secondary),
+                [
+                    {parent_column.key: parent, child_column.key: child}
+                    for parent, child in batch
+                ],
+            )
+            total += len(batch)
+            self._finish_batch(commit)
+        return total
+
+    def probe(self) -> dict[str, dict[str, Any]]:
+        """cheap connectivity probe of every engine of the current app
+
+        Returns:
+            dict[str, dict[str, Any]]: reachability and latency by engine name
+        """
+        result: dict[str, dict[str, Any]] = {}
+        for name, engine in self._named_engines().items():
+            start: float = time.perf_counter()
+            try:
+                self._select_one(engine)
+                result[name] = {
+                    "reachable": True,
+                    "latency": time.perf_counter() - start,
+                }
+            except sa.exc.SQLAlchemyError as err:
+                result[name] = {
+                    "reachable": False,
+                    "latency": time.perf_counter() - start,
+                    "error": type(err).__name__,
+                }
+        return result
+
+    @staticmethod
+    def _select_one(engine: sa.engine.Engine) -> None:
+        with engine.connect() as connection:
+            connection.exec_driver_sql("SELECT 1")
+
     @override
     def _make_scoped_session(self, options: dict) -> scoped_session[Session]:
+        options.setdefault("class_", Session)
         return super()._make_scoped_session(options)
 
     @override
@@ -17,7 +17,13 @@ from typing_extensions import override
 import flask_restx_marshmallow
 
 from .schema import Schema
-from .util import DEFAULT_FIELD_MAPPING, converter, get_default, get_description
+from .util import (
+    DEFAULT_FIELD_MAPPING,
+    converter,
+    get_default,
+    get_description,
+    get_reference,
+)
 
 
 class Swagger(OriginalSwagger):
@@ -81,6 +87,8 @@ class Swagger(OriginalSwagger):
                 }
                 if (default := get_default(field_obj)) is not None:
                     data["default"] = default
+                if (reference := get_reference(field_obj)) is not None:
+                    data["x-exists-in"] = reference
                 if data["type"] == "array":
                     list_field: List = field_obj
                     data["items"] = {
@@ -7,14 +7,19 @@ LastEditors: 1746104160 shaojiahong2001@outlook.com
 LastEditTime: 2023-06-02 13:25:40
 FilePath: /flask_restx_marshmallow/flask_restx_marshmallow/util.py
 """
+import hashlib
 import importlib
+import math
 import re
+import time
+from collections import OrderedDict
 from datetime import timedelta
-from functools import wraps
+from functools import lru_cache, wraps
 from http import HTTPStatus
 from io import BytesIO
+from threading import Lock
 from types import ModuleType
-from typing import Iterable, Literal, Optional
+from typing import Any, Hashable, Iterable, Literal, Optional
 
 import filetype
 import marshmallow
@@ -27,11 +32,14 @@ from flask import (
     Blueprint,
     Response,
     current_app,
-    jsonify,
     render_template,
     url_for,
 )
-from flask_jwt_extended import get_current_user, verify_jwt_in_request
+from flask_jwt_extended import (
+    get_current_user,
+    get_jwt_identity,
+    verify_jwt_in_request,
+)
 from marshmallow import Schema, missing
 from marshmallow.fields import (
     IP,
@@ -193,6 +201,129 @@ class ObjectDict(SortedDict):
         return self.get(key)
 
 
+class LRUCache:
+    """
+    Author: 1746104160
+    msg: thread-safe bounded LRU cache with optional per-entry expiry
+    """
+
+    def __init__(self, maxsize: int = 1024) -> None:
+        assert maxsize > 0
+        self.maxsize: int = maxsize
+        self._data: OrderedDict[
+            Hashable, tuple[Any, Optional[float]]
+        ] = OrderedDict()
+        self._lock: Lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """get a value and mark it as recently used
+
+        Args:
+            key (Hashable): cache key
+            default (Any, optional): value for missing keys. Defaults to None.
+
+        Returns:
+            Any: cached value
+        """
+        with self._lock:
+            if (item := self._data.get(key)) is None:
+                return default
+            if item[1] is not None and item[1] <= time.time():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return item[0]
+
+    def set(
+        self, key: Hashable, value: Any, expires_at: Optional[float] = None
+    ) -> None:
+        """set a value, evicting the least recently used one when full
+
+        Args:
+            key (Hashable): cache key
+            value (Any): value to cache
+            expires_at (float, optional): unix timestamp of expiry.
+            Defaults to None.
+        """
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """remove a value
+
+        Args:
+            key (Hashable): cache key
+            default (Any, optional): value for missing keys. Defaults to None.
+
+        Returns:
+            Any: removed value
+        """
+        with self._lock:
+            if (item := self._data.pop(key, None)) is None:
+                return default
+            return item[0]
+
+    def clear(self) -> None:
+        """remove all values"""
+        with self._lock:
+            self._data.clear()
+
+
+class BloomFilter:
+    """
+    Author: 1746104160
+    msg: compact probabilistic set without false negatives
+    """
+
+    def __init__(self, capacity: int = 100000, error_rate: float = 0.001):
+        assert capacity > 0 and 0 < error_rate < 1
+        self.capacity: int = capacity
+        self.error_rate: float = error_rate
+        self.size: int = math.ceil(
+            -capacity * math.log(error_rate) / math.log(2) ** 2
+        )
+        self.hash_count: int = max(1, round(self.size / capacity * math.log(2)))
+        self.count: int = 0
+        self._bits: bytearray = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str | bytes) -> Iterable[int]:
+        if isinstance(item, str):
+            item = item.encode()
+        digest: bytes = hashlib.blake2b(item, digest_size=16).digest()
+        first: int = int.from_bytes(digest[:8], "little")
+        second: int = int.from_bytes(digest[8:], "little") | 1
+        return (
+            (first + i * second) % self.size for i in range(self.hash_count)
+        )
+
+    def add(self, item: str | bytes) -> None:
+        """add an item
+
+        Args:
+            item (str | bytes): item to add
+        """
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str | bytes) -> bool:
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(item)
+        )
+
+    @property
+    def saturated(self) -> bool:
+        """whether more items than the capacity were added"""
+        return self.count > self.capacity
+
+
 class Apidoc(Blueprint):
     """
     Author: 1746104160
@@ -311,13 +442,96 @@ def get_description(field: Field) -> str | None:
     return None
 
 
+def get_reference(field: Field) -> str | None:
+    """get the column referenced by an `ExistsIn` validator
+
+    Args:
+        field (Field): field object
+
+    Returns:
+        str | None: referenced column like `role.name`
+    """
+    for validator in field.validators:
+        if isinstance(validator, flask_restx_marshmallow.sqlalchemy.ExistsIn):
+            return validator.reference
+    return None
+
+
+class RouteIndex:
+    """
+    Author: 1746104160
+    msg: prefix trie of authorized routes
+
+    A route is permitted when an authorized route is a prefix of it or it is a
+    prefix of an authorized route, so a check costs O(len(route)).
+    """
+
+    __slots__ = ("_root",)
+
+    def __init__(self, routes: Iterable[str]) -> None:
+        self._root: dict[str | None, dict] = {}
+        for authed_route in routes:
+            node: dict = self._root
+            for char in authed_route:
+                node = node.setdefault(char, {})
+            node[None] = {}
+
+    def permits(self, route: str) -> bool:
+        """whether the route is permitted
+
+        Args:
+            route (str): route to access
+
+        Returns:
+            bool: whether permitted
+        """
+        node: dict | None = self._root
+        if not node:
+            return False
+        for char in route:
+            if None in node:
+                return True
+            if (node := node.get(char)) is None:
+                return False
+        return True
+
+
+@lru_cache(maxsize=1024)
+def compile_routes(routes: frozenset[str]) -> RouteIndex:
+    """compile authorized routes, memoized by the route set
+
+    Args:
+        routes (frozenset[str]): authorized routes
+
+    Returns:
+        RouteIndex: compiled route index
+    """
+    return RouteIndex(routes)
+
+
+def has_permission(user: object, route: str, attr_name: str = "routes") -> bool:
+    """judge whether the user can access the route
+
+    Args:
+        user (object): user object
+        route (str): route to access
+        attr_name (str, optional): user model attribute name for authorized
+        routes. Defaults to "routes".
+
+    Returns:
+        bool: whether permitted
+    """
+    return compile_routes(frozenset(getattr(user, attr_name))).permits(route)
+
+
 def permission_required(
     route: str,
     *,
     user_authed_routes_attr_name: Optional[str] = "routes",
     optional: bool = False,
 ) -> None:
-    """verify interface permission
+    """verify interface permission, consulting the `PermissionCache` of the
+    app when one is registered
 
     Args:
         route (str): authorized route
@@ -330,23 +544,31 @@ def permission_required(
         def decorator(*args, **kwargs) -> Response:
             verify_jwt_in_request(optional=optional)
             try:
-                current_user = get_current_user()
-                if any(
-                    re.match(route, route_name) or route.startswith(route_name)
-                    for route_name in getattr(
-                        current_user, user_authed_routes_attr_name
+                if (
+                    cache := current_app.extensions.get("permission_cache")
+                ) is not None and (user_id := get_jwt_identity()) is not None:
+                    allowed: bool = cache.judge(
+                        user_id,
+                        route,
+                        lambda: has_permission(
+                            get_current_user(),
+                            route,
+                            user_authed_routes_attr_name,
+                        ),
+                    )
+                else:
+                    allowed = has_permission(
+                        get_current_user(), route, user_authed_routes_attr_name
                     )
-                ):
+                if allowed:
                     return current_app.ensure_sync(func)(*args, **kwargs)
-                res: Response = jsonify(
-                    {
-                        "code": HTTPStatus.FORBIDDEN.value,
-                        "message": f"no permission to access {route}",
-                        "success": False,
-                    }
+                # looked up at call time since schema depends on this module
+                envelopes: dict = (
+                    flask_restx_marshmallow.schema.DEFAULT_HTTP_ERROR_ENVELOPES
+                )
+                return envelopes[HTTPStatus.FORBIDDEN.value].response(
+                    f"no permission to access {route}"
                 )
-                res.status_code = HTTPStatus.FORBIDDEN.value
-                return res
             except RuntimeError:
                 if optional:
                     return current_app.ensure_sync(func)(*args, **kwargs)
@@ -556,6 +778,16 @@ spec: APISpec = APISpec(
     info={"description": "flask_restx_marshmallow backend api"},
 )
 converter: MarshmallowPlugin.Converter = spec.plugins[0].converter
+
+
+def field2reference(_converter, field: Field, **_kwargs) -> dict:
+    """document the column referenced by an `ExistsIn` validator"""
+    if (reference := get_reference(field)) is not None:
+        return {"x-exists-in": reference}
+    return {}
+
+
+converter.add_attribute_function(field2reference)
 apidoc: Apidoc = Apidoc(
     "swagger_doc",
     __name__,
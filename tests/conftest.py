@@ -4,19 +4,40 @@ version: 0.1.1
 Author: 1746104160
 Date: 2023-07-11 12:39:16
 LastEditors: 1746104160 shaojiahong2001@outlook.com
-LastEditTime: 2023-07-11 12:48:43
+LastEditTime: 2026-10-19 10:12:31
 FilePath: /flask_restx_marshmallow/tests/conftest.py
 """
+import os
+import tempfile
+from typing import Iterator
+
 import pytest
 from flask import Flask
+from flask.testing import FlaskClient
 
-from examples.app import create_app
+# the example config reads these at import time
+os.environ.setdefault("CACHE_REDIS_URL", "redis://:@localhost:6379/0")
+os.environ.setdefault(
+    "SQLALCHEMY_DATABASE_URI", f"sqlite:///{tempfile.mkdtemp()}"
+)
 
-flask_app: Flask = create_app()
+flask_app: Flask = None
 
 
 @pytest.fixture()
-def app() -> Flask:
+def app() -> Iterator[Flask]:
     """test flask app"""
+    global flask_app  # pylint: disable=global-statement
+    if flask_app is None:
+        from app import create_app  # pylint: disable=import-outside-toplevel
+
+        flask_app = create_app()
     flask_app.config["TESTING"] = True
-    yield flask_app
+    with flask_app.test_request_context():
+        yield flask_app
+
+
+@pytest.fixture()
+def client(app: Flask) -> FlaskClient:
+    """test client of the app"""
+    return app.test_client()
@@ -0,0 +1,51 @@
+"""
+Description: tests of the patched api
+version: 0.1.1
+Author: 1746104160
+Date: 2026-10-19 10:12:31
+LastEditors: 1746104160 shaojiahong2001@outlook.com
+LastEditTime: 2026-10-19 10:12:31
+FilePath: /flask_restx_marshmallow/tests/test_api.py
+"""
+# pylint: disable=protected-access
+from flask import Blueprint, Flask
+
+from flask_restx_marshmallow import Api
+
+
+class TeapotError(Exception):
+    """error with an app level handler"""
+
+
+def test_error_handler_registration_invalidates_memo() -> None:
+    """handlers registered after the memo was filled are seen"""
+    app: Flask = Flask(__name__)
+    api: Api = Api(app)
+    with app.test_request_context():
+        assert not api._has_app_error_handler(TeapotError)
+        app.errorhandler(TeapotError)(lambda _: ("teapot", 418))
+        assert api._has_app_error_handler(TeapotError)
+
+
+def test_blueprint_error_handler_invalidates_memo() -> None:
+    """handlers merged from a blueprint are seen"""
+    app: Flask = Flask(__name__)
+    api: Api = Api(app)
+    blueprint: Blueprint = Blueprint("teapot", __name__)
+    blueprint.app_errorhandler(TeapotError)(lambda _: ("teapot", 418))
+    with app.test_request_context():
+        assert not api._has_app_error_handler(TeapotError)
+        app.register_blueprint(blueprint)
+        assert api._has_app_error_handler(TeapotError)
+
+
+def test_direct_error_handler_spec_write_invalidates_memo() -> None:
+    """handlers written to `error_handler_spec` directly are seen"""
+    app: Flask = Flask(__name__)
+    api: Api = Api(app)
+    with app.test_request_context():
+        assert not api._has_app_error_handler(TeapotError)
+        app.error_handler_spec[None][None][TeapotError] = lambda _: "teapot"
+        assert api._has_app_error_handler(TeapotError)
+        del app.error_handler_spec[None][None][TeapotError]
+        assert not api._has_app_error_handler(TeapotError)
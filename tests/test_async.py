@@ -0,0 +1,96 @@
+"""
+Description: tests of the async mode of the patched flask_sqlalchemy
+version: 0.1.1
+Author: 1746104160
+Date: 2026-10-19 10:12:31
+LastEditors: 1746104160 shaojiahong2001@outlook.com
+LastEditTime: 2026-10-19 10:12:31
+FilePath: /flask_restx_marshmallow/tests/test_async.py
+"""
+from pathlib import Path
+
+import pytest
+import sqlalchemy as sa
+from flask import Flask
+from sqlalchemy.dialects.sqlite.aiosqlite import SQLiteDialect_aiosqlite
+from sqlalchemy.orm import Mapped, mapped_column
+
+from flask_restx_marshmallow import SQLAlchemy
+
+db: SQLAlchemy = SQLAlchemy(async_mode=True)
+
+
+class Note(db.Model):
+    """note of the tests"""
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    text: Mapped[str] = mapped_column(sa.String(20))
+
+
+def test_sync_and_async_views(tmp_path: Path) -> None:
+    """sync and async views share one app and one database"""
+    app: Flask = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'a.db'}"
+    db.init_app(app)
+
+    @app.post("/sync")
+    def add_sync() -> dict:
+        db.session.add(Note(text="sync"))
+        db.session.commit()
+        return {"count": Note.query.count()}
+
+    @app.post("/async")
+    async def add_async() -> dict:
+        db.async_session.add(Note(text="async"))
+        await db.async_session.commit()
+        return {
+            "count": await db.async_session.scalar(
+                sa.select(sa.func.count()).select_from(Note)
+            )
+        }
+
+    with app.app_context():
+        db.create_all()
+        assert db.engine.dialect.driver == "pysqlite"
+        assert db.async_engine.dialect.driver == "aiosqlite"
+    client = app.test_client()
+    assert client.post("/sync").json == {"count": 1}
+    assert client.post("/async").json == {"count": 2}
+    assert client.post("/sync").json == {"count": 3}
+    with app.app_context():
+        assert [note.text for note in Note.query.order_by(Note.id)] == [
+            "sync",
+            "async",
+            "sync",
+        ]
+
+
+def test_async_twins_on_demand(tmp_path: Path, monkeypatch) -> None:
+    """async twins are created on first use, and only with their driver"""
+    # pylint: disable=protected-access
+    app: Flask = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'a.db'}"
+    app.config["SQLALCHEMY_REPLICAS"] = {
+        None: [f"sqlite:///{tmp_path / 'a.db'}"]
+    }
+    db.init_app(app)
+    with app.app_context():
+        replica: sa.engine.Engine = db.replicas[db.engine][0]
+        assert db.engine not in db._async_engines
+        assert replica not in db._async_engines
+        assert db.async_engine is db.async_engine_of(db.engine)
+        assert replica not in db._async_engines
+
+    def missing_driver():
+        raise ImportError("aiosqlite")
+
+    monkeypatch.setattr(
+        SQLiteDialect_aiosqlite, "import_dbapi", staticmethod(missing_driver)
+    )
+    other: Flask = Flask(__name__)
+    other.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'b.db'}"
+    db.init_app(other)
+    with other.app_context():
+        assert db.async_engine_of(db.engine) is None
+        with pytest.raises(sa.exc.UnboundExecutionError):
+            db.run(db.async_session.scalar(sa.select(1)))
@@ -0,0 +1,146 @@
+"""
+Description: tests of the identity loader
+version: 0.1.1
+Author: 1746104160
+Date: 2026-10-19 23:02:45
+LastEditors: 1746104160 shaojiahong2001@outlook.com
+LastEditTime: 2026-10-19 23:02:45
+FilePath: /flask_restx_marshmallow/tests/test_identity_loader.py
+"""
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+import sqlalchemy as sa
+from flask import Flask
+from flask_jwt_extended import create_access_token, current_user, jwt_required
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+
+from flask_restx_marshmallow import IdentityLoader, JWTManager, SQLAlchemy
+
+db: SQLAlchemy = SQLAlchemy()
+
+
+class Account(db.Model):
+    """user of the tests"""
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    valid: Mapped[bool] = mapped_column(default=True)
+    grants: Mapped[list["Grant"]] = relationship()
+
+
+class Grant(db.Model):
+    """route granted to an account"""
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    account_id: Mapped[int] = mapped_column(sa.ForeignKey(Account.id))
+    route: Mapped[str] = mapped_column(sa.String(20))
+
+
+@pytest.fixture()
+def app(tmp_path: Path) -> Iterator[Flask]:
+    """app with a valid and an invalid account"""
+    flask_app: Flask = Flask(__name__)
+    flask_app.config["JWT_SECRET_KEY"] = "secret key of the identity loader"
+    # integer identities, pyjwt only accepts a string `sub`
+    flask_app.config["JWT_IDENTITY_CLAIM"] = "uid"
+    flask_app.config[
+        "SQLALCHEMY_DATABASE_URI"
+    ] = f"sqlite:///{tmp_path / 'test.db'}"
+    db.init_app(flask_app)
+    with flask_app.app_context():
+        db.create_all()
+        db.session.add_all(
+            [
+                Account(id=1, grants=[Grant(id=1, route="/system")]),
+                Account(id=2, valid=False),
+            ]
+        )
+        db.session.commit()
+    yield flask_app
+
+
+def count_statements(app: Flask) -> list[str]:
+    """statements executed by the engine of the app from now on"""
+    statements: list[str] = []
+    with app.app_context():
+        sa.event.listen(
+            db.engine,
+            "before_cursor_execute",
+            lambda *args: statements.append(args[2]),
+        )
+    return statements
+
+
+def test_load_once_per_request(app: Flask) -> None:
+    """the user of an identity is fetched once per request, until forgotten"""
+    loader: IdentityLoader = IdentityLoader(db, Account, jwt=JWTManager(app))
+    statements: list[str] = count_statements(app)
+    with app.test_request_context():
+        user: Account = loader.load(1)
+        assert loader.load(1) is user
+        assert loader.user_lookup({}, {"uid": 1}) is user
+        assert len(statements) == 1
+        db.session.expunge(user)
+        assert loader.load(1) is user
+        loader.forget(1)
+        assert loader.load(1) is not user
+        assert len(statements) == 2
+    with app.test_request_context():
+        loader.load(1)
+        assert len(statements) == 3
+
+
+def test_eager_relationships(app: Flask) -> None:
+    """eager relationships are loaded along with the user"""
+    statements: list[str] = count_statements(app)
+    with app.test_request_context():
+        user: Account = IdentityLoader(db, Account).load(1)
+        assert [grant.route for grant in user.grants] == ["/system"]
+        assert len(statements) == 2
+    statements.clear()
+    with app.test_request_context():
+        user = IdentityLoader(db, Account, eager=("grants",)).load(1)
+        assert len(statements) == 2
+        assert [grant.route for grant in user.grants] == ["/system"]
+        assert len(statements) == 2
+
+
+def test_is_valid(app: Flask) -> None:
+    """missing and invalid users are not valid"""
+    with app.test_request_context():
+        loader: IdentityLoader = IdentityLoader(db, Account)
+        assert loader.is_valid(1)
+        assert not loader.is_valid(2)
+        assert not loader.is_valid(3)
+        unchecked: IdentityLoader = IdentityLoader(
+            db, Account, valid_attr_name=None
+        )
+        assert unchecked.is_valid(2)
+        assert not unchecked.is_valid(3)
+
+
+def test_shared_with_blocklist(app: Flask) -> None:
+    """the user lookup and the blocklist loader share one query"""
+    jwt: JWTManager = JWTManager(app)
+    loader: IdentityLoader = IdentityLoader(db, Account, jwt=jwt)
+
+    @jwt.token_in_blocklist_loader
+    def blocked(_jwt_header: dict, jwt_payload: dict) -> bool:
+        return not loader.is_valid(jwt_payload["uid"])
+
+    @app.get("/me")
+    @jwt_required()
+    def me() -> dict:
+        return {"id": current_user.id}
+
+    with app.app_context():
+        valid: str = create_access_token(1)
+        invalid: str = create_access_token(2)
+    statements: list[str] = count_statements(app)
+    client = app.test_client()
+    response = client.get("/me", headers={"Authorization": f"Bearer {valid}"})
+    assert response.json == {"id": 1}
+    assert len(statements) == 1
+    response = client.get("/me", headers={"Authorization": f"Bearer {invalid}"})
+    assert response.status_code == 401
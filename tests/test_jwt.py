@@ -0,0 +1,50 @@
+"""
+Description: tests of the patched jwt manager
+version: 0.1.1
+Author: 1746104160
+Date: 2026-10-19 10:12:31
+LastEditors: 1746104160 shaojiahong2001@outlook.com
+LastEditTime: 2026-10-19 10:12:31
+FilePath: /flask_restx_marshmallow/tests/test_jwt.py
+"""
+import pytest
+from flask import Flask
+from flask_jwt_extended import create_access_token, decode_token
+from jwt.exceptions import InvalidAudienceError, InvalidSignatureError
+
+from flask_restx_marshmallow import JWTManager
+
+
+def test_decode_cache_follows_key_rotation() -> None:
+    """a cached token is verified again once the decode key changes"""
+    app: Flask = Flask(__name__)
+    app.config["JWT_SECRET_KEY"] = "the first secret key of the test app"
+    jwt: JWTManager = JWTManager(app, decode_cache_size=16)
+    with app.app_context():
+        token: str = create_access_token("alice")
+        assert decode_token(token)["sub"] == "alice"
+        assert len(jwt.decode_cache) == 1
+        assert decode_token(token)["sub"] == "alice"
+        app.config["JWT_SECRET_KEY"] = "the second secret key of the test app"
+        with pytest.raises(InvalidSignatureError):
+            decode_token(token)
+
+
+def test_decode_cache_follows_settings() -> None:
+    """a cached token is verified again once the audience changes"""
+    app: Flask = Flask(__name__)
+    app.config["JWT_SECRET_KEY"] = "the secret key of the test app"
+    app.config["JWT_ENCODE_AUDIENCE"] = "first"
+    app.config["JWT_DECODE_AUDIENCE"] = "first"
+    jwt: JWTManager = JWTManager(app, decode_cache_size=16)
+    with app.app_context():
+        token: str = create_access_token("alice")
+        assert decode_token(token)["aud"] == "first"
+        assert len(jwt.decode_cache) == 1
+        app.config["JWT_DECODE_AUDIENCE"] = "second"
+        with pytest.raises(InvalidAudienceError):
+            decode_token(token)
+        app.config["JWT_DECODE_AUDIENCE"] = "first"
+        app.config["JWT_DECODE_LEEWAY"] = 5
+        assert decode_token(token)["aud"] == "first"
+        assert len(jwt.decode_cache) == 2
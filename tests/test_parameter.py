@@ -0,0 +1,88 @@
+"""
+Description: tests of the parameters
+version: 0.1.1
+Author: 1746104160
+Date: 2026-10-19 16:20:44
+LastEditors: 1746104160 shaojiahong2001@outlook.com
+LastEditTime: 2026-10-19 16:20:44
+FilePath: /flask_restx_marshmallow/tests/test_parameter.py
+"""
+import marshmallow
+from marshmallow import fields
+
+from flask_restx_marshmallow.parameter import Parameters, QueryParameters
+
+
+class Pagination(Parameters):
+    """parameters without a location of their own"""
+
+    page = fields.Integer()
+    token = fields.String(metadata={"location": "header"})
+
+
+class Search(QueryParameters):
+    """query parameters extending the pagination"""
+
+    page = fields.Integer()
+    keyword = fields.String()
+
+
+def locations(parameters: Parameters) -> dict[str, str]:
+    """location of each field of the parameters"""
+    return {
+        name: field.metadata.get("location")
+        for name, field in parameters.fields.items()
+    }
+
+
+def test_location_per_instance() -> None:
+    """the location passed to an instance does not leak to the class"""
+    assert locations(Pagination(location="query")) == {
+        "page": "query",
+        "token": "header",
+    }
+    assert locations(Pagination(location="body")) == {
+        "page": "body",
+        "token": "header",
+    }
+    assert not Pagination._declared_fields["page"].metadata
+    assert locations(Search(location="body")) == {
+        "page": "body",
+        "keyword": "body",
+    }
+    assert locations(Search()) == {"page": "query", "keyword": "query"}
+
+
+class Body(Search):
+    """json parameters overriding the location of one field"""
+
+    location = "body"
+    keyword = fields.String(metadata={"location": "header"})
+
+
+def test_location_per_class() -> None:
+    """subclasses relocate the inherited fields without their own location"""
+    assert locations(Body()) == {"page": "body", "keyword": "header"}
+    assert locations(Search()) == {"page": "query", "keyword": "query"}
+
+
+class Page(marshmallow.Schema):
+    """plain marshmallow schema mixed into parameters"""
+
+    page = fields.Integer()
+
+
+class PageParameters(QueryParameters, Page):
+    """query parameters reusing a plain schema"""
+
+
+def test_load_only_per_class() -> None:
+    """parameters flag their own copies of the fields of their bases"""
+    assert Page().load({"page": 1}) == {"page": 1}
+    assert Page().dump({"page": 1}) == {"page": 1}
+    parameters: PageParameters = PageParameters()
+    assert parameters.load({"page": 1}) == {"page": 1}
+    assert parameters.fields["page"].metadata == {"location": "query"}
+    assert not Page._declared_fields["page"].metadata
+    assert list(parameters.load_fields) == ["page"]
+    assert not parameters.dump_fields
@@ -0,0 +1,31 @@
+"""
+Description: tests of the password hasher
+version: 0.1.1
+Author: 1746104160
+Date: 2026-10-19 14:03:52
+LastEditors: 1746104160 shaojiahong2001@outlook.com
+LastEditTime: 2026-10-19 14:03:52
+FilePath: /flask_restx_marshmallow/tests/test_password.py
+"""
+from flask import Flask
+
+from flask_restx_marshmallow import PasswordHasher
+
+
+def test_pool_size() -> None:
+    """the pool is small by default and sized from the config"""
+    assert PasswordHasher(Flask(__name__)).max_workers == 1
+    app: Flask = Flask(__name__)
+    app.config["PASSWORD_HASHER_MAX_WORKERS"] = 2
+    assert PasswordHasher(app).max_workers == 2
+    assert PasswordHasher(app, max_workers=0).max_workers == 0
+
+
+def test_hash_inline() -> None:
+    """hashes verify without a pool"""
+    hasher: PasswordHasher = PasswordHasher(
+        Flask(__name__), schemes=["md5_crypt"], max_workers=0
+    )
+    hashed: str = hasher.hash("secret")
+    assert hasher.verify("secret", hashed)
+    assert not hasher.verify("public", hashed)
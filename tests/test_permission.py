@@ -0,0 +1,59 @@
+"""
+Description: tests of the route permissions
+version: 0.1.1
+Author: 1746104160
+Date: 2026-10-19 23:41:26
+LastEditors: 1746104160 shaojiahong2001@outlook.com
+LastEditTime: 2026-10-19 23:41:26
+FilePath: /flask_restx_marshmallow/tests/test_permission.py
+"""
+import random
+import re
+from itertools import product
+from types import SimpleNamespace
+
+from flask import Flask
+
+from flask_restx_marshmallow import has_permission
+from flask_restx_marshmallow.util import RouteIndex
+
+ROUTES: list[str] = [
+    "".join(chars)
+    for length in range(4)
+    for chars in product("/ab", repeat=length)
+]
+
+
+def matched(authed_routes: list[str], route: str) -> bool:
+    """the regex and prefix matching permissions were judged with before"""
+    return any(
+        re.match(route, authed_route) or route.startswith(authed_route)
+        for authed_route in authed_routes
+    )
+
+
+def test_route_index_matches_regex() -> None:
+    """the index permits exactly the routes the old matching did"""
+    rand: random.Random = random.Random(0)
+    for _ in range(500):
+        authed_routes: list[str] = rand.sample(ROUTES, rand.randint(0, 3))
+        index: RouteIndex = RouteIndex(authed_routes)
+        for route in ROUTES:
+            assert index.permits(route) == matched(authed_routes, route), (
+                authed_routes,
+                route,
+            )
+
+
+def test_has_permission_follows_routes() -> None:
+    """changes to the routes of a user are seen within a request"""
+    user: SimpleNamespace = SimpleNamespace(routes=["/system/user"])
+    with Flask(__name__).test_request_context():
+        assert has_permission(user, "/system")
+        assert not has_permission(user, "/log")
+        user.routes.append("/log")
+        assert has_permission(user, "/log")
+        user.routes.clear()
+        assert not has_permission(user, "/system")
+        user.grants = ["/log/login"]
+        assert has_permission(user, "/log", "grants")
@@ -0,0 +1,117 @@
+"""
+Description: tests of the permission cache
+version: 0.1.1
+Author: 1746104160
+Date: 2026-10-19 10:12:31
+LastEditors: 1746104160 shaojiahong2001@outlook.com
+LastEditTime: 2026-10-19 10:12:31
+FilePath: /flask_restx_marshmallow/tests/test_permission_cache.py
+"""
+from types import SimpleNamespace
+
+import fakeredis
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token
+
+from flask_restx_marshmallow import PermissionCache
+from flask_restx_marshmallow.util import permission_required
+
+
+def make_app(users: dict, on_load=None) -> tuple[Flask, PermissionCache]:
+    """app with one route guarded by `/system`"""
+    app: Flask = Flask(__name__)
+    app.config["JWT_SECRET_KEY"] = "test secret key of the permission cache"
+    jwt: JWTManager = JWTManager(app)
+    cache: PermissionCache = PermissionCache(
+        app, client=fakeredis.FakeStrictRedis()
+    )
+
+    @jwt.user_lookup_loader
+    def user_lookup(_jwt_header: dict, jwt_payload: dict) -> SimpleNamespace:
+        user = SimpleNamespace(routes=list(users[jwt_payload["sub"]]))
+        if on_load is not None:
+            on_load()
+        return user
+
+    @app.get("/system/user")
+    @permission_required("/system")
+    def system_user() -> dict:
+        return {"success": True}
+
+    return app, cache
+
+
+def test_revocation_bumps_cached_decision() -> None:
+    """a revoked route is denied although the grant was cached"""
+    users: dict = {"alice": ["/system"]}
+    app, cache = make_app(users)
+    with app.app_context():
+        token: str = create_access_token("alice")
+    client = app.test_client()
+    headers: dict = {"Authorization": f"Bearer {token}"}
+    # the first request reads the epoch, the second one caches the grant
+    assert client.get("/system/user", headers=headers).status_code == 200
+    assert not len(cache.local)
+    assert client.get("/system/user", headers=headers).status_code == 200
+    assert cache.local.get(("alice", 0, "/system")) is True
+    users["alice"] = []
+    assert client.get("/system/user", headers=headers).status_code == 200
+    cache.bump("alice")
+    assert client.get("/system/user", headers=headers).status_code == 403
+    assert client.get("/system/user", headers=headers).status_code == 403
+
+
+def test_epochs_of_other_workers() -> None:
+    """bumps of other workers are seen once the local epoch expires"""
+    users: dict = {"alice": ["/system"]}
+    app, cache = make_app(users)
+    with app.app_context():
+        token: str = create_access_token("alice")
+    client = app.test_client()
+    headers: dict = {"Authorization": f"Bearer {token}"}
+    for _ in range(2):
+        assert client.get("/system/user", headers=headers).status_code == 200
+    users["alice"] = []
+    cache.client.incr(cache._epoch_key("alice"))
+    assert client.get("/system/user", headers=headers).status_code == 200
+    cache.epochs.pop("alice")
+    assert client.get("/system/user", headers=headers).status_code == 403
+
+
+def test_bump_while_loading_does_not_cache_stale_grant() -> None:
+    """a bump between loading the user and judging keeps the old grant out of
+    the new epoch"""
+    users: dict = {"alice": ["/system"]}
+    revoke_once: list = [True]
+
+    def revoke_concurrently() -> None:
+        if revoke_once.pop() if revoke_once else False:
+            users["alice"] = []
+            cache.bump("alice")
+
+    app, cache = make_app(users, revoke_concurrently)
+    with app.app_context():
+        token: str = create_access_token("alice")
+    client = app.test_client()
+    headers: dict = {"Authorization": f"Bearer {token}"}
+    # decided from the user loaded before the bump, not cached
+    assert client.get("/system/user", headers=headers).status_code == 200
+    assert cache.local.get(("alice", 1, "/system")) is None
+    assert client.get("/system/user", headers=headers).status_code == 403
+
+
+def test_process_local_epochs() -> None:
+    """without redis, bumps reach the decisions of the process at once"""
+    users: dict = {"alice": ["/system"]}
+    app, cache = make_app(users)
+    cache.client = None
+    with app.app_context():
+        token: str = create_access_token("alice")
+    client = app.test_client()
+    headers: dict = {"Authorization": f"Bearer {token}"}
+    assert client.get("/system/user", headers=headers).status_code == 200
+    assert cache.local.get(("alice", 0, "/system")) is True
+    users["alice"] = []
+    cache.bump("alice")
+    assert cache.epoch("alice") == 1
+    assert client.get("/system/user", headers=headers).status_code == 403
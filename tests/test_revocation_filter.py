@@ -0,0 +1,60 @@
+"""
+Description: tests of the revocation filter
+version: 0.1.1
+Author: 1746104160
+Date: 2026-10-19 10:12:31
+LastEditors: 1746104160 shaojiahong2001@outlook.com
+LastEditTime: 2026-10-19 10:12:31
+FilePath: /flask_restx_marshmallow/tests/test_revocation_filter.py
+"""
+import time
+
+import fakeredis
+from flask import Flask
+
+from flask_restx_marshmallow import RevocationFilter
+
+
+def test_revoke() -> None:
+    """revoked ids are reported by every worker"""
+    client = fakeredis.FakeStrictRedis()
+    app: Flask = Flask(__name__)
+    revoker: RevocationFilter = RevocationFilter(app, client=client)
+    worker: RevocationFilter = RevocationFilter(app, client=client)
+    assert not worker.is_revoked("a")
+    revoker.revoke("a")
+    worker.sync(force=True)
+    assert worker.is_revoked("a")
+    assert not worker.is_revoked("b")
+
+
+def test_legacy_keys() -> None:
+    """ids revoked through flask-caching are migrated once at startup"""
+    client = fakeredis.FakeStrictRedis()
+    client.flushall()
+    client.set("flask_cache_old", b"1", ex=60)
+    client.set("flask_cache_older", b"1", ex=60)
+    client.set("other_new", b"1", ex=60)
+    app: Flask = Flask(__name__)
+    app.config["REVOCATION_LEGACY_PREFIX"] = "flask_cache_"
+    revocation_filter: RevocationFilter = RevocationFilter(app, client=client)
+    assert client.zscore("revoked_jti", "old") is not None
+    client.delete("flask_cache_old")
+    assert revocation_filter.is_revoked("old")
+    assert revocation_filter.is_revoked("older")
+    assert not revocation_filter.is_revoked("new")
+    client.set("flask_cache_late", b"1", ex=60)
+    assert not revocation_filter.is_revoked("late")
+
+
+def test_local_revocations_expire() -> None:
+    """without redis, ids are forgotten once their token expires"""
+    revocation_filter: RevocationFilter = RevocationFilter(Flask(__name__))
+    now: float = time.time()
+    revocation_filter.revoke("expired", now - 1)
+    revocation_filter.revoke("valid", now + 60)
+    revocation_filter.revoke("default")
+    assert not revocation_filter.is_revoked("expired")
+    assert revocation_filter.is_revoked("valid")
+    assert revocation_filter.is_revoked("default")
+    assert set(revocation_filter._revoked) == {"valid", "default"}
@@ -0,0 +1,199 @@
+"""
+Description: tests of the schemas
+version: 0.1.1
+Author: 1746104160
+Date: 2026-10-19 18:05:12
+LastEditors: 1746104160 shaojiahong2001@outlook.com
+LastEditTime: 2026-10-19 18:05:12
+FilePath: /flask_restx_marshmallow/tests/test_schema.py
+"""
+import json
+
+import marshmallow
+import pytest
+import sqlalchemy as sa
+from flask import Flask, jsonify
+from marshmallow import fields
+from sqlalchemy.orm import (
+    DeclarativeBase,
+    Mapped,
+    Session,
+    mapped_column,
+    relationship,
+)
+
+from flask_restx_marshmallow import (
+    DefaultHTTPErrorSchema,
+    Schema,
+    SQLAlchemyAutoSchema,
+    SQLAlchemySchema,
+)
+from flask_restx_marshmallow.schema import DEFAULT_HTTP_ERROR_ENVELOPES
+from flask_restx_marshmallow.util import API_DEFAULT_HTTP_CODE_MESSAGES
+
+
+class Page(marshmallow.Schema):
+    """plain marshmallow schema mixed into a response schema"""
+
+    page = fields.Integer()
+
+
+class PageSchema(Schema, Page):
+    """response schema reusing a plain schema"""
+
+
+def test_dump_only_per_class() -> None:
+    """schemas flag their own copies of the fields of their bases"""
+    assert Page().load({"page": 1}) == {"page": 1}
+    schema: PageSchema = PageSchema()
+    assert schema.dump({"page": 1}) == {"page": 1}
+    assert schema.fields["page"].dump_only
+    assert not Page._declared_fields["page"].dump_only
+    assert list(schema.dump_fields) == ["page"]
+    assert not schema.load_fields
+
+
+class Base(DeclarativeBase):
+    """declarative base of the tests"""
+
+
+class Author(Base):
+    """author of books"""
+
+    __tablename__: str = "author"
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column(sa.String(20))
+    books: Mapped[list["Book"]] = relationship(order_by="Book.id")
+
+
+class Book(Base):
+    """book of an author"""
+
+    __tablename__: str = "book"
+    id: Mapped[int] = mapped_column(primary_key=True)
+    author_id: Mapped[int] = mapped_column(sa.ForeignKey(Author.id))
+    title: Mapped[str] = mapped_column(sa.String(20))
+
+
+class BookSchema(SQLAlchemySchema):
+    """book title"""
+
+    class Meta:
+        """meta"""
+
+        model = Book
+
+    title = fields.String()
+
+
+class AuthorSchema(SQLAlchemySchema):
+    """author with the titles of the books"""
+
+    class Meta:
+        """meta"""
+
+        model = Author
+
+    name = fields.String()
+    books = fields.List(fields.Nested(BookSchema))
+
+
+class AuthorAutoSchema(SQLAlchemyAutoSchema):
+    """author with the titles of the books, columns inferred"""
+
+    class Meta:
+        """meta"""
+
+        model = Author
+
+    books = fields.List(fields.Nested(BookSchema))
+
+
+@pytest.fixture(name="session")
+def fixture_session() -> Session:
+    """session of an in-memory database with an author of two books"""
+    engine: sa.engine.Engine = sa.create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(
+            Author(
+                id=1,
+                name="ann",
+                books=[Book(id=1, title="first"), Book(id=2, title="second")],
+            )
+        )
+        session.commit()
+        yield session
+
+
+@pytest.mark.parametrize("schema", [AuthorSchema, AuthorAutoSchema])
+def test_loader_options(session: Session, schema: type) -> None:
+    """authors loaded with the options of either schema dump without lazy
+    loads"""
+    assert schema.loader_options() is schema.loader_options()
+    statements: list[str] = []
+    sa.event.listen(
+        session.get_bind(),
+        "before_cursor_execute",
+        lambda *args: statements.append(args[2]),
+    )
+    authors: list[Author] = session.scalars(
+        sa.select(Author).options(*schema.loader_options())
+    ).all()
+    loaded: int = len(statements)
+    dumped: list[dict] = schema(many=True).dump(authors)
+    assert len(statements) == loaded == 2
+    assert dumped[0]["books"] == [{"title": "first"}, {"title": "second"}]
+
+
+@pytest.mark.parametrize("schema", [AuthorSchema, AuthorAutoSchema])
+def test_row_loader(session: Session, schema: type) -> None:
+    """either schema dumps its rows like its instances"""
+    assert schema.row_loader() is schema.row_loader()
+    authors: list[Author] = session.scalars(sa.select(Author)).all()
+    assert schema(many=True).dump(schema.row_loader().load(session)) == schema(
+        many=True
+    ).dump(authors)
+
+
+def test_shared_error_schema() -> None:
+    """the shared schema of a http code dumps what a new one does"""
+    for http_code in API_DEFAULT_HTTP_CODE_MESSAGES:
+        schema: DefaultHTTPErrorSchema = DefaultHTTPErrorSchema.of(http_code)
+        assert DefaultHTTPErrorSchema.of(http_code) is schema
+        assert (
+            schema.dump({})
+            == DefaultHTTPErrorSchema(http_code=http_code).dump({})
+            == {
+                "code": http_code,
+                "message": API_DEFAULT_HTTP_CODE_MESSAGES[http_code],
+                "success": False,
+            }
+        )
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        None,
+        "no permission to access /system",
+        'quoted "message" with a \\ and 中文',
+        {"name": ["Missing data for required field."]},
+        [1, 2.5, None],
+    ],
+)
+def test_error_envelopes(message) -> None:
+    """the envelopes respond with the bodies jsonify built before"""
+    with Flask(__name__).test_request_context():
+        for http_code, default in API_DEFAULT_HTTP_CODE_MESSAGES.items():
+            response = DEFAULT_HTTP_ERROR_ENVELOPES[http_code].response(message)
+            expected = jsonify(
+                {
+                    "code": http_code,
+                    "message": default if message is None else message,
+                    "success": False,
+                }
+            )
+            assert response.status_code == http_code
+            assert response.mimetype == expected.mimetype
+            assert json.loads(response.get_data()) == expected.json
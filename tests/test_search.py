@@ -0,0 +1,141 @@
+"""
+Description: tests of the full-text search index
+version: 0.1.1
+Author: 1746104160
+Date: 2026-10-19 10:12:31
+LastEditors: 1746104160 shaojiahong2001@outlook.com
+LastEditTime: 2026-10-19 10:12:31
+FilePath: /flask_restx_marshmallow/tests/test_search.py
+"""
+from pathlib import Path
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+
+from flask_restx_marshmallow import SearchIndex
+
+
+class Base(DeclarativeBase):
+    """declarative base of the tests"""
+
+
+class Entry(Base):
+    """entry in a table whose name needs quoting"""
+
+    __tablename__: str = "search 'entry'"
+    id: Mapped[int] = mapped_column(primary_key=True)
+    title: Mapped[str] = mapped_column(sa.String(50))
+
+
+class AuxEntry(Base):
+    """entry in an attached schema"""
+
+    __tablename__: str = "entry"
+    __table_args__: dict = {"schema": "aux"}
+    id: Mapped[int] = mapped_column(primary_key=True)
+    title: Mapped[str] = mapped_column(sa.String(50))
+
+
+entry_search: SearchIndex = SearchIndex(Entry.title)
+aux_entry_search: SearchIndex = SearchIndex(AuxEntry.title)
+
+
+@pytest.fixture()
+def engine(tmp_path: Path) -> sa.engine.Engine:
+    """sqlite engine with the `aux` schema attached"""
+    sqlite_engine: sa.engine.Engine = sa.create_engine(
+        f"sqlite:///{tmp_path / 'main.db'}"
+    )
+
+    @sa.event.listens_for(sqlite_engine, "connect")
+    def attach(dbapi_connection, _connection_record) -> None:
+        dbapi_connection.execute(
+            f"ATTACH DATABASE '{tmp_path / 'aux.db'}' AS aux"
+        )
+
+    Base.metadata.create_all(sqlite_engine)
+    return sqlite_engine
+
+
+@pytest.mark.parametrize(
+    ("model", "index"), [(Entry, entry_search), (AuxEntry, aux_entry_search)]
+)
+def test_search_index(
+    engine: sa.engine.Engine, model: type[Base], index: SearchIndex
+) -> None:
+    """the index follows inserts, updates and deletes of its table"""
+
+    def search(keyword: str) -> list[int]:
+        with engine.connect() as connection:
+            return list(
+                connection.scalars(
+                    sa.select(model.id)
+                    .where(index.match(keyword))
+                    .order_by(model.id)
+                )
+            )
+
+    with engine.begin() as connection:
+        connection.execute(
+            sa.insert(model),
+            [
+                {"id": 1, "title": "Flask extensions"},
+                {"id": 2, "title": "marshmallow schemas"},
+                {"id": 3, "title": "flask and marshmallow"},
+            ],
+        )
+    assert search("flask") == [1, 3]
+    assert search("MARSH") == [2, 3]
+    assert search("ma") == [2, 3]
+    with engine.begin() as connection:
+        connection.execute(
+            sa.update(model).where(model.id == 1).values(title="restx")
+        )
+        connection.execute(sa.delete(model).where(model.id == 3))
+    assert search("flask") == []
+    assert search("restx") == [1]
+    Base.metadata.drop_all(engine)
+
+
+def test_search_without_index(tmp_path: Path) -> None:
+    """a table created before its index is searched with LIKE until
+    `create` adds the index"""
+    engine: sa.engine.Engine = sa.create_engine(
+        f"sqlite:///{tmp_path / 'old.db'}"
+    )
+    with engine.begin() as connection:
+        connection.exec_driver_sql(
+            "CREATE TABLE \"search 'entry'\" "
+            "(id INTEGER PRIMARY KEY, title VARCHAR(50))"
+        )
+        connection.execute(
+            sa.insert(Entry),
+            [{"id": 1, "title": "administrators"}, {"id": 2, "title": "x"}],
+        )
+
+    def search(bind: sa.engine.Engine) -> tuple[str, list[int]]:
+        statement: sa.Select = sa.select(Entry.id).where(
+            entry_search.match("admin")
+        )
+        with bind.connect() as connection:
+            return (
+                str(statement.compile(connection)),
+                list(connection.scalars(statement)),
+            )
+
+    sql, found = search(engine)
+    assert "LIKE" in sql and found == [1]
+    entry_search.create(engine)
+    sql, found = search(sa.create_engine(f"sqlite:///{tmp_path / 'old.db'}"))
+    assert "MATCH" in sql and found == [1]
+
+
+def test_search_mysql_stopwords() -> None:
+    """the mysql index is created without stopwords"""
+    # pylint: disable=protected-access
+    statements: list[str] = entry_search._ddl(mysql.dialect())
+    assert statements[1] == "SET SESSION innodb_ft_enable_stopword = OFF"
+    assert statements[2].startswith("CREATE FULLTEXT INDEX")
+    assert statements[3].endswith("= @search_stopword")
@@ -0,0 +1,609 @@
+"""
+Description: tests of the patched flask_sqlalchemy
+version: 0.1.1
+Author: 1746104160
+Date: 2026-10-19 10:12:31
+LastEditors: 1746104160 shaojiahong2001@outlook.com
+LastEditTime: 2026-10-19 10:12:31
+FilePath: /flask_restx_marshmallow/tests/test_sqlalchemy.py
+"""
+import pickle
+import time
+from pathlib import Path
+from threading import Thread
+from types import SimpleNamespace
+from typing import Iterator
+
+import fakeredis
+import pytest
+import sqlalchemy as sa
+from flask import Flask, g, request
+from flask_restx import Resource
+from marshmallow import ValidationError
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy_utils import ScalarListType
+
+from flask_restx_marshmallow import (
+    Api,
+    BatchLoader,
+    DeadlineExceeded,
+    DenormalizedList,
+    ExistsIn,
+    QueryBudgetExceeded,
+    QueryCache,
+    ReadOnlySessionError,
+    SQLAlchemy,
+    TouchBuffer,
+    deadline,
+    query_budget,
+    read_only,
+)
+from flask_restx_marshmallow import sqlalchemy as extension
+
+db: SQLAlchemy = SQLAlchemy()
+
+
+class Item(db.Model):
+    """item of the tests"""
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column(sa.String(20))
+
+
+class Tag(db.Model):
+    """tag of an item"""
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    item_id: Mapped[int] = mapped_column(sa.ForeignKey(Item.id))
+    name: Mapped[str] = mapped_column(sa.String(20))
+
+
+class Tagged(db.Model):
+    """item with its tag names denormalized"""
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    tags: Mapped[list[str]] = mapped_column(ScalarListType(str), default=[])
+
+
+tagged_tags: DenormalizedList = DenormalizedList(
+    Tagged.tags, sa.select(Tag.item_id, Tag.name)
+)
+
+
+@pytest.fixture()
+def app(tmp_path: Path) -> Iterator[Flask]:
+    """app with a fresh sqlite database"""
+    flask_app: Flask = Flask(__name__)
+    flask_app.config["SECRET_KEY"] = "secret key of the tests"
+    flask_app.config[
+        "SQLALCHEMY_DATABASE_URI"
+    ] = f"sqlite:///{tmp_path / 'test.db'}"
+    db.init_app(flask_app)
+    with flask_app.app_context():
+        db.create_all()
+        yield flask_app
+
+
+def count() -> int:
+    """count of the items"""
+    return db.session.scalar(sa.select(sa.func.count()).select_from(Item))
+
+
+def test_bulk_helpers_stay_in_the_transaction(app: Flask) -> None:
+    """bulk helpers leave their rows uncommitted by default"""
+    db.bulk_insert(Item, ({"id": i, "name": f"item{i}"} for i in range(5)))
+    db.session.rollback()
+    assert count() == 0
+    db.bulk_insert(Item, ({"id": i, "name": f"item{i}"} for i in range(5)))
+    db.session.commit()
+    assert db.bulk_delete(Item, [0, 1], batch_size=1) == 2
+    db.session.rollback()
+    assert count() == 5
+    db.bulk_delete(Item, [0, 1], batch_size=1, commit=True)
+    db.session.rollback()
+    assert count() == 3
+
+
+def cached_names() -> list[str]:
+    """names of the items through the query cache"""
+    return [
+        item.name
+        for item in Item.query.order_by(Item.id).execution_options(
+            query_cache=True
+        )
+    ]
+
+
+def test_query_cache_invalidated_by_commit(app: Flask) -> None:
+    """a committed write misses the entries reading its table"""
+    cache: QueryCache = QueryCache(app, client=fakeredis.FakeStrictRedis())
+    db.session.add(Item(id=1, name="first"))
+    db.session.commit()
+    assert cached_names() == ["first"]
+    statements: list[str] = []
+    sa.event.listen(
+        db.engine, "before_cursor_execute", lambda *args: statements.append(1)
+    )
+    assert cached_names() == ["first"]
+    assert not statements
+    db.session.add(Item(id=2, name="second"))
+    db.session.commit()
+    assert cached_names() == ["first", "second"]
+    assert len(cache.local) == 1
+
+
+def test_query_cache_write_during_load(app: Flask) -> None:
+    """a write committed while a result loads leaves the entry stale"""
+    cache: QueryCache = QueryCache(app, client=fakeredis.FakeStrictRedis())
+    db.session.add(Item(id=1, name="first"))
+    db.session.commit()
+
+    def concurrent_write(*_args) -> None:
+        cache.invalidate(Item.__table__.fullname)
+
+    sa.event.listen(db.engine, "after_cursor_execute", concurrent_write)
+    assert cached_names() == ["first"]
+    sa.event.remove(db.engine, "after_cursor_execute", concurrent_write)
+    (key,) = (
+        key for key in cache.client.keys("query:*") if b":tag:" not in key
+    )
+    assert cache.get(key) is None
+
+
+def test_query_cache_read_during_commit(app: Flask) -> None:
+    """a read racing a commit can not file the rows it replaces under the
+    versions bumped by the commit"""
+    QueryCache(app, client=fakeredis.FakeStrictRedis())
+    db.session.add(Item(id=1, name="first"))
+    db.session.commit()
+
+    def concurrent_read(_conn) -> None:
+        with app.app_context():
+            assert cached_names() == ["first"]
+
+    db.session.add(Item(id=2, name="second"))
+    db.session.flush()
+    sa.event.listen(db.engine, "commit", concurrent_read)
+    db.session.commit()
+    sa.event.remove(db.engine, "commit", concurrent_read)
+    assert cached_names() == ["first", "second"]
+
+
+def test_query_cache_rejects_unsigned_entries(app: Flask) -> None:
+    """entries in redis without a valid signature are ignored"""
+    cache: QueryCache = QueryCache(app, client=fakeredis.FakeStrictRedis())
+    db.session.add(Item(id=1, name="first"))
+    db.session.commit()
+    assert cached_names() == ["first"]
+    (key,) = (
+        key for key in cache.client.keys("query:*") if b":tag:" not in key
+    )
+    cache.local.clear()
+    payload: bytes = cache.client.get(key)
+    cache.client.set(key, bytes(32) + payload[32:])
+    assert cache.get(key) is None
+    cache.client.set(key, payload)
+    assert cache.get(key) is not None
+
+
+def test_exists_in_follows_writes(app: Flask) -> None:
+    """deleted and renamed keys stop validating once committed"""
+    exists_in: ExistsIn = ExistsIn(Item.name)
+    db.session.add_all([Item(id=1, name="first"), Item(id=2, name="second")])
+    db.session.commit()
+    assert exists_in(["first", "second"]) == ["first", "second"]
+    db.session.get(Item, 1).name = "renamed"
+    db.session.commit()
+    with pytest.raises(ValidationError):
+        exists_in("first")
+    assert exists_in("renamed") == "renamed"
+    db.bulk_delete(Item, [2])
+    db.session.commit()
+    with pytest.raises(ValidationError):
+        exists_in("second")
+    db.session.add(Item(id=3, name="third"))
+    db.session.commit()
+    assert exists_in("third") == "third"
+
+
+def names() -> dict[int, str]:
+    """names of the items by id"""
+    db.session.expire_all()
+    return {item.id: item.name for item in Item.query}
+
+
+def test_touch_buffer_flush(app: Flask) -> None:
+    """touches are coalesced and written on flush"""
+    buffer: TouchBuffer = TouchBuffer(app, interval=3600)
+    db.session.add_all([Item(id=1, name="a"), Item(id=2, name="b")])
+    db.session.commit()
+    buffer.touch(Item.name, 1, "x")
+    buffer.touch(Item.name, 1, "y")
+    buffer.touch(Item.name, 2, "z")
+    assert names() == {1: "a", 2: "b"}
+    assert buffer.flush() == 2
+    assert names() == {1: "y", 2: "z"}
+    assert buffer.flush() == 0
+
+
+def test_touch_buffer_failed_flush(app: Flask) -> None:
+    """values of a failed write are buffered again, unless touched since"""
+    buffer: TouchBuffer = TouchBuffer(app, interval=3600)
+    db.session.add(Item(id=1, name="a"))
+    db.session.commit()
+    buffer.touch(Item.name, 1, "x")
+
+    def fail(conn, _cursor, statement: str, *_args) -> None:
+        if statement.startswith("UPDATE"):
+            buffer.touch(Item.name, 2, "late")
+            raise RuntimeError("database is gone")
+
+    sa.event.listen(db.engine, "before_cursor_execute", fail)
+    with pytest.raises(RuntimeError):
+        buffer.flush()
+    buffer.flush_all()
+    sa.event.remove(db.engine, "before_cursor_execute", fail)
+    assert names() == {1: "a"}
+    buffer.touch(Item.name, 2, "newer")
+    db.session.add(Item(id=2, name="b"))
+    db.session.commit()
+    assert buffer.flush() == 2
+    assert names() == {1: "x", 2: "newer"}
+
+
+def test_touch_buffer_redis_orphans(app: Flask) -> None:
+    """touches left in redis by a dead worker are written by another one"""
+    client = fakeredis.FakeStrictRedis()
+    db.session.add(Item(id=1, name="a"))
+    db.session.commit()
+    TouchBuffer(app, client=client, interval=3600).touch(Item.name, 1, "x")
+    assert TouchBuffer(app, client=client, interval=3600).flush() == 1
+    assert names() == {1: "x"}
+
+
+def test_touch_buffer_rejects_unsigned(app: Flask) -> None:
+    """touches written to redis without a valid signature are dropped"""
+    client = fakeredis.FakeStrictRedis()
+    client.flushall()
+    db.session.add_all([Item(id=1, name="a"), Item(id=2, name="b")])
+    db.session.commit()
+    buffer: TouchBuffer = TouchBuffer(app, client=client, interval=3600)
+    buffer.touch(Item.name, 1, "x")
+    name: str = "touch:item:name"
+    assert client.hlen(name) == 1
+    client.hset(name, pickle.dumps(2), pickle.dumps("unsigned"))
+    field, value = buffer._dump(2, "y")  # pylint: disable=protected-access
+    client.hset(name, field, bytes([value[0] ^ 1]) + value[1:])
+    assert buffer.flush() == 1
+    assert names() == {1: "x", 2: "b"}
+
+
+def test_touch_buffer_leaves_the_session(app: Flask) -> None:
+    """flushing neither commits nor discards the work of the session"""
+    buffer: TouchBuffer = TouchBuffer(app, interval=3600)
+    db.session.add(Item(id=1, name="a"))
+    db.session.commit()
+    buffer.touch(Item.name, 1, "x")
+    pending: Item = Item(id=2, name="pending")
+    db.session.add(pending)
+    assert buffer.flush() == 1
+    assert pending in db.session.new
+    db.session.rollback()
+    assert names() == {1: "x"}
+
+
+def test_denormalized_list_refresh(app: Flask) -> None:
+    """refresh recomputes the list of the given rows only"""
+    db.session.add_all([Tagged(id=1), Tagged(id=2), Tagged(id=3)])
+    db.session.add_all(
+        [
+            Tag(id=1, item_id=1, name="a"),
+            Tag(id=2, item_id=1, name="b"),
+            Tag(id=3, item_id=1, name="a"),
+            Tag(id=4, item_id=2, name="c"),
+        ]
+    )
+    db.session.flush()
+    tagged: Tagged = db.session.get(Tagged, 1)
+    assert tagged_tags.refresh([1]) == [1]
+    assert sorted(tagged.tags) == ["a", "b"]
+    assert db.session.get(Tagged, 2).tags == []
+    assert tagged_tags.refresh(
+        sa.select(Tag.item_id).where(Tag.name == "c")
+    ) == [2]
+    assert db.session.get(Tagged, 2).tags == ["c"]
+    db.session.execute(sa.delete(Tag).where(Tag.item_id == 1))
+    assert sorted(tagged_tags.refresh()) == [1, 2, 3]
+    db.session.commit()
+    assert {row.id: row.tags for row in Tagged.query} == {
+        1: [],
+        2: ["c"],
+        3: [],
+    }
+
+
+def test_read_only_rejects_writes(app: Flask) -> None:
+    """a read-only endpoint reads but can not flush, execute DML or write
+    through the connection"""
+    db.session.add(Item(id=1, name="a"))
+    db.session.commit()
+
+    @read_only()
+    def flush() -> None:
+        db.session.get(Item, 1).name = "b"
+        db.session.flush()
+
+    @read_only()
+    def update() -> None:
+        db.session.execute(sa.update(Item).values(name="b"))
+
+    @read_only()
+    def raw_update() -> None:
+        db.session.connection().exec_driver_sql("UPDATE item SET name = 'b'")
+
+    @read_only()
+    def read() -> list[str]:
+        return [item.name for item in Item.query]
+
+    with pytest.raises(ReadOnlySessionError):
+        flush()
+    with pytest.raises(ReadOnlySessionError):
+        update()
+    with pytest.raises(sa.exc.OperationalError):
+        raw_update()
+    assert read() == ["a"]
+    assert "read_only" not in db.session().info
+    db.session.get(Item, 1).name = "b"
+    db.session.commit()
+    assert read() == ["b"]
+
+
+def test_read_only_rejects_pending_writes(app: Flask) -> None:
+    """a read-only endpoint is not entered with writes pending in the
+    session, which are left for the caller"""
+    db.session.add(Item(id=1, name="a"))
+    db.session.commit()
+
+    @read_only()
+    def read() -> list[str]:
+        return [item.name for item in Item.query]
+
+    db.session.add(Item(id=2, name="b"))
+    with pytest.raises(ReadOnlySessionError):
+        read()
+    assert len(db.session.new) == 1
+    db.session.rollback()
+    db.session.get(Item, 1).name = "b"
+    with pytest.raises(ReadOnlySessionError):
+        read()
+    db.session.flush()
+    with pytest.raises(ReadOnlySessionError):
+        read()
+    db.session.rollback()
+    db.session.execute(sa.update(Item).values(name="c"))
+    with pytest.raises(ReadOnlySessionError):
+        read()
+    assert "read_only" not in db.session().info
+    db.session.rollback()
+    assert read() == ["a"]
+
+
+def test_deadline_envelope(app: Flask) -> None:
+    """a statement past the deadline is answered with the 503 envelope"""
+    api: Api = Api(app)
+
+    @api.route("/slow")
+    class Slow(Resource):  # pylint: disable=unused-variable
+        """resource exceeding its deadline"""
+
+        @deadline(0.01)
+        def get(self) -> dict:
+            """query after the deadline"""
+            time.sleep(0.02)
+            return {"count": Item.query.count()}
+
+    response = app.test_client().get("/slow")
+    assert response.status_code == 503
+    assert response.json["code"] == 503
+    assert response.json["success"] is False
+
+
+def test_deadline_statement_timeout(app: Flask, monkeypatch) -> None:
+    """postgresql's statement_timeout is set again as the deadline nears"""
+    executed: list[str] = []
+    conn = SimpleNamespace(dialect=SimpleNamespace(name="postgresql"), info={})
+    cursor = SimpleNamespace(execute=executed.append)
+    now: list[float] = [100.0]
+    monkeypatch.setattr(extension.time, "monotonic", lambda: now[0])
+
+    def apply() -> None:
+        extension._apply_deadline(  # pylint: disable=protected-access
+            conn, cursor, "SELECT 1", (), None, False
+        )
+
+    g._deadline = 110.0
+    apply()
+    now[0] = 100.5
+    apply()
+    assert executed == ["SET statement_timeout = 10000"]
+    now[0] = 102.0
+    apply()
+    assert executed[-1] == "SET statement_timeout = 8000"
+    extension._on_rollback(conn)  # pylint: disable=protected-access
+    apply()
+    assert len(executed) == 3
+    now[0] = 110.0
+    with pytest.raises(DeadlineExceeded):
+        apply()
+
+
+@pytest.fixture()
+def replicated(tmp_path: Path) -> Iterator[Flask]:
+    """app with a primary and two replicas, each naming its item after it"""
+    flask_app: Flask = Flask(__name__)
+    flask_app.config[
+        "SQLALCHEMY_DATABASE_URI"
+    ] = f"sqlite:///{tmp_path / 'primary.db'}"
+    flask_app.config["SQLALCHEMY_REPLICAS"] = {
+        None: [f"sqlite:///{tmp_path / f'replica{i}.db'}" for i in range(2)]
+    }
+    db.init_app(flask_app)
+    with flask_app.app_context():
+        for name, engine in [
+            ("primary", db.engine),
+            *(
+                (f"replica{i}", replica)
+                for i, replica in enumerate(db.replicas[db.engine])
+            ),
+        ]:
+            db.metadata.create_all(engine)
+            with engine.begin() as connection:
+                connection.execute(sa.insert(Item).values(id=1, name=name))
+    yield flask_app
+
+
+def source() -> str:
+    """name of the database the session reads from"""
+    return db.session.scalar(sa.select(Item.name))
+
+
+def test_replica_per_transaction(replicated: Flask) -> None:
+    """reads of a GET request use one replica per transaction"""
+    with replicated.test_request_context(method="GET"):
+        first: str = source()
+        assert first.startswith("replica")
+        assert source() == source() == first
+        db.session.rollback()
+        assert source() not in {first, "primary"}
+
+
+def test_replica_pinned_by_writes(replicated: Flask) -> None:
+    """a session reads from the primary once it has written"""
+    with replicated.test_request_context(method="GET"):
+        assert source().startswith("replica")
+        db.session.add(Item(id=2, name="new"))
+        db.session.flush()
+        assert source() == "primary"
+        db.session.rollback()
+        assert source() == "primary"
+    with replicated.test_request_context(method="POST"):
+        assert source() == "primary"
+
+
+def test_replica_read_only(replicated: Flask) -> None:
+    """read-only endpoints read from replicas outside GET requests too"""
+
+    @read_only()
+    def read() -> tuple[str, str]:
+        return source(), source()
+
+    with replicated.test_request_context(method="POST"):
+        first, second = read()
+        assert first == second
+        assert first.startswith("replica")
+        assert source() == "primary"
+
+
+def test_pool_statistics_time_waits(tmp_path: Path) -> None:
+    """checkouts waiting for a connection are timed, after dispose too"""
+    flask_app: Flask = Flask(__name__)
+    flask_app.config[
+        "SQLALCHEMY_DATABASE_URI"
+    ] = f"sqlite:///{tmp_path / 'pool.db'}"
+    flask_app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "pool_size": 1,
+        "max_overflow": 0,
+    }
+    db.init_app(flask_app)
+    with flask_app.app_context():
+
+        def wait() -> dict:
+            return db.pool_statistics()["default"]["checkout_wait"]
+
+        with db.engine.connect():
+            pass
+        assert db.pool_statistics()["default"]["pool"] == "QueuePool"
+        assert wait()["count"] == 1
+        engine: sa.engine.Engine = db.engine
+        held: sa.engine.Connection = engine.connect()
+        waiter: Thread = Thread(target=lambda: engine.connect().close())
+        waiter.start()
+        time.sleep(0.05)
+        held.close()
+        waiter.join()
+        assert wait()["count"] == 3
+        assert wait()["buckets"]["le_0.01"] == 2
+        db.engine.dispose()
+        with db.engine.connect():
+            pass
+        statistics: dict = db.pool_statistics()["default"]
+        assert statistics["checkout_wait"]["count"] == 4
+        assert statistics["checkouts"] == 4
+
+
+def test_batch_loader_of_options(app: Flask) -> None:
+    """loaders are shared by calls with the same options and session"""
+    db.session.add(Item(id=1, name="a"))
+    db.session.commit()
+    plain: BatchLoader = BatchLoader.of(Item.id)
+    assert BatchLoader.of(Item.id) is plain
+    names: BatchLoader = BatchLoader.of(
+        Item.id, options=(sa.orm.load_only(Item.name),)
+    )
+    assert names is not plain
+    assert names.options and not plain.options
+    assert BatchLoader.of(Item.id, options=[sa.orm.load_only(Item.name)]) is (
+        names
+    )
+    with sa.orm.Session(db.engine) as session:
+        other: BatchLoader = BatchLoader.of(Item.id, session=session)
+        assert other is not plain
+        assert other.load(1) in session
+        assert plain.load(1) in db.session
+
+
+def test_query_statistics_shapes() -> None:
+    """statements differing only in their `IN` lists share a shape"""
+    statistics: extension.QueryStatistics = extension.QueryStatistics()
+    statistics.record("SELECT * FROM item WHERE id IN (?, ?, ?)", 0.1)
+    statistics.record("SELECT * FROM item WHERE id IN (?)", 0.2)
+    statistics.record("SELECT * FROM tag", 0.5)
+    assert statistics.count == 3
+    assert statistics.repeated(2) == {"SELECT * FROM item WHERE id IN (?)": 2}
+    assert statistics.repeated(0) == {}
+    snapshot: dict = statistics.as_dict()
+    assert snapshot["count"] == 3
+    assert [row["statement"] for row in snapshot["statements"]] == [
+        "SELECT * FROM tag",
+        "SELECT * FROM item WHERE id IN (?)",
+    ]
+
+
+def test_query_budget(app: Flask, caplog) -> None:
+    """requests over their budget raise in strict mode and log otherwise"""
+
+    @app.get("/items")
+    @query_budget(2, max_repeats=2)
+    def items() -> dict:
+        for i in range(int(request.args["n"])):
+            db.session.get(Item, i)
+        return {}
+
+    client = app.test_client()
+
+    def get(n: int) -> int:
+        # the requests share the app context of the fixture
+        g.pop("_query_statistics", None)
+        return client.get(f"/items?n={n}").status_code
+
+    app.testing = True
+    assert get(2) == 200
+    with pytest.raises(QueryBudgetExceeded, match="3 queries > 2"):
+        get(3)
+    app.config["SQLALCHEMY_QUERY_BUDGET_STRICT"] = False
+    assert get(3) == 200
+    assert (
+        "query budget of items exceeded: 3 queries > 2, "
+        "1 statements repeated > 2 times" in caplog.text
+    )
+    assert "possible N+1 query in items, executed 3 times" in caplog.text
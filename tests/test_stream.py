@@ -0,0 +1,287 @@
+"""
+Description: tests of streamed responses
+version: 0.1.1
+Author: 1746104160
+Date: 2026-10-19 21:40:07
+LastEditors: 1746104160 shaojiahong2001@outlook.com
+LastEditTime: 2026-10-19 21:40:07
+FilePath: /flask_restx_marshmallow/tests/test_stream.py
+"""
+import json
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+import sqlalchemy as sa
+from flask import Flask
+from flask_restx import Resource
+from marshmallow import fields
+from sqlalchemy.orm import Mapped, mapped_column
+
+from flask_restx_marshmallow import (
+    Api,
+    Namespace,
+    QueryBudgetExceeded,
+    ReadOnlySessionError,
+    Schema,
+    SQLAlchemy,
+    StandardSchema,
+    query_budget,
+    read_only,
+)
+
+db: SQLAlchemy = SQLAlchemy()
+
+
+class Row(db.Model):
+    """row of the tests"""
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column(sa.String(20))
+
+
+class RowSchema(Schema):
+    """dumped row"""
+
+    id = fields.Integer()
+    name = fields.String()
+
+
+class RowsSchema(StandardSchema):
+    """rows in the standard envelope"""
+
+    data = fields.List(fields.Nested(RowSchema))
+
+
+class PageSchema(Schema):
+    """page of rows"""
+
+    total = fields.Integer()
+    rows = fields.List(fields.Nested(RowSchema))
+
+
+class PagedRowsSchema(StandardSchema):
+    """page of rows in the standard envelope"""
+
+    data = fields.Nested(PageSchema)
+
+
+def count_rows(_row: Row) -> int:
+    """count of the rows, a statement per dumped row"""
+    return db.session.scalar(sa.select(sa.func.count(Row.id)))
+
+
+def write_row(row: Row) -> bool:
+    """whether renaming the row went through"""
+    try:
+        db.session.execute(
+            sa.update(Row).where(Row.id == row.id).values(name="written")
+        )
+    except ReadOnlySessionError:
+        return False
+    return True
+
+
+class CountedRowsSchema(StandardSchema):
+    """rows dumped with a statement each"""
+
+    data = fields.List(
+        fields.Nested(
+            type(
+                "CountedRowSchema",
+                (RowSchema,),
+                {"count": fields.Function(count_rows)},
+            )
+        )
+    )
+
+
+class WritingRowsSchema(StandardSchema):
+    """rows dumped with a write each"""
+
+    data = fields.List(
+        fields.Nested(
+            type(
+                "WritingRowSchema",
+                (RowSchema,),
+                {"written": fields.Function(write_row)},
+            )
+        )
+    )
+
+
+def rows() -> sa.ScalarResult:
+    """every row, fetched two at a time"""
+    return db.session.scalars(
+        sa.select(Row).order_by(Row.id).execution_options(yield_per=2)
+    )
+
+
+@pytest.fixture()
+def app(tmp_path: Path) -> Iterator[Flask]:
+    """app with five rows"""
+    flask_app: Flask = Flask(__name__)
+    flask_app.config[
+        "SQLALCHEMY_DATABASE_URI"
+    ] = f"sqlite:///{tmp_path / 'test.db'}"
+    db.init_app(flask_app)
+    with flask_app.app_context():
+        db.create_all()
+        db.session.add_all(Row(id=i, name=f"row{i}") for i in range(5))
+        db.session.commit()
+    # requests get app contexts, and query statistics, of their own
+    yield flask_app
+
+
+@pytest.fixture()
+def ns(app: Flask) -> Namespace:
+    """namespace of the api"""
+    return Api(app).namespace("rows", path="/")
+
+
+def expected() -> list[dict]:
+    """every row dumped"""
+    return [{"id": i, "name": f"row{i}"} for i in range(5)]
+
+
+def test_stream_in_envelope(app: Flask, ns: Namespace) -> None:
+    """a result returned as is is streamed into the data of the envelope"""
+
+    @ns.route("/rows")
+    class Rows(Resource):  # pylint: disable=unused-variable
+        """rows"""
+
+        @ns.response(description="rows", model=RowsSchema("rows"))
+        def get(self) -> sa.ScalarResult:
+            """every row"""
+            return rows()
+
+    response = app.test_client().get("/rows")
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.json == {
+        "code": 0,
+        "message": "rows",
+        "success": True,
+        "data": expected(),
+    }
+
+
+def test_stream_nested(app: Flask, ns: Namespace) -> None:
+    """a result in nested dicts is streamed with the rest of the envelope"""
+
+    @ns.route("/page")
+    class Page(Resource):  # pylint: disable=unused-variable
+        """page"""
+
+        @ns.response(description="rows", model=PagedRowsSchema("page"))
+        def get(self) -> dict:
+            """page of every row"""
+            return {"data": {"total": 5, "rows": rows()}}
+
+    response = app.test_client().get("/page")
+    assert response.json == {
+        "code": 0,
+        "message": "page",
+        "success": True,
+        "data": {"total": 5, "rows": expected()},
+    }
+
+
+def test_stream_many(app: Flask, ns: Namespace) -> None:
+    """a result dumped with a schema with many is a bare array"""
+
+    @ns.route("/many")
+    class Many(Resource):  # pylint: disable=unused-variable
+        """many rows"""
+
+        @ns.response(description="rows", model=RowSchema(many=True))
+        def get(self) -> sa.ScalarResult:
+            """every row"""
+            return rows()
+
+    assert app.test_client().get("/many").json == expected()
+
+
+def test_stream_error_marker(app: Flask, ns: Namespace, monkeypatch) -> None:
+    """an error while streaming ends the body with the error envelope"""
+    dump = RowSchema.dump
+
+    def failing_dump(self, obj, *args, **kwargs):
+        if getattr(obj, "id", None) == 3:
+            raise RuntimeError("row can not be dumped")
+        return dump(self, obj, *args, **kwargs)
+
+    monkeypatch.setattr(RowSchema, "dump", failing_dump)
+
+    @ns.route("/page")
+    class Page(Resource):  # pylint: disable=unused-variable
+        """page"""
+
+        @ns.response(description="rows", model=PagedRowsSchema("page"))
+        def get(self) -> dict:
+            """page of every row"""
+            return {"data": {"total": 5, "rows": rows()}}
+
+    response = app.test_client().get("/page")
+    assert response.status_code == 200
+    body: dict = json.loads(response.get_data())
+    assert body == {
+        "data": {"rows": expected()[:2]},
+        "code": 500,
+        "message": body["message"],
+        "success": False,
+    }
+
+
+def test_stream_query_budget(app: Flask, ns: Namespace) -> None:
+    """statements run while streaming count towards the query budget"""
+    app.testing = True
+
+    @ns.route("/rows")
+    class Rows(Resource):  # pylint: disable=unused-variable
+        """rows"""
+
+        @query_budget(1)
+        @ns.response(description="rows", model=RowsSchema("rows"))
+        def get(self) -> sa.ScalarResult:
+            """every row"""
+            return rows()
+
+    @ns.route("/counted")
+    class Counted(Resource):  # pylint: disable=unused-variable
+        """rows with a statement per row while streaming"""
+
+        @query_budget(1)
+        @ns.response(description="rows", model=CountedRowsSchema("rows"))
+        def get(self) -> sa.ScalarResult:
+            """every row"""
+            return rows()
+
+    assert app.test_client().get("/rows").json["data"] == expected()
+    response = app.test_client().get("/counted")
+    assert response.status_code == 200
+    with pytest.raises(QueryBudgetExceeded):
+        response.get_data()
+
+
+def test_stream_read_only(app: Flask, ns: Namespace) -> None:
+    """the session stays read-only until the stream is consumed"""
+
+    @ns.route("/rows")
+    class Rows(Resource):  # pylint: disable=unused-variable
+        """rows"""
+
+        @read_only()
+        @ns.response(description="rows", model=WritingRowsSchema("rows"))
+        def get(self) -> sa.ScalarResult:
+            """every row, trying to write while streaming"""
+            return rows()
+
+    assert app.test_client().get("/rows").json["data"] == [
+        {**row, "written": False} for row in expected()
+    ]
+    with app.app_context():
+        assert (
+            db.session.scalar(sa.select(Row.name).where(Row.id == 0)) == "row0"
+        )
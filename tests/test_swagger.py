@@ -9,15 +9,14 @@ FilePath: /flask_restx_marshmallow/tests/test_swagger.py
 '''
 from typing import NoReturn
 
+from app.models.users import Users
+from app.utils import db
 from flask import Flask, url_for
 from flask.testing import FlaskClient
 from flask_jwt_extended import create_access_token
 from werkzeug.datastructures import Headers
 from werkzeug.test import TestResponse
 
-from examples.app.models.users import Users
-from examples.app.utils import db
-
 
 def test_swagger_json(
     app: Flask,